@@ -0,0 +1,28 @@
+"""Add LAN peer sharing columns to devices.
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('devices', sa.Column('peer_url', sa.String(), nullable=True))
+    op.add_column('devices', sa.Column('site_network', sa.String(), nullable=True))
+    op.create_index('ix_devices_site_network', 'devices', ['site_network'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_devices_site_network', table_name='devices')
+    op.drop_column('devices', 'site_network')
+    op.drop_column('devices', 'peer_url')
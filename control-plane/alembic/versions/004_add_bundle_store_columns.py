@@ -0,0 +1,26 @@
+"""Track bundle sizes and device bundle store inventory.
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('bundles', sa.Column('size_bytes', sa.BigInteger(), nullable=True))
+    op.add_column('devices', sa.Column('bundle_store', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('devices', 'bundle_store')
+    op.drop_column('bundles', 'size_bytes')
@@ -0,0 +1,35 @@
+"""Add bundle pinning/purge columns and indexes for bundle GC.
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('bundles', sa.Column('pinned', sa.Boolean(), nullable=False, server_default=sa.false()))
+    op.add_column('bundles', sa.Column('purged_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index(
+        'ix_device_bundle_history_status_deployed',
+        'device_bundle_history',
+        ['status', 'deployed_at', 'bundle_id'],
+        unique=False,
+    )
+    op.create_index('ix_devices_current_bundle_version', 'devices', ['current_bundle_version'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_devices_current_bundle_version', table_name='devices')
+    op.drop_index('ix_device_bundle_history_status_deployed', table_name='device_bundle_history')
+    op.drop_column('bundles', 'purged_at')
+    op.drop_column('bundles', 'pinned')
@@ -0,0 +1,36 @@
+"""Index the columns list endpoints filter on.
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_devices_org_id', 'devices', ['org_id']),
+    ('ix_devices_device_type', 'devices', ['device_type']),
+    ('ix_devices_status', 'devices', ['status']),
+    ('ix_devices_last_heartbeat', 'devices', ['last_heartbeat']),
+    ('ix_bundles_org_id', 'bundles', ['org_id']),
+    ('ix_deployments_org_id', 'deployments', ['org_id']),
+    ('ix_deployments_bundle_id', 'deployments', ['bundle_id']),
+    ('ix_deployments_status', 'deployments', ['status']),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    for name, table, _columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,51 @@
+"""Add fleet_counters for the fleet overview.
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'fleet_counters',
+        sa.Column('dimension', sa.String(), nullable=False),
+        sa.Column('value', sa.String(), nullable=False),
+        sa.Column('count', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('dimension', 'value'),
+    )
+    # Seed from the current tables; the metrics aggregator keeps them honest
+    op.execute(
+        "INSERT INTO fleet_counters (dimension, value, count) "
+        "SELECT 'devices', '', COUNT(*) FROM devices"
+    )
+    for dimension, column in (
+        ('status', 'status'),
+        ('bundle_version', 'current_bundle_version'),
+        ('device_type', 'device_type'),
+    ):
+        op.execute(
+            f"INSERT INTO fleet_counters (dimension, value, count) "
+            f"SELECT '{dimension}', COALESCE({column}, ''), COUNT(*) FROM devices "
+            f"GROUP BY COALESCE({column}, '')"
+        )
+    op.execute(
+        "INSERT INTO fleet_counters (dimension, value, count) "
+        "SELECT 'deployment_status', COALESCE(status, ''), COUNT(*) FROM deployments "
+        "GROUP BY COALESCE(status, '')"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('fleet_counters')
@@ -0,0 +1,93 @@
+"""Normalize device tags and deployment targets.
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+TARGET_STATUSES = {'pending', 'in_progress', 'success', 'failed'}
+
+
+def _as_json(raw):
+    if isinstance(raw, str):
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+    return raw
+
+
+def upgrade() -> None:
+    op.create_table(
+        'device_tags',
+        sa.Column('device_id', sa.String(), sa.ForeignKey('devices.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('value', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('device_id', 'key'),
+    )
+    op.create_index('ix_device_tags_key_value', 'device_tags', ['key', 'value', 'device_id'], unique=False)
+
+    op.add_column('deployments', sa.Column('selector', sa.String(), nullable=True))
+    op.add_column('deployments', sa.Column('target_count', sa.Integer(), nullable=True))
+    op.create_table(
+        'deployment_targets',
+        sa.Column('deployment_id', sa.String(), sa.ForeignKey('deployments.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('device_id', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('deployment_id', 'device_id'),
+    )
+    op.create_index('ix_deployment_targets_device_id', 'deployment_targets', ['device_id'], unique=False)
+
+    bind = op.get_bind()
+    tag_rows = []
+    for device_pk, tags in bind.execute(sa.text("SELECT id, tags FROM devices WHERE tags IS NOT NULL")):
+        tags = _as_json(tags)
+        if isinstance(tags, dict):
+            tag_rows.extend({'device_id': device_pk, 'key': str(k), 'value': str(v)} for k, v in tags.items())
+    if tag_rows:
+        bind.execute(
+            sa.text("INSERT INTO device_tags (device_id, key, value) VALUES (:device_id, :key, :value)"),
+            tag_rows,
+        )
+
+    target_rows = []
+    counts = []
+    for deployment_id, status, targets in bind.execute(
+        sa.text("SELECT id, status, target_device_ids FROM deployments")
+    ):
+        device_ids = list(dict.fromkeys(_as_json(targets) or []))
+        target_status = status if status in TARGET_STATUSES else 'failed'
+        target_rows.extend({'deployment_id': deployment_id, 'device_id': d, 'status': target_status} for d in device_ids)
+        counts.append({'id': deployment_id, 'count': len(device_ids)})
+    if target_rows:
+        bind.execute(
+            sa.text(
+                "INSERT INTO deployment_targets (deployment_id, device_id, status) "
+                "VALUES (:deployment_id, :device_id, :status)"
+            ),
+            target_rows,
+        )
+    if counts:
+        bind.execute(sa.text("UPDATE deployments SET target_count = :count WHERE id = :id"), counts)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_deployment_targets_device_id', table_name='deployment_targets')
+    op.drop_table('deployment_targets')
+    op.drop_column('deployments', 'target_count')
+    op.drop_column('deployments', 'selector')
+    op.drop_index('ix_device_tags_key_value', table_name='device_tags')
+    op.drop_table('device_tags')
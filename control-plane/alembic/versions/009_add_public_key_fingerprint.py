@@ -0,0 +1,51 @@
+"""Look devices up by a SHA-256 public key fingerprint.
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def _fingerprint(public_key: str) -> str:
+    # Must match app.models.device.public_key_fingerprint
+    return hashlib.sha256("".join(public_key.split()).encode()).hexdigest()
+
+
+def upgrade() -> None:
+    op.add_column('devices', sa.Column('public_key_fingerprint', sa.String(length=64), nullable=True))
+
+    bind = op.get_bind()
+    rows = bind.execute(sa.text("SELECT id, public_key FROM devices")).fetchall()
+    for start in range(0, len(rows), BATCH_SIZE):
+        bind.execute(
+            sa.text("UPDATE devices SET public_key_fingerprint = :fingerprint WHERE id = :id"),
+            [{'id': pk, 'fingerprint': _fingerprint(key)} for pk, key in rows[start:start + BATCH_SIZE]],
+        )
+
+    with op.batch_alter_table('devices') as batch:
+        batch.alter_column('public_key_fingerprint', existing_type=sa.String(length=64), nullable=False)
+    op.create_index('ix_devices_public_key_fingerprint', 'devices', ['public_key_fingerprint'], unique=True)
+    if bind.dialect.name == 'postgresql':
+        # The fingerprint index now enforces uniqueness; drop the wide PEM index
+        op.execute('ALTER TABLE devices DROP CONSTRAINT IF EXISTS devices_public_key_key')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.create_unique_constraint('devices_public_key_key', 'devices', ['public_key'])
+    op.drop_index('ix_devices_public_key_fingerprint', table_name='devices')
+    op.drop_column('devices', 'public_key_fingerprint')
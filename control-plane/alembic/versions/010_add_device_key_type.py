@@ -0,0 +1,24 @@
+"""Record the device key type.
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('devices', sa.Column('key_type', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('devices', 'key_type')
@@ -0,0 +1,28 @@
+"""Index bundle history for rollback validation.
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_device_bundle_history_device_version_status',
+        'device_bundle_history',
+        ['device_id', 'bundle_version', 'status'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_device_bundle_history_device_version_status', table_name='device_bundle_history')
@@ -0,0 +1,59 @@
+"""Materialize last/previous good bundle versions on devices.
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('devices', sa.Column('last_good_bundle_version', sa.String(), nullable=True))
+    op.add_column('devices', sa.Column('previous_good_bundle_version', sa.String(), nullable=True))
+    op.create_index(
+        'ix_device_bundle_history_device_deployed',
+        'device_bundle_history',
+        ['device_id', 'deployed_at'],
+        unique=False,
+    )
+
+    # Backfill: the two most recently succeeded distinct versions per device
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT device_id, bundle_version, MAX(deployed_at) AS last_deployed "
+        "FROM device_bundle_history WHERE status = 'success' "
+        "GROUP BY device_id, bundle_version "
+        "ORDER BY device_id, last_deployed DESC"
+    )).fetchall()
+    latest: dict = {}
+    for device_pk, version, _ in rows:
+        versions = latest.setdefault(device_pk, [])
+        if len(versions) < 2:
+            versions.append(version)
+    updates = [
+        {'id': pk, 'last': versions[0], 'previous': versions[1] if len(versions) > 1 else None}
+        for pk, versions in latest.items()
+    ]
+    if updates:
+        bind.execute(
+            sa.text(
+                "UPDATE devices SET last_good_bundle_version = :last, "
+                "previous_good_bundle_version = :previous WHERE id = :id"
+            ),
+            updates,
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_device_bundle_history_device_deployed', table_name='device_bundle_history')
+    op.drop_column('devices', 'previous_good_bundle_version')
+    op.drop_column('devices', 'last_good_bundle_version')
@@ -0,0 +1,44 @@
+"""Add the append-only events table behind /logs.
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '013'
+down_revision = '012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'events',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('level', sa.String(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('device_id', sa.String(), nullable=True),
+        sa.Column('deployment_id', sa.String(), nullable=True),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_events_timestamp_id', 'events', ['timestamp', 'id'], unique=False)
+    # Seed with the state of existing deployments so the log is not empty
+    op.execute(
+        "INSERT INTO events (timestamp, level, kind, deployment_id, message) "
+        "SELECT COALESCE(completed_at, created_at), "
+        "CASE WHEN status = 'failed' THEN 'ERROR' ELSE 'INFO' END, "
+        "'deployment', id, 'Deployment ' || id || ' ' || status "
+        "FROM deployments ORDER BY COALESCE(completed_at, created_at)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_events_timestamp_id', table_name='events')
+    op.drop_table('events')
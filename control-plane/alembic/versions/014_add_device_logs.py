@@ -0,0 +1,38 @@
+"""Add device_logs for agent log shipping.
+
+Revision ID: 014
+Revises: 013
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '014'
+down_revision = '013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'device_logs',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('device_id', sa.String(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('received_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('level', sa.String(), nullable=False),
+        sa.Column('logger', sa.String(), nullable=True),
+        sa.Column('source', sa.String(), nullable=True),
+        sa.Column('deployment_id', sa.String(), nullable=True),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_device_logs_device_timestamp', 'device_logs', ['device_id', 'timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_device_logs_device_timestamp', table_name='device_logs')
+    op.drop_table('device_logs')
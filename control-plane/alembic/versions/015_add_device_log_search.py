@@ -0,0 +1,59 @@
+"""Index device_logs for level/time queries and full-text search.
+
+Revision ID: 015
+Revises: 014
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '015'
+down_revision = '014'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.drop_index('ix_device_logs_device_timestamp', table_name='device_logs')
+    op.create_index(
+        'ix_device_logs_device_ts_level', 'device_logs', ['device_id', 'timestamp', 'level'], unique=False
+    )
+    op.create_index('ix_device_logs_timestamp_id', 'device_logs', ['timestamp', 'id'], unique=False)
+
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute(
+            "CREATE INDEX ix_device_logs_message_fts ON device_logs "
+            "USING gin (to_tsvector('simple'::regconfig, message))"
+        )
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE device_logs_fts "
+            "USING fts5(message, content='device_logs', content_rowid='id')"
+        )
+        op.execute(
+            "CREATE TRIGGER device_logs_fts_insert AFTER INSERT ON device_logs BEGIN "
+            "INSERT INTO device_logs_fts(rowid, message) VALUES (new.id, new.message); END"
+        )
+        op.execute(
+            "CREATE TRIGGER device_logs_fts_delete AFTER DELETE ON device_logs BEGIN "
+            "INSERT INTO device_logs_fts(device_logs_fts, rowid, message) "
+            "VALUES ('delete', old.id, old.message); END"
+        )
+        op.execute("INSERT INTO device_logs_fts(device_logs_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_index('ix_device_logs_message_fts', table_name='device_logs')
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS device_logs_fts_delete")
+        op.execute("DROP TRIGGER IF EXISTS device_logs_fts_insert")
+        op.execute("DROP TABLE IF EXISTS device_logs_fts")
+    op.drop_index('ix_device_logs_timestamp_id', table_name='device_logs')
+    op.drop_index('ix_device_logs_device_ts_level', table_name='device_logs')
+    op.create_index('ix_device_logs_device_timestamp', 'device_logs', ['device_id', 'timestamp'], unique=False)
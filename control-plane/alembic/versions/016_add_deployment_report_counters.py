@@ -0,0 +1,34 @@
+"""Count reported and failed targets on deployments.
+
+Revision ID: 016
+Revises: 015
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '016'
+down_revision = '015'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('deployments', sa.Column('reported_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('deployments', sa.Column('failed_count', sa.Integer(), nullable=False, server_default='0'))
+    # Seed from the target rows; results keep them current from here on
+    op.execute(
+        "UPDATE deployments SET "
+        "reported_count = (SELECT COUNT(*) FROM deployment_targets t "
+        "WHERE t.deployment_id = deployments.id AND t.status IN ('success', 'failed')), "
+        "failed_count = (SELECT COUNT(*) FROM deployment_targets t "
+        "WHERE t.deployment_id = deployments.id AND t.status = 'failed')"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('deployments', 'failed_count')
+    op.drop_column('deployments', 'reported_count')
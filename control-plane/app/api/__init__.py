@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1 import devices, bundles, deployments, device_config, auth, logs
+from app.api.v1 import devices, bundles, deployments, device_config, auth, logs, fleet, admin
 
 api_router = APIRouter()
 api_router.include_router(devices.router)
@@ -8,3 +8,5 @@ api_router.include_router(deployments.router)
 api_router.include_router(device_config.router)
 api_router.include_router(auth.router)
 api_router.include_router(logs.router)
+api_router.include_router(fleet.router)
+api_router.include_router(admin.router)
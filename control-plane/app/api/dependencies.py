@@ -1,16 +1,39 @@
-from fastapi import Depends, HTTPException, status
+import math
+
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from sqlalchemy import select
+from sqlalchemy import event as sa_event, inspect, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
-from app.auth import decode_token
+from app.auth import PrincipalCache, User as Principal, decode_token
 from app.config import get_settings
 from app.db.session import get_session
 from app.models.user import User
+from app.services.device_auth import (
+    DEVICE_HEADER,
+    SIGNATURE_HEADER,
+    TIMESTAMP_HEADER,
+    canonical_path,
+    check_signature,
+    device_secret,
+)
 
 settings = get_settings()
 bearer_scheme = HTTPBearer(auto_error=False)
 
+# Validated tokens, so management calls skip the user lookup. Deactivations
+# in this process take effect at once; those made by other workers within
+# AUTH_CACHE_TTL_SECONDS.
+principal_cache = PrincipalCache(settings.auth_cache_ttl_seconds, settings.auth_cache_max_entries)
+
+# Set by RateLimitMiddleware on signed device requests: charges the device's bucket
+DEVICE_BUDGET_SCOPE_KEY = "kernex.device_budget"
+
+_STALE_KEY = "stale_principals"
+# Stands for "every user" after a bulk UPDATE or DELETE on the user table
+_ALL_USERS = object()
+
 
 def _auth_required() -> bool:
     if settings.require_admin_auth:
@@ -21,7 +44,7 @@ def _auth_required() -> bool:
 async def require_admin_user(
     credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
     session: AsyncSession = Depends(get_session),
-) -> User | None:
+) -> Principal | None:
     """
     Require a valid user token for management APIs.
     In non-production environments this is optional unless REQUIRE_ADMIN_AUTH is enabled.
@@ -36,7 +59,12 @@ async def require_admin_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    payload = decode_token(credentials.credentials)
+    token = credentials.credentials
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
+    payload = decode_token(token)
     username = payload.get("username") if payload else None
     if not username:
         raise HTTPException(
@@ -57,4 +85,129 @@ async def require_admin_user(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="User is inactive",
         )
-    return user
+    principal = Principal.model_validate(user)
+    principal_cache.put(token, principal, payload.get("exp"))
+    return principal
+
+
+def device_auth_required() -> bool:
+    if settings.require_device_auth:
+        return True
+    return settings.environment.lower() == "production"
+
+
+async def authenticate_device(request: Request, session: AsyncSession) -> str | None:
+    """
+    Verify the request's device signature and return the signing device id.
+
+    Unsigned requests pass (returning None) only while device auth is not
+    required; a signature that is present is always checked.
+    """
+    device_id = request.headers.get(DEVICE_HEADER)
+    if device_id is None:
+        if device_auth_required():
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing device signature")
+        return None
+    secret = await device_secret(session, device_id)
+    if secret is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unknown device")
+    path = canonical_path(
+        request.scope.get("raw_path", request.url.path.encode()).decode("latin-1"),
+        request.scope.get("query_string", b"").decode("latin-1"),
+        settings.api_prefix,
+    )
+    try:
+        check_signature(
+            secret,
+            request.method,
+            path,
+            request.headers.get(TIMESTAMP_HEADER),
+            request.headers.get(SIGNATURE_HEADER),
+            await request.body(),
+            settings.device_auth_max_skew_seconds,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(exc))
+    take_device_budget = request.scope.get(DEVICE_BUDGET_SCOPE_KEY)
+    if take_device_budget is not None:
+        allowed, retry_after = await take_device_budget(device_id)
+        if not allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+    return device_id
+
+
+async def require_device(
+    device_id: str,
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+) -> None:
+    """Require the ``device_id`` path or query parameter's own signature on device endpoints."""
+    signer = await authenticate_device(request, session)
+    if signer is not None and signer != device_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Signed by a different device")
+
+
+async def require_device_or_admin(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
+    session: AsyncSession = Depends(get_session),
+) -> None:
+    """Any signed device, or else an admin token (bundle downloads)."""
+    if DEVICE_HEADER in request.headers or not _auth_required():
+        await authenticate_device(request, session)
+    else:
+        await require_admin_user(credentials, session)
+
+
+def _invalidate(stale) -> None:
+    if _ALL_USERS in stale:
+        principal_cache.clear()
+        return
+    for username in stale:
+        principal_cache.invalidate_user(username)
+
+
+@sa_event.listens_for(Session, "after_flush")
+def _collect_stale_principals(session: Session, _flush_context) -> None:
+    stale = set()
+    for obj in session.dirty | session.deleted:
+        if not isinstance(obj, User):
+            continue
+        if obj in session.deleted:
+            stale.add(obj.username)
+            continue
+        state = inspect(obj)
+        if state.attrs.is_active.history.has_changes():
+            stale.add(obj.username)
+        # A rename leaves the old name's tokens pointing at nobody
+        stale.update(state.attrs.username.history.deleted)
+    if stale:
+        # Drop now so this transaction's own requests see the change, and
+        # again after commit in case a concurrent request re-cached the row
+        _invalidate(stale)
+        session.info.setdefault(_STALE_KEY, set()).update(stale)
+
+
+@sa_event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_user_changes(orm_execute_state) -> None:
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and (
+        orm_execute_state.bind_mapper is not None and orm_execute_state.bind_mapper.class_ is User
+    ):
+        principal_cache.clear()
+        orm_execute_state.session.info.setdefault(_STALE_KEY, set()).add(_ALL_USERS)
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    stale = session.info.pop(_STALE_KEY, None)
+    if stale:
+        _invalidate(stale)
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard_stale(session: Session) -> None:
+    session.info.pop(_STALE_KEY, None)
@@ -0,0 +1,97 @@
+"""
+Keyset pagination, sparse field selection and cheap totals for list endpoints.
+
+Pages are ordered on a unique, indexed key column. The cursor is an opaque
+token holding the last key of the previous page, so each page is an index
+range scan (``WHERE key > :last ORDER BY key LIMIT n``) no matter how deep
+the client has paged.
+"""
+import base64
+import binascii
+import json
+from typing import Any, Optional, Sequence
+
+from fastapi import HTTPException, status
+from sqlalchemy import Select, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(value: Any) -> str:
+    raw = json.dumps({"k": value}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Any:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))["k"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str], always: Sequence[str]) -> list[str]:
+    """
+    Resolve a comma-separated ``fields`` parameter.
+
+    Returns every allowed field when ``fields`` is empty. Fields in ``always``
+    (the pagination key) are included regardless.
+    """
+    if not fields:
+        return list(allowed)
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = sorted(set(requested) - set(allowed))
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}",
+        )
+    selected = list(always)
+    selected.extend(name for name in requested if name not in selected)
+    return selected
+
+
+async def fetch_page(
+    session: AsyncSession,
+    query: Select,
+    key_column,
+    cursor: Optional[str],
+    limit: int,
+) -> tuple[list, Optional[str]]:
+    """
+    Run ``query`` for one page ordered by ``key_column``.
+
+    Returns the rows and the cursor for the next page (None on the last page).
+    """
+    if cursor:
+        query = query.where(key_column > decode_cursor(cursor))
+    result = await session.execute(query.order_by(key_column).limit(limit + 1))
+    rows = list(result.all())
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]._mapping[key_column.key])
+    return rows, next_cursor
+
+
+async def count_rows(session: AsyncSession, query: Select, table_name: str, filtered: bool) -> tuple[int, bool]:
+    """
+    Total rows matched by ``query`` and whether the figure is an estimate.
+
+    Unfiltered listings on PostgreSQL use the planner's row estimate from
+    ``pg_class`` instead of scanning the table. Filtered listings, and other
+    databases, run ``COUNT(*)`` over the filtered query with no columns or
+    ordering, which the indexes can usually answer.
+    """
+    if not filtered and session.bind.dialect.name == "postgresql":
+        estimate = await session.scalar(
+            text("SELECT reltuples::bigint FROM pg_class WHERE relname = :name"),
+            {"name": table_name},
+        )
+        # -1 means the table has never been analyzed
+        if estimate is not None and estimate >= 0:
+            return int(estimate), True
+    counted = query.with_only_columns(func.count(), maintain_column_froms=True).order_by(None)
+    return int(await session.scalar(counted) or 0), False
@@ -0,0 +1,85 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import PlainTextResponse
+
+from app.api.dependencies import require_admin_user
+from app.db.instrumentation import query_instrumentation
+from app.profiling import ProfilerBusy, collapsed, memory_tracer, sampling_profiler
+from app.schemas.admin import (
+    DbInstrumentationSettings,
+    DbInstrumentationUpdate,
+    TracemallocSnapshot,
+    TracemallocStart,
+)
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.get("/db-instrumentation", response_model=DbInstrumentationSettings)
+async def get_db_instrumentation(_admin=Depends(require_admin_user)) -> DbInstrumentationSettings:
+    """Current query instrumentation settings for this worker."""
+    return DbInstrumentationSettings(**query_instrumentation.as_dict())
+
+
+@router.put("/db-instrumentation", response_model=DbInstrumentationSettings)
+async def update_db_instrumentation(
+    payload: DbInstrumentationUpdate,
+    _admin=Depends(require_admin_user),
+) -> DbInstrumentationSettings:
+    """Change query instrumentation at runtime; applies to this worker process only."""
+    for field, value in payload.model_dump(exclude_none=True).items():
+        setattr(query_instrumentation, field, value)
+    return DbInstrumentationSettings(**query_instrumentation.as_dict())
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    seconds: float = Query(default=10, gt=0, le=120),
+    interval_ms: float = Query(default=5, ge=1, le=1000),
+    _admin=Depends(require_admin_user),
+) -> PlainTextResponse:
+    """
+    Sample this worker's threads and asyncio tasks for ``seconds``.
+
+    Returns collapsed stacks for flamegraph.pl, speedscope or inferno.
+    """
+    try:
+        stacks = await asyncio.to_thread(
+            sampling_profiler.profile, seconds, interval_ms / 1000, asyncio.get_running_loop()
+        )
+    except ProfilerBusy:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A profile is already running on this worker",
+        )
+    return PlainTextResponse(collapsed(stacks))
+
+
+@router.post("/tracemalloc", status_code=status.HTTP_204_NO_CONTENT)
+async def start_tracemalloc(
+    payload: TracemallocStart,
+    _admin=Depends(require_admin_user),
+) -> Response:
+    """Start tracing allocations on this worker and take the baseline snapshot."""
+    await asyncio.to_thread(memory_tracer.start, payload.frames)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.get("/tracemalloc/snapshot", response_model=TracemallocSnapshot)
+async def tracemalloc_snapshot(
+    limit: int = Query(default=25, ge=1, le=500),
+    _admin=Depends(require_admin_user),
+) -> TracemallocSnapshot:
+    """Largest allocation sites, and what grew since the previous snapshot."""
+    try:
+        return TracemallocSnapshot(**await asyncio.to_thread(memory_tracer.snapshot, limit))
+    except RuntimeError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc))
+
+
+@router.delete("/tracemalloc", status_code=status.HTTP_204_NO_CONTENT)
+async def stop_tracemalloc(_admin=Depends(require_admin_user)) -> Response:
+    """Stop tracing and free the traces."""
+    memory_tracer.stop()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
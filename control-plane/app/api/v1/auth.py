@@ -6,8 +6,8 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth import (
-    hash_password,
-    verify_password,
+    PasswordHasherBusy,
+    password_hasher,
     create_access_token,
     decode_token,
     ACCESS_TOKEN_EXPIRE_MINUTES,
@@ -22,6 +22,14 @@ from app.models.user import User
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
+def _hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many concurrent logins, retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
 @router.post("/register", response_model=UserResponse)
 async def register(
     user_data: UserCreate,
@@ -48,11 +56,16 @@ async def register(
             detail="Email already registered",
         )
 
+    try:
+        hashed_password = await password_hasher.hash(user_data.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+
     # Create new user
     user = User(
         username=user_data.username,
         email=user_data.email,
-        hashed_password=hash_password(user_data.password),
+        hashed_password=hashed_password,
     )
     session.add(user)
     await session.commit()
@@ -72,7 +85,11 @@ async def login(
         select(User).where(User.username == credentials.username)
     )
 
-    if not user or not verify_password(credentials.password, user.hashed_password):
+    try:
+        valid = user is not None and await password_hasher.verify(credentials.password, user.hashed_password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials",
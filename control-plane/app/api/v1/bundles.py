@@ -3,16 +3,21 @@ import json
 from pathlib import Path
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status
+from fastapi import (
+    APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, UploadFile, File, Form, status
+)
 from fastapi.responses import FileResponse
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy import select
 
 from app.config import get_settings
-from app.api.dependencies import require_admin_user
+from app.api.dependencies import require_admin_user, require_device_or_admin
+from app.api.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, count_rows, fetch_page, parse_fields
 from app.db.session import get_session
 from app.models.bundle import Bundle
 from app.schemas.bundle import BundleCreateResponse, BundleListResponse, BundleListItem
+from app.services.bundle_service import validate_manifest_files
+from app.workers.cleanup_worker import collect_bundle_garbage, gc_jobs, new_gc_job, run_gc_job
 
 router = APIRouter(prefix="/bundles", tags=["bundles"])
 
@@ -45,6 +50,11 @@ async def upload_bundle(
     version = manifest_json.get("version")
     if not version:
         raise HTTPException(status_code=400, detail="Manifest must include version")
+    if "files" in manifest_json:
+        try:
+            validate_manifest_files(manifest_json["files"])
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
 
     storage_dir = Path(settings.bundle_storage_path)
     storage_dir.mkdir(parents=True, exist_ok=True)
@@ -63,6 +73,7 @@ async def upload_bundle(
         model_name=manifest_json.get("model", {}).get("name") if isinstance(manifest_json.get("model"), dict) else None,
         model_size_mb=manifest_json.get("model", {}).get("size_mb") if isinstance(manifest_json.get("model"), dict) else None,
         checksum_sha256=checksum,
+        size_bytes=len(content),
         manifest=manifest_json,
         storage_path=str(target_path),
     )
@@ -71,38 +82,90 @@ async def upload_bundle(
     return BundleCreateResponse(bundle_id=bundle.id, version=version, checksum_sha256=checksum)
 
 
-@router.get("", response_model=BundleListResponse, status_code=status.HTTP_200_OK)
+BUNDLE_LIST_FIELDS = {
+    "id": Bundle.id,
+    "version": Bundle.version,
+    "checksum_sha256": Bundle.checksum_sha256,
+    "size_bytes": Bundle.size_bytes,
+    "pinned": Bundle.pinned,
+    "created_at": Bundle.created_at,
+}
+
+
+@router.get(
+    "",
+    response_model=BundleListResponse,
+    response_model_exclude_unset=True,
+    status_code=status.HTTP_200_OK,
+)
 async def list_bundles(
+    cursor: Optional[str] = None,
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    version: Optional[str] = None,
+    org_id: Optional[str] = None,
+    include_purged: bool = False,
+    fields: Optional[str] = Query(default=None, description="Comma-separated fields to return"),
     _admin=Depends(require_admin_user),
     session: AsyncSession = Depends(get_session),
 ) -> BundleListResponse:
-    result = await session.execute(select(Bundle))
-    bundles = result.scalars().all()
+    selected = parse_fields(fields, list(BUNDLE_LIST_FIELDS), always=("id",))
+    query = select(*(BUNDLE_LIST_FIELDS[name] for name in selected))
+    conditions = []
+    if version is not None:
+        conditions.append(Bundle.version == version)
+    if org_id is not None:
+        conditions.append(Bundle.org_id == org_id)
+    if not include_purged:
+        conditions.append(Bundle.purged_at.is_(None))
+    query = query.where(*conditions)
+
+    rows, next_cursor = await fetch_page(session, query, Bundle.id, cursor, limit)
+    # Purged bundles are filtered out by default, so only include_purged can use the table estimate
+    total, estimated = await count_rows(session, query, Bundle.__tablename__, filtered=bool(conditions))
+    bundles = []
+    for row in rows:
+        values = dict(row._mapping)
+        if values.get("created_at") is not None:
+            values["created_at"] = values["created_at"].isoformat()
+        bundles.append(BundleListItem(**values))
     return BundleListResponse(
-        bundles=[
-            BundleListItem(
-                id=b.id,
-                version=b.version,
-                checksum_sha256=b.checksum_sha256,
-                created_at=b.created_at.isoformat() if b.created_at else None,
-            )
-            for b in bundles
-        ]
+        bundles=bundles,
+        total=total,
+        total_is_estimate=estimated,
+        next_cursor=next_cursor,
     )
 
 
 @router.get("/{bundle_id}", status_code=status.HTTP_200_OK)
-async def download_bundle(bundle_id: str, session: AsyncSession = Depends(get_session)):
+async def download_bundle(
+    bundle_id: str,
+    request: Request,
+    _reader=Depends(require_device_or_admin),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Stream a bundle file.
+
+    ``If-None-Match`` with ``*`` or the bundle's ETag gets 304 once the
+    caller is authorized, which is how caching relays check each requester
+    without transferring the file again.
+    """
     bundle = await session.scalar(select(Bundle).where(Bundle.id == bundle_id))
     if not bundle:
         raise HTTPException(status_code=404, detail="Bundle not found")
     path = Path(bundle.storage_path)
     if not path.exists():
         raise HTTPException(status_code=410, detail="Bundle file missing")
+    etag = f'"{bundle.checksum_sha256}"'
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and {"*", etag} & {tag.strip() for tag in if_none_match.split(",")}:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
     return FileResponse(
         path=path,
         filename=path.name,
-        media_type="application/octet-stream"
+        media_type="application/octet-stream",
+        # Lets caching relays verify blobs without an extra round trip
+        headers={"X-Checksum-SHA256": bundle.checksum_sha256, "ETag": etag},
     )
 
 
@@ -121,3 +184,65 @@ async def verify_bundle(
         raise HTTPException(status_code=410, detail="Bundle file missing")
     actual_checksum = await _compute_sha256(path)
     return {"valid": provided_checksum == actual_checksum if provided_checksum else True, "checksum": actual_checksum}
+
+
+@router.post("/gc", status_code=status.HTTP_200_OK)
+async def collect_garbage(
+    response: Response,
+    background_tasks: BackgroundTasks,
+    dry_run: bool = True,
+    _admin=Depends(require_admin_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Report what GC would remove, or with ``dry_run=false`` start a collection.
+
+    A real collection pauses between batches and can take minutes, so it runs
+    after the response as a job; poll ``GET /bundles/gc/jobs/{job_id}``.
+    """
+    if dry_run:
+        report = await collect_bundle_garbage(session, dry_run=True)
+        return report.to_dict()
+    try:
+        job = new_gc_job()
+    except RuntimeError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc))
+    # The request's session is closed before background tasks run
+    background_tasks.add_task(run_gc_job, job, async_sessionmaker(bind=session.bind, expire_on_commit=False))
+    response.status_code = status.HTTP_202_ACCEPTED
+    return job.to_dict()
+
+
+@router.get("/gc/jobs/{job_id}", status_code=status.HTTP_200_OK)
+async def get_gc_job(job_id: str, _admin=Depends(require_admin_user)):
+    job = gc_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="GC job not found")
+    return job.to_dict()
+
+
+async def _set_pinned(session: AsyncSession, bundle_id: str, pinned: bool) -> dict:
+    bundle = await session.scalar(select(Bundle).where(Bundle.id == bundle_id))
+    if not bundle:
+        raise HTTPException(status_code=404, detail="Bundle not found")
+    bundle.pinned = pinned
+    await session.commit()
+    return {"bundle_id": bundle.id, "pinned": bundle.pinned}
+
+
+@router.post("/{bundle_id}/pin", status_code=status.HTTP_200_OK)
+async def pin_bundle(
+    bundle_id: str,
+    _admin=Depends(require_admin_user),
+    session: AsyncSession = Depends(get_session),
+):
+    return await _set_pinned(session, bundle_id, True)
+
+
+@router.delete("/{bundle_id}/pin", status_code=status.HTTP_200_OK)
+async def unpin_bundle(
+    bundle_id: str,
+    _admin=Depends(require_admin_user),
+    session: AsyncSession = Depends(get_session),
+):
+    return await _set_pinned(session, bundle_id, False)
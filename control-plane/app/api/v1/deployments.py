@@ -1,20 +1,31 @@
 from datetime import datetime
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.db.session import get_session
-from app.api.dependencies import require_admin_user
+from app.api.dependencies import require_admin_user, require_device
+from app.api.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, count_rows, fetch_page, parse_fields
 from app.models.bundle import Bundle
 from app.models.deployment import Deployment
 from app.models.device import Device
 from app.models.device_config import DeviceBundleHistory
+from app.services.deployment_service import (
+    create_deployment_targets,
+    get_target,
+    record_good_version,
+    record_target_result,
+    target_device_ids,
+)
+from app.services.event_service import ERROR, INFO, WARNING, record_deployment_event, record_event
+from app.services.fleet_service import count_new_deployment, set_deployment_status, set_device_attribute
 from app.schemas.deployment import (
     DeploymentCreateRequest,
     DeploymentCreateResponse,
     DeploymentDetail,
+    DeploymentListItem,
     DeploymentListResponse,
 )
 
@@ -27,47 +38,101 @@ async def create_deployment(
     _admin=Depends(require_admin_user),
     session: AsyncSession = Depends(get_session),
 ) -> DeploymentCreateResponse:
-    bundle = await session.scalar(select(Bundle).where(Bundle.version == payload.bundle_version))
+    if payload.selector and payload.target_devices:
+        raise HTTPException(status_code=400, detail="Use either target_devices or selector, not both")
+    # Locked so bundle GC cannot purge it while the deployment is being created
+    bundle = await session.scalar(
+        select(Bundle).where(Bundle.version == payload.bundle_version).with_for_update()
+    )
     if not bundle:
         raise HTTPException(status_code=404, detail="Bundle version not found")
+    if bundle.purged_at is not None:
+        raise HTTPException(status_code=410, detail="Bundle version has been garbage-collected")
     deployment = Deployment(
         bundle_id=bundle.id,
-        target_device_ids=payload.target_devices,
+        target_device_ids=[] if payload.selector else payload.target_devices,
+        selector=payload.selector,
         status="pending",
     )
     session.add(deployment)
+    await session.flush()
+    try:
+        target_count = await create_deployment_targets(
+            session, deployment, device_ids=payload.target_devices, selector=payload.selector
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if payload.selector and target_count == 0:
+        raise HTTPException(status_code=400, detail="Selector matched no devices")
+    await count_new_deployment(session, deployment.status)
+    await record_deployment_event(
+        session, deployment, f"created for {target_count} devices (bundle {payload.bundle_version})"
+    )
     await session.commit()
-    return DeploymentCreateResponse(deployment_id=deployment.id, status=deployment.status)
+    return DeploymentCreateResponse(
+        deployment_id=deployment.id, status=deployment.status, target_count=target_count
+    )
+
 
+DEPLOYMENT_LIST_FIELDS = {
+    "id": Deployment.id,
+    "bundle_id": Deployment.bundle_id,
+    "bundle_version": Bundle.version.label("bundle_version"),
+    "status": Deployment.status,
+    "target_devices": Deployment.target_device_ids.label("target_devices"),
+    "selector": Deployment.selector,
+    "target_count": Deployment.target_count,
+    "created_at": Deployment.created_at,
+    "completed_at": Deployment.completed_at,
+    "error_message": Deployment.error_message,
+}
 
-@router.get("", response_model=DeploymentListResponse, status_code=status.HTTP_200_OK)
+
+@router.get(
+    "",
+    response_model=DeploymentListResponse,
+    response_model_exclude_unset=True,
+    status_code=status.HTTP_200_OK,
+)
 async def list_deployments(
+    cursor: Optional[str] = None,
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    status_filter: Optional[str] = Query(default=None, alias="status"),
+    bundle_version: Optional[str] = None,
+    org_id: Optional[str] = None,
+    fields: Optional[str] = Query(default=None, description="Comma-separated fields to return"),
     _admin=Depends(require_admin_user),
     session: AsyncSession = Depends(get_session),
 ) -> DeploymentListResponse:
-    result = await session.execute(select(Deployment))
-    deployments = result.scalars().all()
-    # fetch bundle versions
-    bundle_ids = {d.bundle_id for d in deployments}
-    bundle_map = {}
-    if bundle_ids:
-        bundles = await session.execute(select(Bundle).where(Bundle.id.in_(bundle_ids)))
-        for b in bundles.scalars():
-            bundle_map[b.id] = b.version
+    selected = parse_fields(fields, list(DEPLOYMENT_LIST_FIELDS), always=("id",))
+    query = select(*(DEPLOYMENT_LIST_FIELDS[name] for name in selected)).select_from(Deployment)
+    if "bundle_version" in selected or bundle_version is not None:
+        query = query.outerjoin(Bundle, Bundle.id == Deployment.bundle_id)
+    conditions = []
+    if status_filter is not None:
+        conditions.append(Deployment.status == status_filter)
+    if bundle_version is not None:
+        conditions.append(Bundle.version == bundle_version)
+    if org_id is not None:
+        conditions.append(Deployment.org_id == org_id)
+    query = query.where(*conditions)
+
+    rows, next_cursor = await fetch_page(session, query, Deployment.id, cursor, limit)
+    total, estimated = await count_rows(session, query, Deployment.__tablename__, filtered=bool(conditions))
+    deployments = []
+    for row in rows:
+        values = dict(row._mapping)
+        for name in ("created_at", "completed_at"):
+            if values.get(name) is not None:
+                values[name] = values[name].isoformat()
+        if "bundle_version" in values and values["bundle_version"] is None:
+            values["bundle_version"] = ""
+        deployments.append(DeploymentListItem(**values))
     return DeploymentListResponse(
-        deployments=[
-            DeploymentDetail(
-                id=d.id,
-                bundle_id=d.bundle_id,
-                bundle_version=bundle_map.get(d.bundle_id, ""),
-                status=d.status,
-                target_devices=d.target_device_ids,
-                created_at=d.created_at.isoformat() if d.created_at else None,
-                completed_at=d.completed_at.isoformat() if d.completed_at else None,
-                error_message=d.error_message,
-            )
-            for d in deployments
-        ]
+        deployments=deployments,
+        total=total,
+        total_is_estimate=estimated,
+        next_cursor=next_cursor,
     )
 
 
@@ -86,7 +151,9 @@ async def get_deployment(
         bundle_id=deployment.bundle_id,
         bundle_version=bundle.version if bundle else "",
         status=deployment.status,
-        target_devices=deployment.target_device_ids,
+        target_devices=await target_device_ids(session, deployment.id),
+        selector=deployment.selector,
+        target_count=deployment.target_count,
         created_at=deployment.created_at.isoformat() if deployment.created_at else None,
         completed_at=deployment.completed_at.isoformat() if deployment.completed_at else None,
         error_message=deployment.error_message,
@@ -102,8 +169,9 @@ async def rollback_deployment(
     deployment = await session.scalar(select(Deployment).where(Deployment.id == deployment_id))
     if not deployment:
         raise HTTPException(status_code=404, detail="Deployment not found")
-    deployment.status = "rolled_back"
+    await set_deployment_status(session, deployment, "rolled_back")
     deployment.completed_at = datetime.utcnow()
+    await record_deployment_event(session, deployment, "rolled back", WARNING)
     await session.commit()
     return {"deployment_id": deployment.id, "status": deployment.status}
 
@@ -114,6 +182,7 @@ async def deployment_result(
     device_id: str,
     status_str: str,
     error_message: str = None,
+    _device=Depends(require_device),
     session: AsyncSession = Depends(get_session),
 ) -> dict:
     """
@@ -130,7 +199,8 @@ async def deployment_result(
         raise HTTPException(status_code=404, detail="Deployment not found")
     
     # Verify device is in target list
-    if device_id not in (deployment.target_device_ids or []):
+    target = await get_target(session, deployment_id, device_id)
+    if not target:
         raise HTTPException(status_code=403, detail="Device not in deployment targets")
     
     # Get device
@@ -142,14 +212,29 @@ async def deployment_result(
     bundle = await session.scalar(select(Bundle).where(Bundle.id == deployment.bundle_id))
     
     if status_str == "success":
-        deployment.status = "success"
         # Update device current bundle version
-        device.current_bundle_version = bundle.version if bundle else None
+        await set_device_attribute(session, device, "bundle_version", bundle.version if bundle else None)
+        if bundle:
+            record_good_version(device, bundle.version)
     elif status_str == "failed":
-        deployment.status = "failed"
         deployment.error_message = error_message
     else:
         raise HTTPException(status_code=400, detail=f"Invalid status: {status_str}")
+    suffix = f": {error_message}" if error_message else ""
+    await record_event(
+        session,
+        "device_result",
+        f"Device {device_id} reported {status_str} for deployment {deployment_id}{suffix}",
+        ERROR if status_str == "failed" else INFO,
+        device_id=device_id,
+        deployment_id=deployment_id,
+    )
+    # The deployment finishes once every target has reported
+    outcome = await record_target_result(session, deployment, target, status_str)
+    if outcome and deployment.status not in ("rolled_back", outcome):
+        await set_deployment_status(session, deployment, outcome)
+        deployment.completed_at = datetime.utcnow()
+        await record_deployment_event(session, deployment, outcome, ERROR if outcome == "failed" else INFO)
     
     # Record in bundle history for rollback capability
     history = DeviceBundleHistory(
@@ -12,9 +12,18 @@ from app.schemas.device_config import (
     DeviceBundleHistoryResponse,
     RollbackRequest,
     RollbackResponse,
+    RollbackToPreviousGoodRequest,
+    RollbackToPreviousGoodResponse,
 )
 from app.models.bundle import Bundle
 from app.models.deployment import Deployment
+from app.services.deployment_service import (
+    create_deployment_targets,
+    find_rollback_blockers,
+    previous_good_versions,
+)
+from app.services.event_service import record_deployment_event
+from app.services.fleet_service import count_new_deployment
 import uuid
 from datetime import datetime
 
@@ -120,39 +129,36 @@ async def rollback_bundle(
     """Create rollback deployment to previous bundle version"""
     
     # Validate bundle version exists
+    # Locked so bundle GC cannot purge it while the deployment is being created
     bundle = await session.scalar(
-        select(Bundle).where(Bundle.version == rollback_req.bundle_version)
+        select(Bundle).where(Bundle.version == rollback_req.bundle_version).with_for_update()
     )
     if not bundle:
         raise HTTPException(
             status_code=400,
             detail=f"Bundle version {rollback_req.bundle_version} not found"
         )
-    
-    # Validate all target devices exist and have history with this version
-    for device_id in rollback_req.target_device_ids:
-        device = await session.scalar(
-            select(Device).where(Device.device_id == device_id)
-        )
-        if not device:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Device {device_id} not found"
-            )
-        
-        # Check if device has deployed this bundle before
-        history = await session.scalar(
-            select(DeviceBundleHistory).where(
-                (DeviceBundleHistory.device_id == device.id) &
-                (DeviceBundleHistory.bundle_version == rollback_req.bundle_version) &
-                (DeviceBundleHistory.status == "success")
-            )
+    if bundle.purged_at is not None:
+        raise HTTPException(
+            status_code=410,
+            detail=f"Bundle version {rollback_req.bundle_version} has been garbage-collected"
         )
-        if not history:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Device {device_id} has no successful deployment of version {rollback_req.bundle_version}"
+    
+    # Validate all target devices exist and have history with this version,
+    # reporting every failing device at once
+    missing, never_deployed = await find_rollback_blockers(
+        session, rollback_req.target_device_ids, rollback_req.bundle_version
+    )
+    if missing or never_deployed:
+        problems = []
+        if missing:
+            problems.append(f"Devices not found: {', '.join(missing)}")
+        if never_deployed:
+            problems.append(
+                f"Devices with no successful deployment of version {rollback_req.bundle_version}: "
+                f"{', '.join(never_deployed)}"
             )
+        raise HTTPException(status_code=400, detail="; ".join(problems))
     
     # Create rollback deployment
     deployment = Deployment(
@@ -161,6 +167,12 @@ async def rollback_bundle(
         status="pending",
     )
     session.add(deployment)
+    await session.flush()
+    target_count = await create_deployment_targets(session, deployment, device_ids=rollback_req.target_device_ids)
+    await count_new_deployment(session, deployment.status)
+    await record_deployment_event(
+        session, deployment, f"created to roll back {target_count} devices to {rollback_req.bundle_version}"
+    )
     await session.commit()
     await session.refresh(deployment)
     
@@ -170,3 +182,57 @@ async def rollback_bundle(
         target_device_ids=deployment.target_device_ids,
         bundle_version=rollback_req.bundle_version,
     )
+
+
+@router.post("/rollback/previous-good", response_model=RollbackToPreviousGoodResponse)
+async def rollback_to_previous_good(
+    rollback_req: RollbackToPreviousGoodRequest,
+    _admin=Depends(require_admin_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Roll each device back to its own previous good version.
+
+    Devices are grouped by ``previous_good_bundle_version`` and one rollback
+    deployment is created per version; no bundle history is read.
+    """
+    try:
+        groups, skipped = await previous_good_versions(
+            session, rollback_req.target_device_ids, rollback_req.selector
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    bundles = {}
+    if groups:
+        # Purged versions are skipped; the rest are locked against bundle GC
+        result = await session.execute(
+            select(Bundle)
+            .where(Bundle.version.in_(list(groups)), Bundle.purged_at.is_(None))
+            .with_for_update()
+        )
+        bundles = {b.version: b for b in result.scalars()}
+
+    deployments = []
+    for version, device_ids in groups.items():
+        bundle = bundles.get(version)
+        if bundle is None:
+            skipped.extend(device_ids)
+            continue
+        deployment = Deployment(bundle_id=bundle.id, target_device_ids=device_ids, status="pending")
+        session.add(deployment)
+        await session.flush()
+        await create_deployment_targets(session, deployment, device_ids=device_ids)
+        await count_new_deployment(session, deployment.status)
+        await record_deployment_event(
+            session, deployment, f"created to roll back {len(device_ids)} devices to {version}"
+        )
+        deployments.append(
+            RollbackResponse(
+                deployment_id=deployment.id,
+                status=deployment.status,
+                target_device_ids=device_ids,
+                bundle_version=version,
+            )
+        )
+    await session.commit()
+    return RollbackToPreviousGoodResponse(deployments=deployments, skipped_device_ids=skipped)
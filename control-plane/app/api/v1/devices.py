@@ -1,23 +1,46 @@
+import time
 import uuid
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pydantic import ValidationError
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 
-from app.api.dependencies import require_admin_user
+from app.api.dependencies import device_auth_required, require_admin_user, require_device
+from app.api.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, count_rows, fetch_page, parse_fields
+from app.config import get_settings
 from app.db.session import get_session
-from app.models.device import Device
+from app.models.device import Device, public_key_fingerprint
 from app.models.heartbeat import Heartbeat
-from app.models.deployment import Deployment
 from app.models.bundle import Bundle
 from app.models.device_config import DeviceConfig
 from app.schemas.device import (
+    DeviceBulkRegisterItem,
+    DeviceBulkRegisterRequest,
+    DeviceBulkRegisterResponse,
     DeviceRegisterRequest,
     DeviceRegisterResponse,
     DeviceDetail,
     DeviceListResponse,
+    HeartbeatBatchRequest,
+    HeartbeatBatchResponse,
+    HeartbeatBatchResult,
     HeartbeatRequest,
     HeartbeatResponse,
+    DeviceTagsRequest,
+    DeviceTagsResponse,
 )
+from app.services.deployment_service import pending_deployments_for, set_device_tags
+from app.services.device_auth import check_signature, remember_secret
+from app.services.device_keys import check_registration_proof, validate_public_key
+from app.services.device_service import bulk_register_devices, device_site_network, find_bundle_peers
+from app.services.event_service import record_deployment_event, record_event, status_level
+from app.services.log_service import LogBatchTooLarge, decode_body, parse_log_lines, store_device_logs
+from app.services.fleet_service import count_new_device, set_deployment_status, set_device_attribute
+from app.observability import heartbeat_batch_size, heartbeat_commands_returned, heartbeat_stage_duration_seconds
 
 router = APIRouter(prefix="/devices", tags=["devices"])
 
@@ -26,9 +49,30 @@ router = APIRouter(prefix="/devices", tags=["devices"])
 async def register_device(
     payload: DeviceRegisterRequest, session: AsyncSession = Depends(get_session)
 ) -> DeviceRegisterResponse:
-    # Reject re-registering the same public key
-    existing = await session.scalar(select(Device).where(Device.public_key == payload.public_key))
+    if payload.key_type:
+        try:
+            validate_public_key(payload.public_key, payload.key_type)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+    if payload.proof_signature is not None:
+        try:
+            check_registration_proof(
+                payload.public_key,
+                payload.proof_timestamp,
+                payload.proof_signature,
+                get_settings().device_auth_max_skew_seconds,
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(exc))
+    fingerprint = public_key_fingerprint(payload.public_key)
+    existing = await session.scalar(select(Device).where(Device.public_key_fingerprint == fingerprint))
     if existing:
+        # The token is the device's signing secret; hand it back only to the key holder
+        if payload.proof_signature is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Public key already registered; include a registration proof to recover credentials",
+            )
         return DeviceRegisterResponse(
             device_id=existing.device_id, registration_token=existing.registration_token
         )
@@ -42,35 +86,120 @@ async def register_device(
         device_type=payload.device_type,
         hardware_metadata=payload.hardware_metadata,
         public_key=payload.public_key,
+        public_key_fingerprint=fingerprint,
+        key_type=payload.key_type,
         registration_token=registration_token,
         status="online",
     )
     session.add(device)
+    if payload.tags:
+        await session.flush()
+        try:
+            await set_device_tags(session, device, payload.tags)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+    await count_new_device(session, device)
     await session.commit()
+    # The agent's first heartbeat is signed with this; skip the lookup
+    remember_secret(device_id, registration_token)
     return DeviceRegisterResponse(device_id=device_id, registration_token=registration_token)
 
 
-@router.get("")
+@router.post(
+    "/register/bulk",
+    response_model=DeviceBulkRegisterResponse,
+    status_code=status.HTTP_201_CREATED,
+)
+async def register_devices_bulk(
+    payload: DeviceBulkRegisterRequest,
+    _admin=Depends(require_admin_user),
+    session: AsyncSession = Depends(get_session),
+) -> DeviceBulkRegisterResponse:
+    """
+    Register a batch of devices (factory provisioning).
+
+    Results are returned in request order. Already-registered keys return
+    their existing credentials, as with single registration.
+    """
+    try:
+        results = await bulk_register_devices(session, payload.devices)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    try:
+        await session.commit()
+    except IntegrityError:
+        # A concurrent registration claimed one of the keys; the client can retry
+        await session.rollback()
+        raise HTTPException(status_code=409, detail="Concurrent registration of the same public key")
+    created = sum(1 for r in results if r["created"])
+    return DeviceBulkRegisterResponse(
+        devices=[DeviceBulkRegisterItem(**r) for r in results],
+        created=created,
+        existing=len(results) - created,
+    )
+
+
+DEVICE_LIST_FIELDS = {
+    "device_id": Device.device_id,
+    "device_type": Device.device_type,
+    "hardware_metadata": Device.hardware_metadata,
+    "current_bundle_version": Device.current_bundle_version,
+    "last_good_bundle_version": Device.last_good_bundle_version,
+    "previous_good_bundle_version": Device.previous_good_bundle_version,
+    "status": Device.status,
+    "last_heartbeat": Device.last_heartbeat,
+    "registered_at": Device.registered_at,
+    "bundle_store": Device.bundle_store,
+    "tags": Device.tags,
+}
+
+
+@router.get("", response_model=DeviceListResponse, response_model_exclude_unset=True)
 async def list_devices(
+    cursor: Optional[str] = None,
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    status_filter: Optional[str] = Query(default=None, alias="status"),
+    device_type: Optional[str] = None,
+    bundle_version: Optional[str] = None,
+    org_id: Optional[str] = None,
+    heartbeat_within_seconds: Optional[int] = Query(default=None, ge=0),
+    heartbeat_older_than_seconds: Optional[int] = Query(default=None, ge=0),
+    fields: Optional[str] = Query(default=None, description="Comma-separated fields to return"),
     _admin=Depends(require_admin_user),
     session: AsyncSession = Depends(get_session),
 ) -> DeviceListResponse:
-    result = await session.execute(select(Device))
-    devices = result.scalars().all()
+    selected = parse_fields(fields, list(DEVICE_LIST_FIELDS), always=("device_id",))
+    query = select(*(DEVICE_LIST_FIELDS[name] for name in selected))
+    conditions = []
+    if status_filter is not None:
+        conditions.append(Device.status == status_filter)
+    if device_type is not None:
+        conditions.append(Device.device_type == device_type)
+    if bundle_version is not None:
+        conditions.append(Device.current_bundle_version == bundle_version)
+    if org_id is not None:
+        conditions.append(Device.org_id == org_id)
+    now = datetime.utcnow()
+    if heartbeat_within_seconds is not None:
+        conditions.append(Device.last_heartbeat >= now - timedelta(seconds=heartbeat_within_seconds))
+    if heartbeat_older_than_seconds is not None:
+        conditions.append(Device.last_heartbeat < now - timedelta(seconds=heartbeat_older_than_seconds))
+    query = query.where(*conditions)
+
+    rows, next_cursor = await fetch_page(session, query, Device.device_id, cursor, limit)
+    total, estimated = await count_rows(session, query, Device.__tablename__, filtered=bool(conditions))
+    devices = []
+    for row in rows:
+        values = dict(row._mapping)
+        for name in ("last_heartbeat", "registered_at"):
+            if values.get(name) is not None:
+                values[name] = values[name].isoformat()
+        devices.append(DeviceDetail(**values))
     return DeviceListResponse(
-        devices=[
-            DeviceDetail(
-                device_id=d.device_id,
-                device_type=d.device_type,
-                hardware_metadata=d.hardware_metadata,
-                current_bundle_version=d.current_bundle_version,
-                status=d.status,
-                last_heartbeat=d.last_heartbeat.isoformat() if d.last_heartbeat else None,
-                registered_at=d.registered_at.isoformat() if d.registered_at else None,
-            )
-            for d in devices
-        ],
-        total=len(devices),
+        devices=devices,
+        total=total,
+        total_is_estimate=estimated,
+        next_cursor=next_cursor,
     )
 
 
@@ -88,26 +217,26 @@ async def get_device(
         device_type=device.device_type,
         hardware_metadata=device.hardware_metadata,
         current_bundle_version=device.current_bundle_version,
+        last_good_bundle_version=device.last_good_bundle_version,
+        previous_good_bundle_version=device.previous_good_bundle_version,
         status=device.status,
         last_heartbeat=device.last_heartbeat.isoformat() if device.last_heartbeat else None,
         registered_at=device.registered_at.isoformat() if device.registered_at else None,
+        bundle_store=device.bundle_store,
+        tags=device.tags,
     )
 
 
-@router.post(
-    "/{device_id}/heartbeat",
-    response_model=HeartbeatResponse,
-    status_code=status.HTTP_200_OK,
-)
-async def post_heartbeat(
-    device_id: str,
+async def _record_heartbeat(
+    session: AsyncSession,
+    device: Device,
     payload: HeartbeatRequest,
-    session: AsyncSession = Depends(get_session),
-) -> HeartbeatResponse:
-    device = await session.scalar(select(Device).where(Device.device_id == device_id))
-    if not device:
-        raise HTTPException(status_code=404, detail="Device not found")
-
+    client_host: str | None,
+) -> list[dict]:
+    """Store one heartbeat and return the commands queued for the device (no commit)."""
+    started = time.perf_counter()
+    settings = get_settings()
+    device_id = device.device_id
     hb = Heartbeat(
         device_id=device_id,
         agent_version=payload.agent_version,
@@ -115,15 +244,33 @@ async def post_heartbeat(
         cpu_pct=payload.cpu_pct,
         status=payload.status,
     )
-    device.status = payload.status or device.status
+    previous_status = device.status
+    await set_device_attribute(session, device, "status", payload.status or device.status)
+    if device.status != previous_status:
+        await record_event(
+            session,
+            "heartbeat",
+            f"Device {device_id} status {previous_status or 'unknown'} -> {device.status}",
+            status_level(device.status),
+            device_id=device_id,
+        )
+    device.peer_url = payload.peer_url
+    if payload.bundle_store is not None:
+        device.bundle_store = payload.bundle_store
+    device.site_network = device_site_network(
+        payload.peer_url,
+        client_host,
+        settings.peer_subnet_prefix,
+    )
     session.add(hb)
     await session.flush()  # Ensure heartbeat gets its timestamp from DB
     device.last_heartbeat = hb.timestamp
+    stored = time.perf_counter()
+    heartbeat_stage_duration_seconds.labels(stage="store").observe(stored - started)
     
-    # Build commands: any pending deployments targeting this device
-    result = await session.execute(select(Deployment).where(Deployment.status == "pending"))
-    deployments_all = result.scalars().all()
-    deployments = [d for d in deployments_all if device_id in (d.target_device_ids or [])]
+    # Build commands: deployments whose target row for this device is still pending
+    pending = await pending_deployments_for(session, device_id)
+    deployments = [d for d, _ in pending]
     commands = []
     if deployments:
         # fetch bundle data
@@ -132,18 +279,35 @@ async def post_heartbeat(
         if bundle_ids:
             bundles = await session.execute(select(Bundle).where(Bundle.id.in_(bundle_ids)))
             for b in bundles.scalars():
-                bundle_map[b.id] = {"id": b.id, "version": b.version}
+                bundle_map[b.id] = {
+                    "id": b.id,
+                    "version": b.version,
+                    "checksum_sha256": b.checksum_sha256,
+                    "size_bytes": b.size_bytes,
+                }
         for d in deployments:
             bundle_data = bundle_map.get(d.bundle_id, {})
+            peers = await find_bundle_peers(
+                session, device, bundle_data.get("version", ""), settings.peer_hint_limit
+            )
             commands.append(
                 {
                     "type": "deploy",
                     "deployment_id": d.id,
                     "bundle_id": bundle_data.get("id", ""),
                     "bundle_version": bundle_data.get("version", ""),
+                    "checksum_sha256": bundle_data.get("checksum_sha256", ""),
+                    "size_bytes": bundle_data.get("size_bytes"),
+                    "peers": peers,
                 }
             )
-            d.status = "in_progress"
+            if d.status != "in_progress":
+                await set_deployment_status(session, d, "in_progress")
+                await record_deployment_event(session, d, "in progress")
+        for _, target in pending:
+            target.status = "in_progress"
+    planned = time.perf_counter()
+    heartbeat_stage_duration_seconds.labels(stage="deployments").observe(planned - stored)
     
     # Check for config updates - if device has pending config changes
     config = await session.scalar(
@@ -161,6 +325,166 @@ async def post_heartbeat(
                 "log_level": config.log_level,
             }
         )
-    
+    heartbeat_stage_duration_seconds.labels(stage="config").observe(time.perf_counter() - planned)
+    heartbeat_commands_returned.observe(len(commands))
+    return commands
+
+
+@router.post(
+    "/heartbeat/batch",
+    response_model=HeartbeatBatchResponse,
+    status_code=status.HTTP_200_OK,
+)
+async def post_heartbeat_batch(
+    payload: HeartbeatBatchRequest,
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+) -> HeartbeatBatchResponse:
+    """
+    Accept heartbeats forwarded by a site relay in one round trip.
+
+    Each item carries the downstream agent's body and signature verbatim,
+    checked as if the agent had posted its heartbeat directly. Items fail
+    individually; one unknown device does not reject the batch.
+    """
+    settings = get_settings()
+    client_host = request.client.host if request.client else None
+    device_ids = {item.device_id for item in payload.heartbeats}
+    devices = {}
+    if device_ids:
+        result = await session.execute(select(Device).where(Device.device_id.in_(device_ids)))
+        devices = {d.device_id: d for d in result.scalars()}
+
+    results = []
+    for item in payload.heartbeats:
+        device = devices.get(item.device_id)
+        if not device:
+            results.append(
+                HeartbeatBatchResult(device_id=item.device_id, status_code=404, detail="Device not found")
+            )
+            continue
+        if item.signature is not None or device_auth_required():
+            try:
+                check_signature(
+                    device.registration_token,
+                    "POST",
+                    f"/devices/{item.device_id}/heartbeat",
+                    item.timestamp,
+                    item.signature,
+                    item.body.encode(),
+                    settings.device_auth_max_skew_seconds,
+                )
+            except ValueError as exc:
+                results.append(HeartbeatBatchResult(device_id=item.device_id, status_code=401, detail=str(exc)))
+                continue
+        try:
+            heartbeat = HeartbeatRequest.model_validate_json(item.body or "{}")
+        except ValidationError as exc:
+            results.append(
+                HeartbeatBatchResult(device_id=item.device_id, status_code=422, detail=str(exc))
+            )
+            continue
+        commands = await _record_heartbeat(session, device, heartbeat, client_host)
+        results.append(HeartbeatBatchResult(device_id=item.device_id, commands=commands))
+
+    committing = time.perf_counter()
+    await session.commit()
+    heartbeat_stage_duration_seconds.labels(stage="commit").observe(time.perf_counter() - committing)
+    heartbeat_batch_size.observe(len(payload.heartbeats))
+    return HeartbeatBatchResponse(results=results)
+
+
+@router.post(
+    "/{device_id}/heartbeat",
+    response_model=HeartbeatResponse,
+    status_code=status.HTTP_200_OK,
+)
+async def post_heartbeat(
+    device_id: str,
+    payload: HeartbeatRequest,
+    request: Request,
+    _device=Depends(require_device),
+    session: AsyncSession = Depends(get_session),
+) -> HeartbeatResponse:
+    device = await session.scalar(select(Device).where(Device.device_id == device_id))
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+
+    commands = await _record_heartbeat(
+        session, device, payload, request.client.host if request.client else None
+    )
+    committing = time.perf_counter()
     await session.commit()
+    heartbeat_stage_duration_seconds.labels(stage="commit").observe(time.perf_counter() - committing)
     return HeartbeatResponse(commands=commands)
+
+
+@router.put("/{device_id}/tags", response_model=DeviceTagsResponse, status_code=status.HTTP_200_OK)
+async def put_device_tags(
+    device_id: str,
+    payload: DeviceTagsRequest,
+    _admin=Depends(require_admin_user),
+    session: AsyncSession = Depends(get_session),
+) -> DeviceTagsResponse:
+    """Replace the device's tags; deployment selectors match against them."""
+    device = await session.scalar(select(Device).where(Device.device_id == device_id))
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+    try:
+        await set_device_tags(session, device, payload.tags)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    await session.commit()
+    return DeviceTagsResponse(device_id=device.device_id, tags=device.tags or {})
+
+
+async def capped_log_batch(request: Request) -> bytes:
+    """
+    The request body, read until it passes ``DEVICE_LOG_MAX_BATCH_BYTES``.
+
+    Chunked uploads declare no length, so the cap is applied as chunks
+    arrive and the upload is refused with 413 before it is buffered.
+    """
+    max_bytes = get_settings().device_log_max_batch_bytes
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Log batch exceeds {max_bytes} bytes")
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Log batch exceeds {max_bytes} bytes")
+        chunks.append(chunk)
+    body = b"".join(chunks)
+    # Starlette's cache for request.body(), which the signature check reads next
+    request._body = body
+    return body
+
+
+@router.post("/{device_id}/logs", status_code=status.HTTP_200_OK)
+async def post_device_logs(
+    device_id: str,
+    request: Request,
+    body: bytes = Depends(capped_log_batch),
+    _device=Depends(require_device),
+    session: AsyncSession = Depends(get_session),
+) -> dict:
+    """
+    Ingest a batch of agent log lines.
+
+    The body is NDJSON, optionally gzip-compressed (``Content-Encoding: gzip``).
+    Oversized batches get 413 so the agent drops them instead of retrying.
+    """
+    settings = get_settings()
+    if not await session.scalar(select(Device.id).where(Device.device_id == device_id)):
+        raise HTTPException(status_code=404, detail="Device not found")
+    try:
+        data = decode_body(body, request.headers.get("content-encoding"), settings.device_log_max_batch_bytes)
+        rows = parse_log_lines(data, device_id, settings.device_log_max_batch_lines)
+    except LogBatchTooLarge as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    accepted = await store_device_logs(session, rows)
+    await session.commit()
+    return {"accepted": accepted}
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.dependencies import require_admin_user
+from app.db.session import get_session
+from app.schemas.fleet import FleetSummary
+from app.services.fleet_service import fleet_summary, reconcile_fleet_counters
+
+router = APIRouter(prefix="/fleet", tags=["fleet"])
+
+
+@router.get("/summary", response_model=FleetSummary)
+async def get_fleet_summary(
+    _admin=Depends(require_admin_user),
+    session: AsyncSession = Depends(get_session),
+) -> FleetSummary:
+    """Device and rollout counts from incrementally maintained counters."""
+    return FleetSummary(**await fleet_summary(session))
+
+
+@router.post("/summary/reconcile", response_model=FleetSummary)
+async def reconcile_fleet_summary(
+    _admin=Depends(require_admin_user),
+    session: AsyncSession = Depends(get_session),
+) -> FleetSummary:
+    """Rebuild the counters from SQL aggregates immediately."""
+    return FleetSummary(**await reconcile_fleet_counters(session))
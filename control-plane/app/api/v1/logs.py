@@ -1,65 +1,178 @@
+import asyncio
+import json
 from datetime import datetime
+from typing import AsyncIterator, Optional
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.dependencies import require_admin_user
+from app.api.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor
 from app.db.session import get_session
-from app.models.deployment import Deployment
-from app.models.heartbeat import Heartbeat
+from app.services.event_service import (
+    CATCHUP_LOOKBACK_IDS,
+    LEVELS,
+    broadcaster,
+    event_to_dict,
+    events_after,
+    latest_event_id,
+    list_events,
+)
+from app.services.log_service import device_log_to_dict, query_device_logs
 
 router = APIRouter(prefix="/logs", tags=["logs"])
 
+# Idle streams send a comment this often and re-check the table for events
+# committed by other workers
+STREAM_KEEPALIVE_SECONDS = 15.0
+STREAM_CATCHUP_BATCH = 500
 
-def _heartbeat_level(status: str | None) -> str:
-    if status in {"error", "failed", "offline"}:
-        return "ERROR"
-    if status in {"degraded", "warning"}:
-        return "WARNING"
-    return "INFO"
+
+def _parse_before(cursor: str) -> tuple[datetime, int]:
+    value = decode_cursor(cursor)
+    try:
+        ts, last_id = value
+        return datetime.fromisoformat(ts), int(last_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
 
 
 @router.get("")
 async def list_logs(
-    limit: int = Query(default=100, ge=1, le=500),
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    level: Optional[str] = Query(default=None, description="INFO, WARNING or ERROR"),
+    kind: Optional[str] = None,
+    device_id: Optional[str] = None,
     _admin=Depends(require_admin_user),
     session: AsyncSession = Depends(get_session),
 ) -> dict:
-    """Return a merged, recent event stream from heartbeat and deployment activity."""
-    heartbeats_result = await session.execute(
-        select(Heartbeat).order_by(Heartbeat.timestamp.desc()).limit(limit)
-    )
-    deployments_result = await session.execute(
-        select(Deployment).order_by(Deployment.created_at.desc()).limit(limit)
-    )
+    """Page through the event log, newest first."""
+    if level is not None and level not in LEVELS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid level: {level}")
+    before = _parse_before(cursor) if cursor else None
+    rows, next_key = await list_events(session, before, limit, level=level, kind=kind, device_id=device_id)
+    logs = [event_to_dict(row) for row in rows]
+    next_cursor = encode_cursor([next_key[0].isoformat(), next_key[1]]) if next_key else None
+    return {"logs": logs, "total": len(logs), "next_cursor": next_cursor}
 
-    events: list[dict] = []
-
-    for hb in heartbeats_result.scalars().all():
-        ts = hb.timestamp or datetime.utcnow()
-        events.append(
-            {
-                "timestamp": ts.isoformat(),
-                "level": _heartbeat_level(hb.status),
-                "message": f"Heartbeat from {hb.device_id} (status={hb.status or 'unknown'}, cpu={hb.cpu_pct}, mem_mb={hb.memory_mb})",
-                "_sort": ts,
-            }
-        )
 
-    for dep in deployments_result.scalars().all():
-        ts = dep.completed_at or dep.created_at or datetime.utcnow()
-        level = "ERROR" if dep.status == "failed" else "INFO"
-        suffix = f": {dep.error_message}" if dep.error_message else ""
-        events.append(
-            {
-                "timestamp": ts.isoformat(),
-                "level": level,
-                "message": f"Deployment {dep.id} status={dep.status}{suffix}",
-                "_sort": ts,
-            }
+@router.get("/devices")
+async def list_device_logs(
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    device_id: Optional[str] = None,
+    level: Optional[str] = Query(default=None, description="Minimum level, e.g. WARNING"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    q: Optional[str] = Query(default=None, description="Words that must all appear in the message"),
+    _admin=Depends(require_admin_user),
+    session: AsyncSession = Depends(get_session),
+) -> dict:
+    """Search logs shipped by device agents, newest first."""
+    before = _parse_before(cursor) if cursor else None
+    try:
+        rows, next_key = await query_device_logs(
+            session,
+            limit,
+            before=before,
+            device_id=device_id,
+            min_level=level,
+            since=since,
+            until=until,
+            text=q,
         )
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    next_cursor = encode_cursor([next_key[0].isoformat(), next_key[1]]) if next_key else None
+    return {"logs": [device_log_to_dict(row) for row in rows], "next_cursor": next_cursor}
+
+
+def _sse(payload: dict) -> str:
+    return f"id: {payload['id']}\nevent: log\ndata: {json.dumps(payload)}\n\n"
+
 
-    events.sort(key=lambda x: x["_sort"], reverse=True)
-    logs = [{k: v for k, v in item.items() if k != "_sort"} for item in events[:limit]]
-    return {"logs": logs, "total": len(logs)}
+async def tail_events(
+    request: Request,
+    session: AsyncSession,
+    after_id: Optional[int],
+    keepalive_seconds: float = STREAM_KEEPALIVE_SECONDS,
+) -> AsyncIterator[str]:
+    """
+    Yield SSE frames for events with ids above ``after_id``.
+
+    Starts from the newest event when ``after_id`` is None. Live events come
+    from the in-process broadcaster; the table is only read to catch up after
+    a reconnect, an overflow, or an idle interval. Ids are assigned before
+    commit, so each catch-up re-reads ``CATCHUP_LOOKBACK_IDS`` below the
+    newest id sent and skips the ids this stream already sent. The session
+    is closed between reads so an idle stream does not hold a connection.
+    """
+    subscription = broadcaster.subscribe()
+    try:
+        if after_id is None:
+            after_id = await latest_event_id(session)
+            await session.close()
+        # Nothing at or below the client's cursor is resent
+        floor = after_id
+        sent: set[int] = set()
+
+        def unsent(event_id: int) -> bool:
+            if event_id <= floor or event_id in sent:
+                return False
+            sent.add(event_id)
+            if len(sent) > 2 * CATCHUP_LOOKBACK_IDS:
+                sent.difference_update([i for i in sent if i <= after_id - CATCHUP_LOOKBACK_IDS])
+            return True
+
+        catch_up = True
+        while not await request.is_disconnected():
+            if catch_up or subscription.lagged:
+                subscription.lagged = False
+                cursor = max(floor, after_id - CATCHUP_LOOKBACK_IDS)
+                while True:
+                    rows = await events_after(session, cursor, STREAM_CATCHUP_BATCH)
+                    for row in rows:
+                        cursor = row.id
+                        if unsent(row.id):
+                            after_id = max(after_id, row.id)
+                            yield _sse(event_to_dict(row))
+                    if len(rows) < STREAM_CATCHUP_BATCH:
+                        break
+                await session.close()
+                catch_up = False
+            try:
+                payload = await asyncio.wait_for(subscription.queue.get(), timeout=keepalive_seconds)
+            except asyncio.TimeoutError:
+                catch_up = True
+                yield ": keepalive\n\n"
+                continue
+            if unsent(payload["id"]):
+                after_id = max(after_id, payload["id"])
+                yield _sse(payload)
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+@router.get("/stream")
+async def stream_logs(
+    request: Request,
+    after: Optional[int] = Query(default=None, ge=0, description="Resume after this event id"),
+    last_event_id: Optional[str] = Header(default=None),
+    _admin=Depends(require_admin_user),
+    session: AsyncSession = Depends(get_session),
+) -> StreamingResponse:
+    """
+    Follow the event log as Server-Sent Events.
+
+    Browsers reconnect with ``Last-Event-ID`` automatically, which resumes
+    the stream without gaps.
+    """
+    if after is None and last_event_id and last_event_id.isdigit():
+        after = int(last_event_id)
+    return StreamingResponse(
+        tail_events(request, session, after),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,10 +1,22 @@
 """Authentication and authorization utilities"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 
+from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel, ConfigDict
 from app.config import get_settings
+from app.observability import (
+    password_hash_duration_seconds,
+    password_hash_queue_depth,
+    password_hash_rejected_total,
+    password_hash_wait_seconds,
+)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 settings = get_settings()
@@ -64,10 +76,77 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+class PasswordHasherBusy(Exception):
+    """Too many password operations are already queued."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a small dedicated thread pool.
+
+    Each hash takes a few hundred milliseconds of CPU; on the event loop that
+    stalls every other request on the worker. bcrypt releases the GIL, so the
+    pool's threads hash in parallel while the loop keeps serving. Operations
+    beyond ``max_pending`` (running plus queued) are refused instead of
+    queueing without bound behind a login burst.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kernex-bcrypt")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+            password_hash_queue_depth.set(self._pending)
+
+    def _timed(self, operation: str, queued_at: float, func, *args):
+        started = time.perf_counter()
+        password_hash_wait_seconds.labels(operation=operation).observe(started - queued_at)
+        try:
+            return func(*args)
+        finally:
+            password_hash_duration_seconds.labels(operation=operation).observe(time.perf_counter() - started)
+            self._release()
+
+    async def _submit(self, operation: str, func, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                password_hash_rejected_total.labels(operation=operation).inc()
+                raise PasswordHasherBusy(f"{self._pending} password operations pending")
+            self._pending += 1
+            password_hash_queue_depth.set(self._pending)
+        future = self._executor.submit(self._timed, operation, time.perf_counter(), func, *args)
+        # The slot is freed by the worker thread, so a cancelled request
+        # still counts until its hash actually finishes
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        """
+        Raises:
+            PasswordHasherBusy: If the queue is full
+        """
+        return await self._submit("hash", hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """
+        Raises:
+            PasswordHasherBusy: If the queue is full
+        """
+        return await self._submit("verify", verify_password, plain_password, hashed_password)
+
+
+password_hasher = PasswordHasher(settings.password_hash_workers, settings.password_hash_max_pending)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
-    from jose import jwt
-    
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -81,13 +160,66 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 def decode_token(token: str) -> Optional[dict]:
     """Decode JWT token"""
-    from jose import jwt, JWTError
-    
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             return None
-        return {"username": username, "sub": username}
+        return {"username": username, "sub": username, "exp": payload.get("exp")}
     except JWTError:
         return None
+
+
+class PrincipalCache:
+    """
+    LRU of validated bearer tokens and the users they resolved to.
+
+    An entry lives for ``ttl_seconds`` or until the token expires, whichever
+    is sooner. Lookups and inserts are O(1); ``invalidate_user`` scans, which
+    is fine for something as rare as deactivating an account. A TTL of 0
+    disables caching.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[float, User]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str, now: Optional[float] = None) -> Optional[User]:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        now = time.monotonic() if now is None else now
+        if entry[0] <= now:
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return entry[1]
+
+    def put(self, token: str, principal: User, exp: Optional[float] = None, now: Optional[float] = None) -> None:
+        """Cache ``principal`` for ``token``; ``exp`` is the token's ``exp`` claim (epoch seconds)."""
+        if self.ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        lifetime = self.ttl_seconds
+        if exp is not None:
+            lifetime = min(lifetime, exp - time.time())
+            if lifetime <= 0:
+                return
+        now = time.monotonic() if now is None else now
+        self._entries[token] = (now + lifetime, principal)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate_user(self, username: str) -> int:
+        """Drop every token resolved to ``username``; returns how many."""
+        stale = [token for token, (_, principal) in self._entries.items() if principal.username == username]
+        for token in stale:
+            del self._entries[token]
+        return len(stale)
+
+    def clear(self) -> None:
+        self._entries.clear()
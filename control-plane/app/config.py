@@ -20,10 +20,78 @@ class Settings(BaseModel):
     access_token_expire_minutes: int = Field(
         default=int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
     )
+    # Validated bearer tokens cached by app.api.dependencies; 0 disables
+    auth_cache_ttl_seconds: float = Field(default=float(os.getenv("AUTH_CACHE_TTL_SECONDS", "30")))
+    auth_cache_max_entries: int = Field(default=int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "1024")))
+    # bcrypt thread pool (app.auth.password_hasher); requests beyond the queue get 503
+    password_hash_workers: int = Field(default=int(os.getenv("PASSWORD_HASH_WORKERS", "2")))
+    password_hash_max_pending: int = Field(default=int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32")))
     environment: str = Field(default=os.getenv("ENVIRONMENT", "development"))
     require_admin_auth: bool = Field(
         default=os.getenv("REQUIRE_ADMIN_AUTH", "").lower() in {"1", "true", "yes"}
     )
+    # HMAC-signed device requests (app.services.device_auth); always required in production
+    require_device_auth: bool = Field(
+        default=os.getenv("REQUIRE_DEVICE_AUTH", "").lower() in {"1", "true", "yes"}
+    )
+    device_auth_max_skew_seconds: float = Field(
+        default=float(os.getenv("DEVICE_AUTH_MAX_SKEW_SECONDS", "300"))
+    )
+    # Statement metrics and slow-query log (app.db.instrumentation); adjustable at /admin/db-instrumentation
+    db_instrumentation_enabled: bool = Field(
+        default=os.getenv("DB_INSTRUMENTATION_ENABLED", "true").lower() in {"1", "true", "yes"}
+    )
+    db_slow_query_ms: float = Field(default=float(os.getenv("DB_SLOW_QUERY_MS", "200")))
+    db_request_query_warn: int = Field(default=int(os.getenv("DB_REQUEST_QUERY_WARN", "50")))
+    # LAN peer hints handed out in deploy commands
+    peer_hint_limit: int = Field(default=int(os.getenv("PEER_HINT_LIMIT", "3")))
+    peer_subnet_prefix: int = Field(default=int(os.getenv("PEER_SUBNET_PREFIX", "24")))
+    # Bundle garbage collection (app.workers.cleanup_worker)
+    bundle_gc_rollback_window_days: int = Field(
+        default=int(os.getenv("BUNDLE_GC_ROLLBACK_WINDOW_DAYS", "30"))
+    )
+    bundle_gc_batch_size: int = Field(default=int(os.getenv("BUNDLE_GC_BATCH_SIZE", "100")))
+    bundle_gc_batch_pause_seconds: float = Field(
+        default=float(os.getenv("BUNDLE_GC_BATCH_PAUSE_SECONDS", "1.0"))
+    )
+    bundle_gc_orphan_grace_seconds: int = Field(
+        default=int(os.getenv("BUNDLE_GC_ORPHAN_GRACE_SECONDS", "3600"))
+    )
+    bundle_gc_interval_seconds: int = Field(default=int(os.getenv("BUNDLE_GC_INTERVAL_SECONDS", "3600")))
+    bundle_gc_dry_run: bool = Field(
+        default=os.getenv("BUNDLE_GC_DRY_RUN", "true").lower() in {"1", "true", "yes"}
+    )
+    # Fleet counter reconciliation (app.workers.metrics_aggregator)
+    fleet_reconcile_interval_seconds: int = Field(
+        default=int(os.getenv("FLEET_RECONCILE_INTERVAL_SECONDS", "300"))
+    )
+    # Device log ingestion (POST /devices/{device_id}/logs); limits apply after decompression
+    device_log_max_batch_bytes: int = Field(
+        default=int(os.getenv("DEVICE_LOG_MAX_BATCH_BYTES", str(8 * 1024 * 1024)))
+    )
+    device_log_max_batch_lines: int = Field(default=int(os.getenv("DEVICE_LOG_MAX_BATCH_LINES", "5000")))
+    # Pruned by app.workers.cleanup_worker; 0 keeps device logs forever
+    device_log_retention_days: int = Field(default=int(os.getenv("DEVICE_LOG_RETENTION_DAYS", "14")))
+    device_log_prune_batch_size: int = Field(default=int(os.getenv("DEVICE_LOG_PRUNE_BATCH_SIZE", "10000")))
+    # Token-bucket rate limits (app.security); device traffic is keyed per device
+    rate_limit_heartbeat_per_minute: float = Field(
+        default=float(os.getenv("RATE_LIMIT_HEARTBEAT_PER_MINUTE", "30"))
+    )
+    rate_limit_heartbeat_burst: int = Field(default=int(os.getenv("RATE_LIMIT_HEARTBEAT_BURST", "20")))
+    rate_limit_download_per_minute: float = Field(
+        default=float(os.getenv("RATE_LIMIT_DOWNLOAD_PER_MINUTE", "30"))
+    )
+    rate_limit_download_burst: int = Field(default=int(os.getenv("RATE_LIMIT_DOWNLOAD_BURST", "10")))
+    rate_limit_admin_per_minute: float = Field(default=float(os.getenv("RATE_LIMIT_ADMIN_PER_MINUTE", "300")))
+    rate_limit_admin_burst: int = Field(default=int(os.getenv("RATE_LIMIT_ADMIN_BURST", "60")))
+    # Site relays' POST /devices/heartbeat/batch, per relay IP
+    rate_limit_batch_per_minute: float = Field(default=float(os.getenv("RATE_LIMIT_BATCH_PER_MINUTE", "600")))
+    rate_limit_batch_burst: int = Field(default=int(os.getenv("RATE_LIMIT_BATCH_BURST", "100")))
+    # Ceiling on all requests from one client IP, on top of the budgets above
+    rate_limit_ip_per_minute: float = Field(default=float(os.getenv("RATE_LIMIT_IP_PER_MINUTE", "3000")))
+    rate_limit_ip_burst: int = Field(default=int(os.getenv("RATE_LIMIT_IP_BURST", "500")))
+    # Share buckets across workers through Redis (requires the redis package)
+    rate_limit_redis_url: str | None = Field(default=os.getenv("RATE_LIMIT_REDIS_URL") or None)
 
 
 @lru_cache()
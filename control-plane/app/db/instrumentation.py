@@ -0,0 +1,115 @@
+"""
+Statement-level database instrumentation.
+
+Engine event hooks time every statement on every engine, recording
+``database_operations_total`` and ``database_operation_duration_seconds``
+by operation and table. Each statement is also counted against the HTTP
+request running it, so ``http_request_db_queries`` shows N+1 patterns
+per route. Requests that run more statements than allowed, and
+statements slower than the slow-query threshold, are logged with the
+route.
+
+Settings live on ``query_instrumentation`` and can be changed at runtime
+through ``/admin/db-instrumentation``. When disabled, each hook returns
+after one attribute check.
+"""
+import logging
+import re
+import time
+from functools import lru_cache
+
+from sqlalchemy import event as sa_event
+from sqlalchemy.engine import Engine
+
+from app.config import get_settings
+from app.observability import current_request, database_operation_duration_seconds, database_operations_total
+
+logger = logging.getLogger(__name__)
+
+OPERATIONS = {"select", "insert", "update", "delete"}
+_MAX_LOGGED_STATEMENT = 1000
+_STARTED_KEY = "_kernex_query_started"
+_TABLE = re.compile(r"""\b(?:FROM|INTO|UPDATE|JOIN)\s+["`\[]?(\w+)""", re.IGNORECASE)
+
+
+class QueryInstrumentation:
+    """Runtime-adjustable settings; per worker process."""
+
+    def __init__(self, enabled: bool, slow_query_ms: float, request_query_warn: int):
+        self.enabled = enabled
+        self.slow_query_ms = slow_query_ms
+        self.request_query_warn = request_query_warn
+
+    def as_dict(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "slow_query_ms": self.slow_query_ms,
+            "request_query_warn": self.request_query_warn,
+        }
+
+
+_settings = get_settings()
+query_instrumentation = QueryInstrumentation(
+    _settings.db_instrumentation_enabled,
+    _settings.db_slow_query_ms,
+    _settings.db_request_query_warn,
+)
+
+
+@lru_cache(maxsize=4096)
+def classify_statement(statement: str) -> tuple[str, str]:
+    """``(operation, table)`` labels for a SQL string; compiled statements repeat, so this is cached."""
+    words = statement.lstrip().split(None, 1)
+    operation = words[0].lower() if words else ""
+    if operation not in OPERATIONS:
+        return "other", "-"
+    match = _TABLE.search(statement)
+    return operation, match.group(1).lower() if match else "-"
+
+
+@sa_event.listens_for(Engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if query_instrumentation.enabled:
+        conn.info.setdefault(_STARTED_KEY, []).append(time.perf_counter())
+
+
+@sa_event.listens_for(Engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = conn.info.get(_STARTED_KEY)
+    if not started:
+        # Instrumentation was switched on mid-statement
+        return
+    elapsed = time.perf_counter() - started.pop()
+    operation, table = classify_statement(statement)
+    database_operations_total.labels(operation=operation, table=table).inc()
+    database_operation_duration_seconds.labels(operation=operation, table=table).observe(elapsed)
+
+    stats = current_request.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_seconds += elapsed
+        if stats.db_queries == query_instrumentation.request_query_warn + 1:
+            logger.warning(
+                "Request to %s %s ran more than %d queries",
+                stats.scope.get("method"),
+                stats.endpoint,
+                query_instrumentation.request_query_warn,
+            )
+    elapsed_ms = elapsed * 1000
+    if elapsed_ms >= query_instrumentation.slow_query_ms:
+        route = f"{stats.scope.get('method')} {stats.endpoint}" if stats is not None else "background"
+        logger.warning(
+            "Slow query (%.1f ms) during %s: %s",
+            elapsed_ms,
+            route,
+            " ".join(statement.split())[:_MAX_LOGGED_STATEMENT],
+        )
+
+
+@sa_event.listens_for(Engine, "handle_error")
+def _discard_failed(context) -> None:
+    # after_cursor_execute does not fire for a failed statement
+    if context.connection is not None:
+        started = context.connection.info.get(_STARTED_KEY)
+        if started:
+            started.pop()
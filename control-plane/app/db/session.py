@@ -2,6 +2,7 @@ from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_asyn
 from sqlalchemy.orm import declarative_base
 
 from app.config import get_settings
+from app.db import instrumentation  # noqa: F401  (registers the engine event hooks)
 
 settings = get_settings()
 
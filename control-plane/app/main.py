@@ -7,7 +7,7 @@ from app.api import api_router
 from app.config import get_settings
 from app.db.session import init_db
 from app.security import setup_security_middleware
-from app.observability import setup_json_logging
+from app.observability import MetricsMiddleware, setup_json_logging
 
 settings = get_settings()
 
@@ -31,6 +31,8 @@ app = FastAPI(
 
 # Setup security middleware
 setup_security_middleware(app)
+# Outermost, so throttled and rejected requests are counted too
+app.add_middleware(MetricsMiddleware)
 
 # Mount Prometheus metrics
 metrics_app = make_asgi_app()
@@ -1,9 +1,12 @@
-from app.models.device import Device
+from app.models.device import Device, DeviceTag
 from app.models.heartbeat import Heartbeat
 from app.models.bundle import Bundle
-from app.models.deployment import Deployment
+from app.models.deployment import Deployment, DeploymentTarget
 from app.models.device_config import DeviceConfig, DeviceBundleHistory
 from app.models.user import User
+from app.models.fleet import FleetCounter
+from app.models.event import Event
+from app.models.device_log import DeviceLog
 
-__all__ = ["Device", "Heartbeat", "Bundle", "Deployment", "DeviceConfig", "DeviceBundleHistory", "User"]
+__all__ = ["Device", "DeviceTag", "Heartbeat", "Bundle", "Deployment", "DeploymentTarget", "DeviceConfig", "DeviceBundleHistory", "User", "FleetCounter", "Event", "DeviceLog"]
 
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, DateTime, JSON, Integer, String, Text, func, UniqueConstraint
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, JSON, Integer, String, Text, false, func, UniqueConstraint
 from app.db.session import Base
 
 
@@ -8,11 +8,16 @@ class Bundle(Base):
     __table_args__ = (UniqueConstraint("version", name="uq_bundle_version"),)
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    org_id = Column(String, nullable=True)
+    org_id = Column(String, nullable=True, index=True)
     version = Column(String, nullable=False)
     model_name = Column(String, nullable=True)
     model_size_mb = Column(Integer, nullable=True)
     checksum_sha256 = Column(String(64), nullable=False)
+    size_bytes = Column(BigInteger, nullable=True)
     manifest = Column(JSON, nullable=True)
     storage_path = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Garbage collection: pinned bundles are always kept; purged_at marks
+    # bundles whose file has been removed from BUNDLE_STORAGE_PATH
+    pinned = Column(Boolean, nullable=False, default=False, server_default=false())
+    purged_at = Column(DateTime(timezone=True), nullable=True)
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, DateTime, String, Text, JSON, func, ForeignKey
+from sqlalchemy import Column, DateTime, Integer, String, Text, JSON, func, ForeignKey
 from app.db.session import Base
 
 
@@ -7,11 +7,26 @@ class Deployment(Base):
     __tablename__ = "deployments"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    org_id = Column(String, nullable=True)
-    bundle_id = Column(String, ForeignKey("bundles.id"), nullable=False)
-    status = Column(String, nullable=False, default="pending")  # pending, in_progress, success, failed, rolled_back
-    target_device_ids = Column(JSON, nullable=False, default=list)
+    org_id = Column(String, nullable=True, index=True)
+    bundle_id = Column(String, ForeignKey("bundles.id"), nullable=False, index=True)
+    status = Column(String, nullable=False, default="pending", index=True)  # pending, in_progress, success, failed, rolled_back
+    target_device_ids = Column(JSON, nullable=False, default=list)  # explicit lists only; see DeploymentTarget
+    selector = Column(String, nullable=True)  # e.g. "site=berlin,hw=jetson"
+    target_count = Column(Integer, nullable=True)
+    # Targets that reported success or failure; moved with each target's status
+    reported_count = Column(Integer, nullable=False, default=0, server_default="0")
+    failed_count = Column(Integer, nullable=False, default=0, server_default="0")
     created_by = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     completed_at = Column(DateTime(timezone=True), nullable=True)
     error_message = Column(Text, nullable=True)
+
+
+class DeploymentTarget(Base):
+    """Per-device rollout state; resolved from the device list or selector at creation."""
+    __tablename__ = "deployment_targets"
+
+    deployment_id = Column(String, ForeignKey("deployments.id", ondelete="CASCADE"), primary_key=True)
+    device_id = Column(String, primary_key=True, index=True)  # public devices.device_id
+    status = Column(String, nullable=False, default="pending")  # pending, in_progress, success, failed
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
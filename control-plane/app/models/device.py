@@ -1,20 +1,57 @@
+import hashlib
 import uuid
-from sqlalchemy import Column, DateTime, JSON, String, Text, func
+from sqlalchemy import Column, DateTime, ForeignKey, Index, JSON, String, Text, func
 from app.db.session import Base
 
 
+def public_key_fingerprint(public_key: str) -> str:
+    """SHA-256 of the PEM with all whitespace removed, so line-ending variants match."""
+    return hashlib.sha256("".join(public_key.split()).encode()).hexdigest()
+
+
 class Device(Base):
     __tablename__ = "devices"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    org_id = Column(String, nullable=True)  # future multi-tenant support
+    org_id = Column(String, nullable=True, index=True)  # future multi-tenant support
     device_id = Column(String, unique=True, nullable=False)
-    device_type = Column(String, nullable=True)
+    device_type = Column(String, nullable=True, index=True)
     hardware_metadata = Column(JSON, nullable=True)
-    current_bundle_version = Column(String, nullable=True)
-    public_key = Column(Text, nullable=False, unique=True)
+    current_bundle_version = Column(String, nullable=True, index=True)
+    # Last two distinct versions the device reported deploying successfully,
+    # maintained by deployment_result so rollbacks need no history scan
+    last_good_bundle_version = Column(String, nullable=True)
+    previous_good_bundle_version = Column(String, nullable=True)
+    public_key = Column(Text, nullable=False)
+    key_type = Column(String, nullable=True)  # ed25519 or rsa; NULL for keys registered before key types
+    # Lookups and uniqueness go through this fixed-size digest, not the PEM
+    public_key_fingerprint = Column(
+        String(64),
+        nullable=False,
+        unique=True,
+        default=lambda ctx: public_key_fingerprint(ctx.get_current_parameters()["public_key"]),
+    )
     registration_token = Column(String, nullable=False, unique=True)
-    status = Column(String, nullable=True)  # online/offline/error
-    last_heartbeat = Column(DateTime(timezone=True), server_default=func.now())
+    status = Column(String, nullable=True, index=True)  # online/offline/error
+    last_heartbeat = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     registered_at = Column(DateTime(timezone=True), server_default=func.now())
-    tags = Column(JSON, nullable=True)
+    tags = Column(JSON, nullable=True)  # display copy; device_tags is the indexed source
+    # LAN peer sharing: where the agent serves its bundle cache, and the
+    # network it sits on so hints only point at reachable peers
+    peer_url = Column(String, nullable=True)
+    site_network = Column(String, nullable=True, index=True)
+    # Latest on-device bundle store inventory and disk usage from heartbeats
+    bundle_store = Column(JSON, nullable=True)
+
+
+class DeviceTag(Base):
+    """One ``key=value`` label on a device; deployment selectors match against these rows."""
+    __tablename__ = "device_tags"
+    __table_args__ = (
+        # Selector resolution: key/value lookup straight to device ids
+        Index("ix_device_tags_key_value", "key", "value", "device_id"),
+    )
+
+    device_id = Column(String, ForeignKey("devices.id", ondelete="CASCADE"), primary_key=True)
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=False)
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, DateTime, String, JSON, func, ForeignKey
+from sqlalchemy import Column, DateTime, Index, String, JSON, func, ForeignKey
 from app.db.session import Base
 
 
@@ -28,6 +28,14 @@ class DeviceConfig(Base):
 class DeviceBundleHistory(Base):
     """Track bundle deployment history for rollback capability"""
     __tablename__ = "device_bundle_history"
+    __table_args__ = (
+        # Covers the bundle GC live-set scan: recent successes -> bundle_id
+        Index("ix_device_bundle_history_status_deployed", "status", "deployed_at", "bundle_id"),
+        # Rollback validation: "has this device successfully run this version?"
+        Index("ix_device_bundle_history_device_version_status", "device_id", "bundle_version", "status"),
+        # Per-device history listing, newest first
+        Index("ix_device_bundle_history_device_deployed", "device_id", "deployed_at"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     device_id = Column(String, ForeignKey("devices.id"), nullable=False)
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from sqlalchemy import DDL, BigInteger, Column, DateTime, Index, Integer, String, Text, event, func, literal_column
+from sqlalchemy.dialects import postgresql  # noqa: F401  registers the to_tsvector() construct
+from app.db.session import Base
+
+
+class DeviceLog(Base):
+    """Log line shipped by a device agent (``POST /devices/{device_id}/logs``)."""
+    __tablename__ = "device_logs"
+
+    # SQLite only auto-increments INTEGER PRIMARY KEY columns
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    device_id = Column(String, nullable=False)  # public devices.device_id
+    timestamp = Column(DateTime(timezone=True), nullable=False)  # device clock
+    received_at = Column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
+    level = Column(String, nullable=False, default="INFO")
+    logger = Column(String, nullable=True)
+    source = Column(String, nullable=True)  # "script" for deploy/rollback script output
+    deployment_id = Column(String, nullable=True)
+    message = Column(Text, nullable=False)
+
+    __table_args__ = (
+        # Per-device queries: time range scan, level checked from the index
+        Index("ix_device_logs_device_ts_level", "device_id", "timestamp", "level"),
+        # Fleet-wide queries and retention pruning
+        Index("ix_device_logs_timestamp_id", "timestamp", "id"),
+        # PostgreSQL full-text search; see message_tsvector()
+        Index(
+            "ix_device_logs_message_fts",
+            func.to_tsvector(literal_column("'simple'::regconfig"), message),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+    )
+
+
+def message_tsvector():
+    """PostgreSQL full-text expression; matches ``ix_device_logs_message_fts``."""
+    return func.to_tsvector(literal_column("'simple'::regconfig"), DeviceLog.message)
+
+
+# SQLite full-text search: an external-content FTS5 table over ``message``
+# kept in sync by triggers (rows are only ever inserted and deleted)
+SQLITE_FTS_TABLE = "device_logs_fts"
+_SQLITE_FTS_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} "
+    "USING fts5(message, content='device_logs', content_rowid='id')",
+    f"CREATE TRIGGER IF NOT EXISTS device_logs_fts_insert AFTER INSERT ON device_logs BEGIN "
+    f"INSERT INTO {SQLITE_FTS_TABLE}(rowid, message) VALUES (new.id, new.message); END",
+    f"CREATE TRIGGER IF NOT EXISTS device_logs_fts_delete AFTER DELETE ON device_logs BEGIN "
+    f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, message) VALUES ('delete', old.id, old.message); END",
+)
+for _statement in _SQLITE_FTS_DDL:
+    event.listen(DeviceLog.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+event.listen(
+    DeviceLog.__table__,
+    "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}").execute_if(dialect="sqlite"),
+)
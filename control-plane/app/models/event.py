@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String, Text
+from app.db.session import Base
+
+
+class Event(Base):
+    """
+    Append-only activity log behind ``/logs``.
+
+    Rows are written in the same transaction as the change they describe and
+    never updated. Readers page newest-first on ``(timestamp, id)``.
+    """
+    __tablename__ = "events"
+
+    # SQLite only auto-increments INTEGER PRIMARY KEY columns
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    # Set client-side so the value is known for broadcasting before commit
+    timestamp = Column(DateTime(timezone=True), nullable=False, default=datetime.utcnow)
+    level = Column(String, nullable=False, default="INFO")  # INFO, WARNING, ERROR
+    kind = Column(String, nullable=False)  # heartbeat, deployment, device_result
+    device_id = Column(String, nullable=True)  # public devices.device_id
+    deployment_id = Column(String, nullable=True)
+    message = Column(Text, nullable=False)
+
+    __table_args__ = (
+        Index("ix_events_timestamp_id", "timestamp", "id"),
+    )
@@ -0,0 +1,17 @@
+from sqlalchemy import BigInteger, Column, DateTime, String, func
+from app.db.session import Base
+
+
+class FleetCounter(Base):
+    """
+    Running device/deployment counts for the fleet overview.
+
+    One row per (dimension, value), e.g. ("status", "online") or
+    ("bundle_version", "v1.2"). NULL values are stored as "".
+    """
+    __tablename__ = "fleet_counters"
+
+    dimension = Column(String, primary_key=True)
+    value = Column(String, primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
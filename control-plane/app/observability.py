@@ -1,11 +1,14 @@
 """Observability utilities: metrics, logging, tracing"""
 import logging
 import json
+import time
+from contextvars import ContextVar
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from pythonjsonlogger import jsonlogger
 from prometheus_client import Counter, Histogram, Gauge
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 
 # Configure JSON logging
@@ -35,10 +38,27 @@ http_request_duration_seconds = Histogram(
     ['method', 'endpoint']
 )
 
+# By method only: the route template is not known until routing has run
 http_requests_in_progress = Gauge(
     'http_requests_in_progress',
     'HTTP requests currently in progress',
-    ['method', 'endpoint']
+    ['method']
+)
+
+_SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000, 1_000_000_000)
+
+http_request_size_bytes = Histogram(
+    'http_request_size_bytes',
+    'HTTP request body size in bytes',
+    ['method', 'endpoint'],
+    buckets=_SIZE_BUCKETS,
+)
+
+http_response_size_bytes = Histogram(
+    'http_response_size_bytes',
+    'HTTP response body size in bytes',
+    ['method', 'endpoint'],
+    buckets=_SIZE_BUCKETS,
 )
 
 errors_total = Counter(
@@ -59,6 +79,147 @@ database_operation_duration_seconds = Histogram(
     ['operation', 'table']
 )
 
+# bcrypt runs in app.auth.password_hasher's thread pool
+password_hash_duration_seconds = Histogram(
+    'password_hash_duration_seconds',
+    'Time spent hashing or verifying one password, excluding queueing',
+    ['operation'],
+    buckets=(0.01, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0, 5.0),
+)
+
+password_hash_wait_seconds = Histogram(
+    'password_hash_wait_seconds',
+    'Time a password operation waited for a free hashing thread',
+    ['operation'],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+password_hash_queue_depth = Gauge(
+    'password_hash_queue_depth',
+    'Password operations running or waiting for a hashing thread',
+)
+
+password_hash_rejected_total = Counter(
+    'password_hash_rejected_total',
+    'Password operations refused because the hashing queue was full',
+    ['operation'],
+)
+
+http_request_db_queries = Histogram(
+    'http_request_db_queries',
+    'Database statements executed while handling one HTTP request',
+    ['method', 'endpoint'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 250),
+)
+
+heartbeat_commands_returned = Histogram(
+    'heartbeat_commands_returned',
+    'Commands handed to a device in one heartbeat response',
+    buckets=(0, 1, 2, 3, 5, 10, 20),
+)
+
+heartbeat_stage_duration_seconds = Histogram(
+    'heartbeat_stage_duration_seconds',
+    'Time spent in each stage of handling one heartbeat',
+    ['stage'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+heartbeat_batch_size = Histogram(
+    'heartbeat_batch_size',
+    'Heartbeats per relay batch',
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+
+# Label for requests that never reached a route (404s, rate-limited requests)
+UNMATCHED_ENDPOINT = "<unmatched>"
+
+
+def route_template(scope: Scope) -> str:
+    """The matched route's path template, e.g. ``/api/v1/devices/{device_id}/heartbeat``."""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Mounted apps such as /metrics record where they were mounted
+    if "endpoint" in scope and scope.get("root_path"):
+        return scope["root_path"]
+    return UNMATCHED_ENDPOINT
+
+
+class RequestStats:
+    """Per-request counters shared with code running on the request's behalf."""
+
+    __slots__ = ("scope", "db_queries", "db_seconds")
+
+    def __init__(self, scope: Scope):
+        self.scope = scope
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+    @property
+    def endpoint(self) -> str:
+        return route_template(self.scope)
+
+
+# Set by MetricsMiddleware; None outside a request (workers, startup)
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+class MetricsMiddleware:
+    """
+    Record the ``http_*`` metrics for every HTTP request.
+
+    Pure ASGI: bodies are counted as they pass through ``receive`` and
+    ``send`` without buffering. Requests are labelled by route template,
+    which routing leaves in the scope, so one label covers every device id.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        request_bytes = 0
+        response_bytes = 0
+        status_code = 500
+
+        async def counting_receive() -> Message:
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message: Message) -> None:
+            nonlocal response_bytes, status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        in_progress = http_requests_in_progress.labels(method=method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_progress.dec()
+            current_request.reset(token)
+            endpoint = stats.endpoint
+            http_requests_total.labels(method=method, endpoint=endpoint, status_code=str(status_code)).inc()
+            http_request_duration_seconds.labels(method=method, endpoint=endpoint).observe(elapsed)
+            http_request_size_bytes.labels(method=method, endpoint=endpoint).observe(request_bytes)
+            http_response_size_bytes.labels(method=method, endpoint=endpoint).observe(response_bytes)
+            if stats.db_queries:
+                http_request_db_queries.labels(method=method, endpoint=endpoint).observe(stats.db_queries)
+
 
 class StructuredLogger:
     """Structured logging with context"""
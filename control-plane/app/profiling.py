@@ -0,0 +1,209 @@
+"""
+On-demand profiling of a live worker.
+
+``SamplingProfiler`` runs a background thread that wakes every
+``interval`` seconds for the requested duration and records, per sample:
+
+* the stack of every other thread (``sys._current_frames``), so time spent
+  on the event loop, in bcrypt workers or in ``to_thread`` calls shows up
+  whether it is CPU or blocking I/O
+* the await chain of every suspended asyncio task on the worker's loop,
+  so wall-clock time a request spends waiting on the database or a lock
+  is attributed to the coroutine doing the waiting
+
+Samples are returned in the collapsed-stack format read by
+``flamegraph.pl``, speedscope and inferno. ``MemoryTracer`` wraps
+``tracemalloc`` for snapshots and growth diffs between them.
+
+Nothing runs or is hooked in while neither is active.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from functools import lru_cache
+from types import CodeType, FrameType
+from typing import List, Optional
+
+
+class ProfilerBusy(Exception):
+    """A profile is already being taken on this worker."""
+
+
+# Coroutines, async generators and generator-based coroutines
+_AWAIT_ATTRS = (("cr_code", "cr_await"), ("ag_code", "ag_await"), ("gi_code", "gi_yieldfrom"))
+_ROOTS = sorted({os.path.abspath(path) for path in sys.path if path} | {os.getcwd()}, key=len, reverse=True)
+
+
+@lru_cache(maxsize=16384)
+def _frame_label(code: CodeType) -> str:
+    filename = code.co_filename
+    for root in _ROOTS:
+        if filename.startswith(root + os.sep):
+            filename = filename[len(root) + 1:]
+            break
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})"
+
+
+def _thread_stack(frame: Optional[FrameType]) -> List[str]:
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _await_chain(coro) -> List[str]:
+    """Frames from the task's outermost coroutine down to the innermost one awaiting."""
+    stack = []
+    while coro is not None:
+        for code_attr, next_attr in _AWAIT_ATTRS:
+            code = getattr(coro, code_attr, None)
+            if code is not None:
+                break
+        else:
+            # Reached the future being awaited
+            break
+        stack.append(_frame_label(code))
+        coro = getattr(coro, next_attr)
+    return stack
+
+
+class SamplingProfiler:
+    """Wall-clock sampler; one profile at a time per process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def profile(
+        self,
+        seconds: float,
+        interval: float,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> Counter:
+        """
+        Sample for ``seconds``, blocking the calling thread; run it off the event loop.
+
+        Raises:
+            ProfilerBusy: If another profile is running
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        try:
+            return self._sample(seconds, interval, loop)
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds: float, interval: float, loop: Optional[asyncio.AbstractEventLoop]) -> Counter:
+        stacks: Counter = Counter()
+        me = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    stack = [f"thread:{names.get(ident, ident)}"] + _thread_stack(frame)
+                    stacks[";".join(stack)] += 1
+            if loop is not None:
+                self._sample_tasks(loop, stacks)
+            time.sleep(interval)
+        return stacks
+
+    @staticmethod
+    def _sample_tasks(loop: asyncio.AbstractEventLoop, stacks: Counter) -> None:
+        try:
+            tasks = asyncio.all_tasks(loop)
+        except RuntimeError:
+            # The task set changed under us on every retry; skip this sample
+            return
+        for task in tasks:
+            coro = task.get_coro()
+            if getattr(coro, "cr_running", False):
+                # Already in the event loop thread's stack
+                continue
+            stack = [f"task:{task.get_name()}"] + _await_chain(coro)
+            stacks[";".join(stack)] += 1
+
+
+def collapsed(stacks: Counter) -> str:
+    """``frame;frame;frame count`` lines, heaviest first."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class MemoryTracer:
+    """
+    tracemalloc control with growth diffs.
+
+    Each snapshot is compared with the previous one (or the one taken at
+    ``start``), so repeated calls show what grew in between.
+    """
+
+    def __init__(self):
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._lock = threading.Lock()
+
+    def start(self, frames: int) -> None:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self._baseline = self._take()
+
+    def stop(self) -> None:
+        with self._lock:
+            self._baseline = None
+            tracemalloc.stop()
+
+    def snapshot(self, limit: int) -> dict:
+        """
+        Top allocation sites and the growth since the previous snapshot; slow, run it off the event loop.
+
+        Raises:
+            RuntimeError: If tracing has not been started
+        """
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                raise RuntimeError("tracemalloc is not running")
+            current = self._take()
+            previous, self._baseline = self._baseline, current
+        traced, peak = tracemalloc.get_traced_memory()
+        top = [
+            {"location": self._location(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+            for stat in current.statistics("traceback")[:limit]
+        ]
+        growth = []
+        if previous is not None:
+            growth = [
+                {
+                    "location": self._location(stat.traceback),
+                    "size_bytes": stat.size,
+                    "count": stat.count,
+                    "size_diff_bytes": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in current.compare_to(previous, "traceback")[:limit]
+                if stat.size_diff
+            ]
+        return {"traced_bytes": traced, "peak_bytes": peak, "top": top, "growth": growth}
+
+    @staticmethod
+    def _take() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            )
+        )
+
+    @staticmethod
+    def _location(traceback: tracemalloc.Traceback) -> str:
+        # Oldest frame first, like a collapsed stack
+        return ";".join(f"{frame.filename}:{frame.lineno}" for frame in traceback)
+
+
+sampling_profiler = SamplingProfiler()
+memory_tracer = MemoryTracer()
@@ -0,0 +1,33 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+class DbInstrumentationSettings(BaseModel):
+    enabled: bool
+    slow_query_ms: float
+    request_query_warn: int
+
+
+class DbInstrumentationUpdate(BaseModel):
+    enabled: Optional[bool] = None
+    slow_query_ms: Optional[float] = Field(default=None, ge=0)
+    request_query_warn: Optional[int] = Field(default=None, ge=1)
+
+
+class TracemallocStart(BaseModel):
+    frames: int = Field(default=10, ge=1, le=100, description="Stack depth recorded per allocation")
+
+
+class AllocationStat(BaseModel):
+    location: str
+    size_bytes: int
+    count: int
+    size_diff_bytes: Optional[int] = None
+    count_diff: Optional[int] = None
+
+
+class TracemallocSnapshot(BaseModel):
+    traced_bytes: int
+    peak_bytes: int
+    top: List[AllocationStat]
+    growth: List[AllocationStat]
@@ -14,8 +14,10 @@ class BundleListItem(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     
     id: str
-    version: str
-    checksum_sha256: str
+    version: Optional[str] = None
+    checksum_sha256: Optional[str] = None
+    size_bytes: Optional[int] = None
+    pinned: Optional[bool] = None
     created_at: Optional[str] = None
 
 
@@ -23,3 +25,6 @@ class BundleListResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     
     bundles: list[BundleListItem] = Field(default_factory=list)
+    total: int = 0
+    total_is_estimate: bool = False
+    next_cursor: Optional[str] = Field(default=None, description="Pass as ?cursor= to fetch the next page")
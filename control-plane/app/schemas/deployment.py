@@ -7,6 +7,9 @@ class DeploymentCreateRequest(BaseModel):
     
     bundle_version: str
     target_devices: List[str] = Field(default_factory=list)
+    selector: Optional[str] = Field(
+        default=None, description="Label selector resolved to devices at creation, e.g. site=berlin,hw=jetson"
+    )
     description: Optional[str] = None
 
 
@@ -15,6 +18,7 @@ class DeploymentCreateResponse(BaseModel):
     
     deployment_id: str
     status: str
+    target_count: int = 0
 
 
 class DeploymentDetail(BaseModel):
@@ -25,6 +29,24 @@ class DeploymentDetail(BaseModel):
     bundle_version: str
     status: str
     target_devices: List[str]
+    selector: Optional[str] = None
+    target_count: Optional[int] = None
+    created_at: Optional[str] = None
+    completed_at: Optional[str] = None
+    error_message: Optional[str] = None
+
+
+class DeploymentListItem(BaseModel):
+    """Deployment row in list responses; only ``id`` is guaranteed when ``fields`` is used."""
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: str
+    bundle_id: Optional[str] = None
+    bundle_version: Optional[str] = None
+    status: Optional[str] = None
+    target_devices: Optional[List[str]] = None
+    selector: Optional[str] = None
+    target_count: Optional[int] = None
     created_at: Optional[str] = None
     completed_at: Optional[str] = None
     error_message: Optional[str] = None
@@ -33,4 +55,7 @@ class DeploymentDetail(BaseModel):
 class DeploymentListResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     
-    deployments: List[DeploymentDetail] = Field(default_factory=list)
+    deployments: List[DeploymentListItem] = Field(default_factory=list)
+    total: int = 0
+    total_is_estimate: bool = False
+    next_cursor: Optional[str] = Field(default=None, description="Pass as ?cursor= to fetch the next page")
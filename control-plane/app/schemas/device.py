@@ -1,14 +1,24 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Literal
 
 
 class DeviceRegisterRequest(BaseModel):
-    model_config = ConfigDict(json_schema_extra={"example": {"public_key": "...", "device_type": "test"}})
+    model_config = ConfigDict(
+        json_schema_extra={"example": {"public_key": "...", "key_type": "ed25519", "device_type": "test"}}
+    )
     
-    public_key: str = Field(..., description="PEM-encoded RSA public key")
+    public_key: str = Field(..., description="PEM-encoded (SubjectPublicKeyInfo) Ed25519 or RSA public key")
+    key_type: Optional[Literal["ed25519", "rsa"]] = Field(
+        default=None, description="When set, the key is parsed and must be of this type"
+    )
     device_type: Optional[str] = None
     hardware_metadata: Optional[Dict[str, Any]] = None
     org_id: Optional[str] = None
+    tags: Optional[Dict[str, str]] = None
+    proof_timestamp: Optional[str] = Field(default=None, description="Unix seconds the proof was signed at")
+    proof_signature: Optional[str] = Field(
+        default=None, description="Base64 proof of possession of the private key (app.services.device_keys)"
+    )
 
 
 class DeviceRegisterResponse(BaseModel):
@@ -18,6 +28,28 @@ class DeviceRegisterResponse(BaseModel):
     registration_token: str
 
 
+class DeviceBulkRegisterRequest(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    devices: List[DeviceRegisterRequest] = Field(default_factory=list, max_length=10000)
+
+
+class DeviceBulkRegisterItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    device_id: str
+    registration_token: str
+    created: bool = Field(description="False when the public key was already registered")
+
+
+class DeviceBulkRegisterResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    devices: List[DeviceBulkRegisterItem] = Field(default_factory=list)
+    created: int = 0
+    existing: int = 0
+
+
 class HeartbeatRequest(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     
@@ -25,6 +57,12 @@ class HeartbeatRequest(BaseModel):
     memory_mb: Optional[float] = None
     cpu_pct: Optional[float] = None
     status: Optional[str] = None
+    peer_url: Optional[str] = Field(
+        default=None, description="Base URL where this agent serves cached bundles to LAN peers"
+    )
+    bundle_store: Optional[Dict[str, Any]] = Field(
+        default=None, description="On-device bundle inventory and disk usage"
+    )
 
 
 class HeartbeatResponse(BaseModel):
@@ -33,6 +71,36 @@ class HeartbeatResponse(BaseModel):
     commands: list[dict] = Field(default_factory=list)
 
 
+class HeartbeatBatchItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    device_id: str
+    body: str = Field(default="{}", description="Heartbeat JSON body exactly as the device sent it")
+    timestamp: Optional[str] = Field(default=None, description="The device's X-Kernex-Timestamp header")
+    signature: Optional[str] = Field(default=None, description="The device's X-Kernex-Signature header")
+
+
+class HeartbeatBatchRequest(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    heartbeats: List[HeartbeatBatchItem] = Field(default_factory=list, max_length=1000)
+
+
+class HeartbeatBatchResult(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    device_id: str
+    status_code: int = 200
+    commands: list[dict] = Field(default_factory=list)
+    detail: Optional[str] = None
+
+
+class HeartbeatBatchResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    results: List[HeartbeatBatchResult] = Field(default_factory=list)
+
+
 class DeviceDetail(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     
@@ -40,9 +108,13 @@ class DeviceDetail(BaseModel):
     device_type: Optional[str] = None
     hardware_metadata: Optional[Dict[str, Any]] = None
     current_bundle_version: Optional[str] = None
+    last_good_bundle_version: Optional[str] = None
+    previous_good_bundle_version: Optional[str] = None
     status: Optional[str] = None
     last_heartbeat: Optional[str] = None
     registered_at: Optional[str] = None
+    bundle_store: Optional[Dict[str, Any]] = None
+    tags: Optional[Dict[str, str]] = None
 
 
 class DeviceListResponse(BaseModel):
@@ -50,3 +122,18 @@ class DeviceListResponse(BaseModel):
     
     devices: List[DeviceDetail] = Field(default_factory=list)
     total: int = 0
+    total_is_estimate: bool = False
+    next_cursor: Optional[str] = Field(default=None, description="Pass as ?cursor= to fetch the next page")
+
+
+class DeviceTagsRequest(BaseModel):
+    model_config = ConfigDict(json_schema_extra={"example": {"tags": {"site": "berlin", "hw": "jetson"}}})
+    
+    tags: Dict[str, str] = Field(default_factory=dict)
+
+
+class DeviceTagsResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    device_id: str
+    tags: Dict[str, str] = Field(default_factory=dict)
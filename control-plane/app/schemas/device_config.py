@@ -1,4 +1,4 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional
 from datetime import datetime
 
@@ -55,3 +55,19 @@ class RollbackResponse(BaseModel):
     status: str
     target_device_ids: list[str]
     bundle_version: str
+
+
+class RollbackToPreviousGoodRequest(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    target_device_ids: list[str] = Field(default_factory=list)
+    selector: Optional[str] = Field(default=None, description="Tag selector, e.g. site=berlin")
+
+
+class RollbackToPreviousGoodResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    deployments: list[RollbackResponse] = Field(default_factory=list)
+    skipped_device_ids: list[str] = Field(
+        default_factory=list, description="Devices with no previous good version, or unknown ids"
+    )
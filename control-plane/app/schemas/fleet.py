@@ -0,0 +1,13 @@
+from typing import Dict
+from pydantic import BaseModel, Field, ConfigDict
+
+
+class FleetSummary(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    total_devices: int = 0
+    by_status: Dict[str, int] = Field(default_factory=dict)
+    by_bundle_version: Dict[str, int] = Field(default_factory=dict)
+    by_device_type: Dict[str, int] = Field(default_factory=dict)
+    deployments_by_status: Dict[str, int] = Field(default_factory=dict)
+    active_rollouts: int = 0
@@ -1,69 +1,291 @@
-"""Security middleware and utilities"""
+"""
+Security middleware and utilities.
+
+The middlewares here are plain ASGI callables rather than
+``BaseHTTPMiddleware`` subclasses: they add no per-request task or
+response-stream wrapping, so streamed bodies such as bundle downloads and
+the SSE log tail pass straight through.
+"""
 from fastapi import Request, HTTPException, status
 from fastapi.responses import JSONResponse
+from starlette.datastructures import MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import hashlib
+import math
+import re
 import time
-from collections import defaultdict
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Optional
 import logging
 
+from app.api.dependencies import DEVICE_BUDGET_SCOPE_KEY, principal_cache
+from app.config import get_settings
+from app.services.device_auth import DEVICE_HEADER
+
 logger = logging.getLogger(__name__)
 
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Simple in-memory rate limiter"""
+@dataclass(frozen=True)
+class RateBudget:
+    """Token bucket parameters: ``burst`` requests at once, refilled at ``per_minute``."""
+    per_minute: float
+    burst: int
+
+    @property
+    def rate(self) -> float:
+        return self.per_minute / 60.0
+
+    @property
+    def refill_seconds(self) -> float:
+        """Time for an empty bucket to fill; an idle bucket older than this is full."""
+        return self.burst / self.rate
+
+
+class MemoryBucketStore:
+    """
+    Token buckets for one process, O(1) time and memory per key.
+
+    Each key holds ``(tokens, last_update)``. Keys are kept in access order
+    so idle ones can be evicted from the front: a bucket untouched for its
+    refill time is full again, which is the same as having no entry.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, tuple[float, float, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _evict(self, now: float) -> None:
+        while self._buckets:
+            key, (_, updated, idle_after) = next(iter(self._buckets.items()))
+            if now - updated < idle_after and len(self._buckets) <= self.max_keys:
+                return
+            del self._buckets[key]
+
+    async def take(self, key: str, budget: RateBudget, now: Optional[float] = None) -> tuple[bool, float]:
+        """Spend one token; returns ``(allowed, retry_after_seconds)``."""
+        now = time.monotonic() if now is None else now
+        tokens, updated, _ = self._buckets.pop(key, (budget.burst, now, 0.0))
+        tokens = min(budget.burst, tokens + (now - updated) * budget.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now, budget.refill_seconds)
+        self._evict(now)
+        return allowed, 0.0 if allowed else (1 - tokens) / budget.rate
+
+
+_REDIS_TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+else
+  retry = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(retry)}
+"""
+
+
+class RedisBucketStore:
+    """
+    Token buckets shared by every worker through Redis.
+
+    One atomic script call per request, timed by the Redis clock; keys
+    expire once their bucket would be full again. Requires the ``redis``
+    package.
+    """
+
+    def __init__(self, url: str, prefix: str = "kernex:ratelimit:"):
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError as exc:
+            raise RuntimeError("RATE_LIMIT_REDIS_URL is set but the redis package is not installed") from exc
+        self.prefix = prefix
+        self._client = redis_asyncio.from_url(url)
+        self._script = self._client.register_script(_REDIS_TOKEN_BUCKET)
+
+    async def take(self, key: str, budget: RateBudget, now: Optional[float] = None) -> tuple[bool, float]:
+        allowed, retry_after = await self._script(
+            keys=[self.prefix + key], args=[budget.burst, budget.rate]
+        )
+        return bool(int(allowed)), float(retry_after)
+
 
-    def __init__(self, app, requests_per_minute: int = 60):
-        super().__init__(app)
-        self.requests_per_minute = requests_per_minute
-        self.request_history = defaultdict(list)
+_DEVICE_ROUTE = re.compile(r"/devices/(?P<device_id>[^/]+)/(?:heartbeat|logs)$")
+_RESULT_ROUTE = re.compile(r"/deployments/[^/]+/result$")
+_BATCH_ROUTE = re.compile(r"/devices/heartbeat/batch$")
+_DOWNLOAD_ROUTE = re.compile(r"/bundles/[^/]+$")
+EXEMPT_PATHS = ("/health", "/metrics")
 
-    async def dispatch(self, request: Request, call_next):
-        # Get client IP
-        client_ip = request.client.host if request.client else "unknown"
 
+def _never(_: str) -> bool:
+    return False
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+def classify_request(request: Request, known_token: Callable[[str], bool] = _never) -> tuple[str, Optional[str]]:
+    """
+    Budget name and bucket key for a request.
+
+    The limiter runs before authentication, so a key taken from the
+    request is only trusted once it has been authenticated. Device
+    traffic (heartbeats, logs, deployment results) whose
+    ``X-Kernex-Device`` header names the device in the URL gets no key
+    here: its per-device bucket is charged by ``authenticate_device``
+    after the signature checks out, so devices behind one NAT gateway get
+    separate budgets and a forged header cannot drain a victim's. Other
+    requests are keyed by bearer token when ``known_token`` accepts it.
+    Everything else, including made-up tokens, is keyed by client IP. A
+    relay's heartbeat batches have their own per-IP budget.
+    """
+    path = request.url.path
+    device_id = None
+    budget = "admin"
+    match = _DEVICE_ROUTE.search(path)
+    if match:
+        budget, device_id = "heartbeat", match.group("device_id")
+    elif _RESULT_ROUTE.search(path):
+        budget, device_id = "heartbeat", request.query_params.get("device_id")
+    elif request.method == "POST" and _BATCH_ROUTE.search(path):
+        budget = "batch"
+    elif request.method == "GET" and _DOWNLOAD_ROUTE.search(path):
+        budget = "download"
+    if device_id and request.headers.get(DEVICE_HEADER) == device_id:
+        return budget, None
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        token = authorization[7:].strip()
+        if known_token(token):
+            digest = hashlib.sha256(token.encode()).hexdigest()[:32]
+            return budget, f"{budget}:token:{digest}"
+    return budget, f"{budget}:ip:{client_ip(request)}"
+
+
+class RateLimitMiddleware:
+    """
+    Token-bucket rate limiter with separate heartbeat, download and admin budgets.
+
+    Every request also spends from its client IP's ``ip_budget``, so a
+    new device or token key cannot buy a fresh budget. Signed device
+    requests leave a hook in the scope for ``authenticate_device`` to
+    charge the device's bucket once the signature is verified. Rejected
+    requests get 429 with ``Retry-After``. If the shared store is
+    unreachable the request is allowed rather than failing the API.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        budgets: dict[str, RateBudget],
+        store=None,
+        ip_budget: Optional[RateBudget] = None,
+        known_token: Callable[[str], bool] = _never,
+    ):
+        self.app = app
+        self.budgets = budgets
+        self.store = store or MemoryBucketStore()
+        self.ip_budget = ip_budget
+        self.known_token = known_token
+
+    async def _take(self, request: Request) -> tuple[bool, float, str]:
+        budget_name, key = classify_request(request, self.known_token)
+        checks = []
+        if key is None:
+            request.scope[DEVICE_BUDGET_SCOPE_KEY] = partial(self._take_device, self.budgets[budget_name])
+        else:
+            checks.append((key, self.budgets[budget_name]))
+        if self.ip_budget is not None:
+            checks.append((f"ip:{client_ip(request)}", self.ip_budget))
+        for key, budget in checks:
+            allowed, retry_after = await self.store.take(key, budget)
+            if not allowed:
+                return False, retry_after, key
+        return True, 0.0, key
+
+    async def _take_device(self, budget: RateBudget, device_id: str) -> tuple[bool, float]:
+        try:
+            allowed, retry_after = await self.store.take(f"heartbeat:device:{device_id}", budget)
+        except Exception:
+            logger.warning("Rate limit store unavailable; allowing request", exc_info=True)
+            return True, 0.0
+        if not allowed:
+            logger.warning("Rate limit exceeded for device %s", device_id)
+        return allowed, retry_after
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # Headers and path only; the body is left for the app
+        request = Request(scope)
         # Skip rate limiting for health checks and test clients
-        if request.url.path == "/health" or request.headers.get("user-agent") == "testclient":
-            return await call_next(request)
-
-        # Check rate limit
-        now = datetime.utcnow()
-        cutoff = now - timedelta(minutes=1)
-
-        # Clean old requests
-        self.request_history[client_ip] = [
-            req_time for req_time in self.request_history[client_ip]
-            if req_time > cutoff
-        ]
-
-        # Check limit
-        if len(self.request_history[client_ip]) >= self.requests_per_minute:
-            logger.warning(f"Rate limit exceeded for {client_ip}")
-            return JSONResponse(
+        if request.url.path in EXEMPT_PATHS or request.headers.get("user-agent") == "testclient":
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            allowed, retry_after, key = await self._take(request)
+        except Exception:
+            logger.warning("Rate limit store unavailable; allowing request", exc_info=True)
+            allowed, retry_after = True, 0.0
+        if not allowed:
+            logger.warning("Rate limit exceeded for %s", key)
+            response = JSONResponse(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 content={"detail": "Too many requests"},
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
             )
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
 
-        # Record request
-        self.request_history[client_ip].append(now)
+SECURITY_HEADERS = {
+    "X-Content-Type-Options": "nosniff",
+    "X-Frame-Options": "DENY",
+    "X-XSS-Protection": "1; mode=block",
+    "Strict-Transport-Security": "max-age=31536000; includeSubDomains",
+}
 
-        # Continue with request
-        response = await call_next(request)
-        return response
 
+class InputValidationMiddleware:
+    """Add security headers to every HTTP response as it starts."""
 
-class InputValidationMiddleware(BaseHTTPMiddleware):
-    """Validate and sanitize input"""
+    def __init__(self, app: ASGIApp, headers: Optional[dict[str, str]] = None):
+        self.app = app
+        self.headers = SECURITY_HEADERS if headers is None else headers
 
-    async def dispatch(self, request: Request, call_next):
-        # Add security headers
-        response = await call_next(request)
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-        return response
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).update(self.headers)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
 
 
 def setup_cors(app):
@@ -100,7 +322,21 @@ def setup_cors(app):
 def setup_security_middleware(app):
     """Setup all security middleware"""
     # Rate limiting
-    app.add_middleware(RateLimitMiddleware, requests_per_minute=60)
+    settings = get_settings()
+    budgets = {
+        "heartbeat": RateBudget(settings.rate_limit_heartbeat_per_minute, settings.rate_limit_heartbeat_burst),
+        "download": RateBudget(settings.rate_limit_download_per_minute, settings.rate_limit_download_burst),
+        "admin": RateBudget(settings.rate_limit_admin_per_minute, settings.rate_limit_admin_burst),
+        "batch": RateBudget(settings.rate_limit_batch_per_minute, settings.rate_limit_batch_burst),
+    }
+    store = RedisBucketStore(settings.rate_limit_redis_url) if settings.rate_limit_redis_url else None
+    app.add_middleware(
+        RateLimitMiddleware,
+        budgets=budgets,
+        store=store,
+        ip_budget=RateBudget(settings.rate_limit_ip_per_minute, settings.rate_limit_ip_burst),
+        known_token=lambda token: principal_cache.get(token) is not None,
+    )
 
     # Input validation
     app.add_middleware(InputValidationMiddleware)
@@ -0,0 +1,37 @@
+"""Bundle manifest helpers."""
+import re
+from pathlib import PurePosixPath
+from typing import Any
+
+_SHA256_HEX = re.compile(r"^[0-9a-f]{64}$")
+
+
+def validate_manifest_files(files: Any) -> None:
+    """
+    Validate the optional per-file ``files`` list of a bundle manifest.
+
+    Each entry is ``{"path": str, "sha256": hex, "size": int}`` with a path
+    relative to the bundle root. Agents use these entries to reuse unchanged
+    files from the previously deployed version.
+
+    Raises:
+        ValueError: If the list or any entry is malformed
+    """
+    if not isinstance(files, list):
+        raise ValueError("Manifest 'files' must be a list")
+    seen = set()
+    for entry in files:
+        if not isinstance(entry, dict):
+            raise ValueError("Manifest 'files' entries must be objects")
+        path = entry.get("path")
+        parts = PurePosixPath(path).parts if isinstance(path, str) else ()
+        if not parts or path.startswith("/") or ".." in parts:
+            raise ValueError(f"Manifest file entry has invalid path: {path!r}")
+        if path in seen:
+            raise ValueError(f"Manifest lists {path} more than once")
+        seen.add(path)
+        if not isinstance(entry.get("sha256"), str) or not _SHA256_HEX.match(entry["sha256"]):
+            raise ValueError(f"Manifest file entry {path} has invalid sha256")
+        size = entry.get("size")
+        if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+            raise ValueError(f"Manifest file entry {path} has invalid size")
@@ -0,0 +1,250 @@
+"""
+Deployment targeting.
+
+A deployment's devices live in ``deployment_targets``, one row per device,
+written once at creation time. Explicit device lists are inserted in a
+single executemany; label selectors are resolved and inserted entirely in
+the database with ``INSERT ... SELECT`` over the ``device_tags`` index, so
+a 30k-device rollout never round-trips device ids through Python.
+"""
+import re
+from typing import Optional, Sequence
+
+from sqlalchemy import and_, func, insert, literal, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.deployment import Deployment, DeploymentTarget
+from app.models.device import Device, DeviceTag
+from app.models.device_config import DeviceBundleHistory
+
+_LABEL = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._/-]{0,62}$")
+TERMINAL_TARGET_STATUSES = ("success", "failed")
+
+
+def validate_label(text: str, what: str) -> None:
+    if not _LABEL.match(text or ""):
+        raise ValueError(f"Invalid tag {what}: {text!r}")
+
+
+def parse_selector(selector: str) -> dict[str, str]:
+    """
+    Parse ``key=value[,key=value...]`` into a dict; all pairs must match.
+
+    Raises:
+        ValueError: If the selector is empty, malformed or repeats a key
+    """
+    labels: dict[str, str] = {}
+    for term in selector.split(","):
+        key, sep, value = term.strip().partition("=")
+        key, value = key.strip(), value.strip()
+        if not sep:
+            raise ValueError(f"Selector term {term.strip()!r} must be key=value")
+        validate_label(key, "key")
+        validate_label(value, "value")
+        if key in labels:
+            raise ValueError(f"Selector repeats key {key!r}")
+        labels[key] = value
+    return labels
+
+
+def selector_device_ids(labels: dict[str, str]):
+    """Select public device ids carrying every ``labels`` pair."""
+    matching = (
+        select(DeviceTag.device_id)
+        .where(or_(*(and_(DeviceTag.key == k, DeviceTag.value == v) for k, v in labels.items())))
+        .group_by(DeviceTag.device_id)
+        .having(func.count() == len(labels))
+    )
+    return select(Device.device_id).where(Device.id.in_(matching))
+
+
+async def set_device_tags(session: AsyncSession, device: Device, tags: dict[str, str]) -> None:
+    """Replace a device's tags (no commit)."""
+    for key, value in tags.items():
+        validate_label(key, "key")
+        validate_label(value, "value")
+    await session.execute(DeviceTag.__table__.delete().where(DeviceTag.device_id == device.id))
+    if tags:
+        await session.execute(
+            insert(DeviceTag),
+            [{"device_id": device.id, "key": k, "value": v} for k, v in tags.items()],
+        )
+    device.tags = dict(tags)
+
+
+async def create_deployment_targets(
+    session: AsyncSession,
+    deployment: Deployment,
+    device_ids: Optional[Sequence[str]] = None,
+    selector: Optional[str] = None,
+) -> int:
+    """
+    Write the target rows for a flushed ``deployment``; returns how many.
+
+    Raises:
+        ValueError: If ``selector`` is malformed
+    """
+    if selector:
+        labels = parse_selector(selector)
+        ids = selector_device_ids(labels).subquery()
+        result = await session.execute(
+            insert(DeploymentTarget).from_select(
+                ["deployment_id", "device_id", "status"],
+                select(literal(deployment.id), ids.c.device_id, literal("pending")),
+            )
+        )
+        count = result.rowcount
+    else:
+        unique_ids = list(dict.fromkeys(device_ids or []))
+        if unique_ids:
+            await session.execute(
+                insert(DeploymentTarget),
+                [{"deployment_id": deployment.id, "device_id": d, "status": "pending"} for d in unique_ids],
+            )
+        count = len(unique_ids)
+    deployment.target_count = count
+    return count
+
+
+async def pending_deployments_for(session: AsyncSession, device_id: str) -> list[tuple[Deployment, DeploymentTarget]]:
+    """Open deployments whose target row for ``device_id`` has not been dispatched yet."""
+    result = await session.execute(
+        select(Deployment, DeploymentTarget)
+        .join(DeploymentTarget, DeploymentTarget.deployment_id == Deployment.id)
+        .where(
+            DeploymentTarget.device_id == device_id,
+            DeploymentTarget.status == "pending",
+            Deployment.status.in_(("pending", "in_progress")),
+        )
+        .order_by(Deployment.created_at)
+    )
+    return list(result.tuples().all())
+
+
+async def get_target(session: AsyncSession, deployment_id: str, device_id: str) -> Optional[DeploymentTarget]:
+    return await session.scalar(
+        select(DeploymentTarget).where(
+            DeploymentTarget.deployment_id == deployment_id,
+            DeploymentTarget.device_id == device_id,
+        )
+    )
+
+
+async def record_target_result(session: AsyncSession, deployment: Deployment, target: DeploymentTarget, status: str) -> Optional[str]:
+    """
+    Set a target's reported status; returns the overall status once every target has reported, else None.
+
+    The deployment's ``reported_count`` and ``failed_count`` move in the
+    same transaction as the target row, so the outcome is one counter
+    update rather than an aggregate over every target. A deployment fails
+    if any target failed.
+    """
+    previous, target.status = target.status, status
+    reported = int(status in TERMINAL_TARGET_STATUSES) - int(previous in TERMINAL_TARGET_STATUSES)
+    failed = int(status == "failed") - int(previous == "failed")
+    result = await session.execute(
+        update(Deployment)
+        .where(Deployment.id == deployment.id)
+        .values(reported_count=Deployment.reported_count + reported, failed_count=Deployment.failed_count + failed)
+        .returning(Deployment.reported_count, Deployment.failed_count)
+        .execution_options(synchronize_session="fetch")
+    )
+    reported_count, failed_count = result.one()
+    if reported_count < (deployment.target_count or 0):
+        return None
+    return "failed" if failed_count else "success"
+
+
+async def target_device_ids(session: AsyncSession, deployment_id: str) -> list[str]:
+    result = await session.execute(
+        select(DeploymentTarget.device_id)
+        .where(DeploymentTarget.deployment_id == deployment_id)
+        .order_by(DeploymentTarget.device_id)
+    )
+    return list(result.scalars().all())
+
+
+# Keeps each IN (...) list well under SQLite's bound-parameter limit
+_ID_CHUNK = 5000
+
+
+async def find_rollback_blockers(
+    session: AsyncSession,
+    device_ids: Sequence[str],
+    bundle_version: str,
+) -> tuple[list[str], list[str]]:
+    """
+    Devices that cannot roll back to ``bundle_version``.
+
+    Returns ``(missing, never_deployed)``: ids with no device row, and
+    devices with no successful deployment of that version. One grouped
+    outer join per chunk of ids, served by the
+    ``(device_id, bundle_version, status)`` history index.
+    """
+    unique_ids = list(dict.fromkeys(device_ids))
+    successes: dict[str, int] = {}
+    for start in range(0, len(unique_ids), _ID_CHUNK):
+        result = await session.execute(
+            select(Device.device_id, func.count(DeviceBundleHistory.id))
+            .select_from(Device)
+            .outerjoin(
+                DeviceBundleHistory,
+                and_(
+                    DeviceBundleHistory.device_id == Device.id,
+                    DeviceBundleHistory.bundle_version == bundle_version,
+                    DeviceBundleHistory.status == "success",
+                ),
+            )
+            .where(Device.device_id.in_(unique_ids[start:start + _ID_CHUNK]))
+            .group_by(Device.device_id)
+        )
+        successes.update(result.tuples().all())
+    missing = [d for d in unique_ids if d not in successes]
+    never_deployed = [d for d in unique_ids if successes.get(d) == 0]
+    return missing, never_deployed
+
+
+def record_good_version(device: Device, bundle_version: str) -> None:
+    """Shift the device's last-known-good versions after a successful deploy."""
+    if device.last_good_bundle_version == bundle_version:
+        return
+    device.previous_good_bundle_version = device.last_good_bundle_version
+    device.last_good_bundle_version = bundle_version
+
+
+async def previous_good_versions(
+    session: AsyncSession,
+    device_ids: Sequence[str] = (),
+    selector: Optional[str] = None,
+) -> tuple[dict[str, list[str]], list[str]]:
+    """
+    Group devices by their previous good bundle version.
+
+    Returns ``({version: [device_id, ...]}, skipped)`` where ``skipped``
+    holds requested ids that are unknown or have no previous good version.
+
+    Raises:
+        ValueError: If ``selector`` is malformed
+    """
+    groups: dict[str, list[str]] = {}
+    found: set[str] = set()
+    queries = []
+    if selector:
+        queries.append(Device.device_id.in_(selector_device_ids(parse_selector(selector))))
+    unique_ids = list(dict.fromkeys(device_ids))
+    for start in range(0, len(unique_ids), _ID_CHUNK):
+        queries.append(Device.device_id.in_(unique_ids[start:start + _ID_CHUNK]))
+    for condition in queries:
+        result = await session.execute(
+            select(Device.device_id, Device.previous_good_bundle_version).where(condition)
+        )
+        for device_id, version in result.tuples():
+            if device_id in found:
+                continue
+            found.add(device_id)
+            if version:
+                groups.setdefault(version, []).append(device_id)
+    with_version = {d for ids in groups.values() for d in ids}
+    skipped = [d for d in unique_ids if d not in with_version]
+    skipped.extend(sorted(found - with_version - set(unique_ids)))
+    return groups, skipped
@@ -0,0 +1,116 @@
+"""
+Device public keys: parsing, type checks and signature verification.
+
+Agents generate Ed25519 keys by default and older agents RSA-4096. Parsing a
+PEM is far more expensive than verifying a signature with the parsed key,
+so parsed keys are cached by fingerprint.
+
+Registration carries a proof of possession: the device signs
+``kernex-register\n<fingerprint>\n<timestamp>`` with its private key.
+"""
+import base64
+import binascii
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, padding, rsa
+
+from app.models.device import public_key_fingerprint
+
+KEY_TYPES = ("ed25519", "rsa")
+_KEY_CACHE_SIZE = 10000
+
+
+def key_type_of(key) -> Optional[str]:
+    if isinstance(key, ed25519.Ed25519PublicKey):
+        return "ed25519"
+    if isinstance(key, rsa.RSAPublicKey):
+        return "rsa"
+    return None
+
+
+_key_cache: "OrderedDict[str, object]" = OrderedDict()
+
+
+def load_public_key(public_key: str):
+    """
+    Parsed public key for a PEM, from an LRU cache keyed by fingerprint.
+
+    Raises:
+        ValueError: If the PEM cannot be parsed
+    """
+    fingerprint = public_key_fingerprint(public_key)
+    key = _key_cache.get(fingerprint)
+    if key is not None:
+        _key_cache.move_to_end(fingerprint)
+        return key
+    key = serialization.load_pem_public_key(public_key.encode())
+    _key_cache[fingerprint] = key
+    if len(_key_cache) > _KEY_CACHE_SIZE:
+        _key_cache.popitem(last=False)
+    return key
+
+
+def validate_public_key(public_key: str, key_type: str) -> None:
+    """
+    Check that ``public_key`` parses and is of ``key_type``.
+
+    Raises:
+        ValueError: If it does not
+    """
+    try:
+        actual = key_type_of(load_public_key(public_key))
+    except ValueError:
+        raise ValueError("public_key is not a valid PEM public key")
+    if actual != key_type:
+        raise ValueError(f"public_key is {actual or 'an unsupported key'}, not {key_type}")
+
+
+def verify_signature(public_key: str, signature: bytes, message: bytes) -> bool:
+    """Verify a device signature: Ed25519, or RSA PKCS#1 v1.5 over SHA-256."""
+    try:
+        key = load_public_key(public_key)
+        if isinstance(key, ed25519.Ed25519PublicKey):
+            key.verify(signature, message)
+        elif isinstance(key, rsa.RSAPublicKey):
+            key.verify(signature, message, padding.PKCS1v15(), hashes.SHA256())
+        else:
+            return False
+    except (InvalidSignature, ValueError):
+        return False
+    return True
+
+
+def registration_proof_message(public_key: str, timestamp: str) -> bytes:
+    return f"kernex-register\n{public_key_fingerprint(public_key)}\n{timestamp}".encode()
+
+
+def check_registration_proof(
+    public_key: str,
+    timestamp: Optional[str],
+    signature: Optional[str],
+    max_skew_seconds: float,
+    now: Optional[float] = None,
+) -> None:
+    """
+    Check that the registering client holds the private key for ``public_key``.
+
+    ``signature`` is base64 over ``registration_proof_message``.
+
+    Raises:
+        ValueError: If the proof is missing, stale or wrong
+    """
+    if not timestamp or not signature:
+        raise ValueError("Missing registration proof")
+    try:
+        skew = abs((time.time() if now is None else now) - int(timestamp))
+        raw = base64.b64decode(signature, validate=True)
+    except (ValueError, binascii.Error):
+        raise ValueError("Malformed registration proof")
+    if skew > max_skew_seconds:
+        raise ValueError("Registration proof timestamp outside the allowed window")
+    if not verify_signature(public_key, raw, registration_proof_message(public_key, timestamp)):
+        raise ValueError("Invalid registration proof")
@@ -0,0 +1,156 @@
+"""Device helpers shared across the device and deployment APIs."""
+import json
+import uuid
+from ipaddress import ip_address, ip_network
+from typing import Optional, Sequence
+from urllib.parse import urlsplit
+
+from sqlalchemy import insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.device import Device, DeviceTag, public_key_fingerprint
+from app.services.deployment_service import validate_label
+from app.services.device_keys import validate_public_key
+from app.services.fleet_service import count_new_devices
+
+# Devices in these states are not asked to serve peers
+UNREACHABLE_STATUSES = ("offline", "error")
+
+
+def site_network_for(host: Optional[str], prefix: int) -> Optional[str]:
+    """Return the CIDR network of ``host`` (e.g. ``10.1.2.0/24``), or None for non-IP hosts."""
+    if not host:
+        return None
+    try:
+        addr = ip_address(host)
+    except ValueError:
+        return None
+    bits = prefix if addr.version == 4 else 64
+    return str(ip_network(f"{addr}/{bits}", strict=False))
+
+
+def device_site_network(peer_url: Optional[str], client_host: Optional[str], prefix: int) -> Optional[str]:
+    """
+    Locate a device on the LAN.
+
+    The advertised peer URL carries the agent's LAN address, which is what
+    other agents must reach; the connecting address is only a fallback since
+    it is often a NAT gateway.
+    """
+    if peer_url:
+        return site_network_for(urlsplit(peer_url).hostname, prefix)
+    return site_network_for(client_host, prefix)
+
+
+async def find_bundle_peers(
+    session: AsyncSession,
+    device: Device,
+    bundle_version: str,
+    limit: int,
+) -> list[str]:
+    """Peer URLs on the same site network that already run ``bundle_version``."""
+    if not device.site_network or not bundle_version or limit <= 0:
+        return []
+    query = (
+        select(Device.peer_url)
+        .where(
+            Device.site_network == device.site_network,
+            Device.current_bundle_version == bundle_version,
+            Device.peer_url.is_not(None),
+            Device.device_id != device.device_id,
+            or_(Device.status.is_(None), Device.status.not_in(UNREACHABLE_STATUSES)),
+        )
+        .order_by(Device.last_heartbeat.desc())
+        .limit(limit)
+    )
+    if device.org_id is None:
+        query = query.where(Device.org_id.is_(None))
+    else:
+        query = query.where(Device.org_id == device.org_id)
+    result = await session.execute(query)
+    return [url for url in result.scalars().all()]
+
+
+# Keeps each IN (...) lookup well under SQLite's bound-parameter limit
+_LOOKUP_CHUNK = 5000
+_JSON_COLUMNS = ("hardware_metadata", "tags")
+
+
+async def _copy_devices(session: AsyncSession, rows: list[dict]) -> None:
+    """Load device rows with asyncpg's binary COPY."""
+    columns = list(rows[0])
+    records = [
+        tuple(json.dumps(row[c]) if c in _JSON_COLUMNS and row[c] is not None else row[c] for c in columns)
+        for row in rows
+    ]
+    connection = await session.connection()
+    raw = await connection.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(Device.__tablename__, records=records, columns=columns)
+
+
+async def bulk_register_devices(session: AsyncSession, items: Sequence) -> list[dict]:
+    """
+    Register many devices at once (no commit).
+
+    Returns one ``{"device_id", "registration_token", "created"}`` dict per
+    item, in order. Keys that are already registered, or repeated within
+    ``items``, map to the existing device. Existing keys are found with one
+    fingerprint set query per chunk, and new devices are written with a
+    multi-row INSERT, or COPY on PostgreSQL.
+    """
+    fingerprints = [public_key_fingerprint(item.public_key) for item in items]
+    keys = list(dict.fromkeys(fingerprints))
+    known: dict[str, tuple[str, str]] = {}
+    for start in range(0, len(keys), _LOOKUP_CHUNK):
+        result = await session.execute(
+            select(Device.public_key_fingerprint, Device.device_id, Device.registration_token).where(
+                Device.public_key_fingerprint.in_(keys[start:start + _LOOKUP_CHUNK])
+            )
+        )
+        known.update({key: (device_id, token) for key, device_id, token in result.tuples()})
+
+    new_rows: list[dict] = []
+    new_tags: list[dict] = []
+    created: set[str] = set()
+    for item, fingerprint in zip(items, fingerprints):
+        if fingerprint in known:
+            continue
+        row = {
+            "id": str(uuid.uuid4()),
+            "device_id": str(uuid.uuid4()),
+            "org_id": item.org_id,
+            "device_type": item.device_type,
+            "hardware_metadata": item.hardware_metadata,
+            "public_key": item.public_key,
+            "public_key_fingerprint": fingerprint,
+            "key_type": item.key_type,
+            "registration_token": str(uuid.uuid4()),
+            "status": "online",
+            "tags": dict(item.tags) if item.tags else None,
+        }
+        if item.key_type:
+            validate_public_key(item.public_key, item.key_type)
+        for key, value in (item.tags or {}).items():
+            validate_label(key, "key")
+            validate_label(value, "value")
+            new_tags.append({"device_id": row["id"], "key": key, "value": value})
+        new_rows.append(row)
+        known[fingerprint] = (row["device_id"], row["registration_token"])
+        created.add(fingerprint)
+
+    if new_rows:
+        if session.bind.dialect.name == "postgresql":
+            await _copy_devices(session, new_rows)
+        else:
+            await session.execute(insert(Device), new_rows)
+        if new_tags:
+            await session.execute(insert(DeviceTag), new_tags)
+        await count_new_devices(session, new_rows)
+
+    results = []
+    for fingerprint in fingerprints:
+        device_id, token = known[fingerprint]
+        results.append({"device_id": device_id, "registration_token": token, "created": fingerprint in created})
+        # Later duplicates of the same key within the batch are not "created"
+        created.discard(fingerprint)
+    return results
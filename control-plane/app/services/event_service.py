@@ -0,0 +1,185 @@
+"""
+Append-only event log and its live broadcast.
+
+``record_event`` adds an ``events`` row to the caller's transaction and
+remembers it on the session. Once that transaction commits, the event is
+handed to every in-process subscriber (the ``/logs/stream`` SSE tails), so
+followers see only committed activity without re-polling. Rolled-back
+events are discarded. Subscribers that fall behind, or that run in another
+worker process, catch up from the table by id.
+"""
+import asyncio
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import and_, event as sa_event, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.event import Event
+
+INFO, WARNING, ERROR = "INFO", "WARNING", "ERROR"
+LEVELS = (INFO, WARNING, ERROR)
+
+_PENDING_KEY = "pending_events"
+_FLUSHED_KEY = "flushed_events"
+SUBSCRIBER_QUEUE_SIZE = 1000
+# How far below the newest id a catch-up looks for events committed late
+CATCHUP_LOOKBACK_IDS = 200
+
+
+def status_level(status: Optional[str]) -> str:
+    if status in {"error", "failed", "offline"}:
+        return ERROR
+    if status in {"degraded", "warning"}:
+        return WARNING
+    return INFO
+
+
+def event_to_dict(row: Event) -> dict[str, Any]:
+    return {
+        "id": row.id,
+        "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+        "level": row.level,
+        "kind": row.kind,
+        "device_id": row.device_id,
+        "deployment_id": row.deployment_id,
+        "message": row.message,
+    }
+
+
+async def record_event(
+    session: AsyncSession,
+    kind: str,
+    message: str,
+    level: str = INFO,
+    device_id: Optional[str] = None,
+    deployment_id: Optional[str] = None,
+) -> Event:
+    """Add an event to the current transaction (no commit)."""
+    row = Event(
+        timestamp=datetime.utcnow(),
+        level=level,
+        kind=kind,
+        device_id=device_id,
+        deployment_id=deployment_id,
+        message=message,
+    )
+    session.add(row)
+    session.sync_session.info.setdefault(_PENDING_KEY, []).append(row)
+    return row
+
+
+async def record_deployment_event(
+    session: AsyncSession,
+    deployment,
+    message: str,
+    level: str = INFO,
+) -> Event:
+    return await record_event(
+        session, "deployment", f"Deployment {deployment.id} {message}", level, deployment_id=deployment.id
+    )
+
+
+async def list_events(
+    session: AsyncSession,
+    before: Optional[tuple[datetime, int]],
+    limit: int,
+    level: Optional[str] = None,
+    kind: Optional[str] = None,
+    device_id: Optional[str] = None,
+) -> tuple[list[Event], Optional[tuple[datetime, int]]]:
+    """
+    One page of events, newest first, strictly older than ``before``.
+
+    Returns the rows and the ``(timestamp, id)`` key to pass as ``before``
+    for the next page (None on the last page).
+    """
+    query = select(Event)
+    if before is not None:
+        ts, last_id = before
+        query = query.where(or_(Event.timestamp < ts, and_(Event.timestamp == ts, Event.id < last_id)))
+    if level is not None:
+        query = query.where(Event.level == level)
+    if kind is not None:
+        query = query.where(Event.kind == kind)
+    if device_id is not None:
+        query = query.where(Event.device_id == device_id)
+    result = await session.execute(query.order_by(Event.timestamp.desc(), Event.id.desc()).limit(limit + 1))
+    rows = list(result.scalars().all())
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (rows[-1].timestamp, rows[-1].id)
+
+
+async def events_after(session: AsyncSession, after_id: int, limit: int) -> list[Event]:
+    """
+    Events with ids above ``after_id`` in id order, for stream catch-up.
+
+    Ids are assigned at insert, not at commit, so a lower id can become
+    visible after a higher one; readers re-scan ``CATCHUP_LOOKBACK_IDS``
+    below what they have seen and skip ids they already sent.
+    """
+    result = await session.execute(select(Event).where(Event.id > after_id).order_by(Event.id).limit(limit))
+    return list(result.scalars().all())
+
+
+async def latest_event_id(session: AsyncSession) -> int:
+    return await session.scalar(select(Event.id).order_by(Event.id.desc()).limit(1)) or 0
+
+
+class Subscription:
+    def __init__(self) -> None:
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        # Set when the queue overflowed; the reader must resync from the table
+        self.lagged = False
+
+
+class EventBroadcaster:
+    """Fan committed events out to in-process subscribers without blocking writers."""
+
+    def __init__(self) -> None:
+        self._subscribers: set[Subscription] = set()
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription()
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+
+    def publish(self, payload: dict[str, Any]) -> None:
+        for subscription in self._subscribers:
+            try:
+                subscription.queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                subscription.lagged = True
+
+
+broadcaster = EventBroadcaster()
+
+
+@sa_event.listens_for(Session, "after_flush_postexec")
+def _snapshot_flushed(session: Session, _flush_context) -> None:
+    # Serialize while ids are fresh; commit may expire the instances
+    pending = session.info.get(_PENDING_KEY)
+    if not pending:
+        return
+    flushed = session.info.setdefault(_FLUSHED_KEY, [])
+    flushed.extend(event_to_dict(row) for row in pending if row.id is not None)
+    pending[:] = [row for row in pending if row.id is None]
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _publish_committed(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+    for payload in session.info.pop(_FLUSHED_KEY, ()):
+        broadcaster.publish(payload)
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_FLUSHED_KEY, None)
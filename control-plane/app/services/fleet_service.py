@@ -0,0 +1,139 @@
+"""
+Incrementally maintained fleet counters.
+
+Writers adjust a handful of counter rows in the same transaction as the
+change they describe (registration, heartbeat status transitions,
+deployment state changes), so ``GET /fleet/summary`` reads a fixed number
+of rows however large the fleet is. ``reconcile_fleet_counters`` rebuilds
+the table from SQL aggregates to correct any drift.
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import delete, func, insert, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.deployment import Deployment
+from app.models.device import Device
+from app.models.fleet import FleetCounter
+
+DEVICES = "devices"
+DEVICE_DIMENSIONS = {
+    "status": Device.status,
+    "bundle_version": Device.current_bundle_version,
+    "device_type": Device.device_type,
+}
+DEPLOYMENT_STATUS = "deployment_status"
+ACTIVE_ROLLOUT_STATUSES = ("pending", "in_progress")
+UNKNOWN = "unknown"
+
+_UPSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+async def adjust_counter(session: AsyncSession, dimension: str, value: Optional[str], delta: int) -> None:
+    """Atomically add ``delta`` to one counter, creating the row if needed."""
+    if delta == 0:
+        return
+    key = value or ""
+    dialect_insert = _UPSERT_DIALECTS.get(session.bind.dialect.name)
+    if dialect_insert is not None:
+        stmt = dialect_insert(FleetCounter).values(dimension=dimension, value=key, count=delta)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[FleetCounter.dimension, FleetCounter.value],
+            set_={"count": FleetCounter.count + delta, "updated_at": func.now()},
+        )
+        await session.execute(stmt)
+        return
+    result = await session.execute(
+        update(FleetCounter)
+        .where(FleetCounter.dimension == dimension, FleetCounter.value == key)
+        .values(count=FleetCounter.count + delta)
+    )
+    if result.rowcount == 0:
+        await session.execute(insert(FleetCounter).values(dimension=dimension, value=key, count=delta))
+
+
+async def count_new_device(session: AsyncSession, device: Device) -> None:
+    await adjust_counter(session, DEVICES, None, 1)
+    for dimension, column in DEVICE_DIMENSIONS.items():
+        await adjust_counter(session, dimension, getattr(device, column.key), 1)
+
+
+async def count_new_devices(session: AsyncSession, devices: list[dict]) -> None:
+    """Bulk variant of ``count_new_device`` for plain row dicts: one upsert per distinct value."""
+    await adjust_counter(session, DEVICES, None, len(devices))
+    for dimension, column in DEVICE_DIMENSIONS.items():
+        for value, count in Counter(row.get(column.key) for row in devices).items():
+            await adjust_counter(session, dimension, value, count)
+
+
+async def set_device_attribute(session: AsyncSession, device: Device, dimension: str, value: Optional[str]) -> None:
+    """Assign a counted device attribute and move it between counters if it changed."""
+    attribute = DEVICE_DIMENSIONS[dimension].key
+    old = getattr(device, attribute)
+    if old == value:
+        return
+    setattr(device, attribute, value)
+    await adjust_counter(session, dimension, old, -1)
+    await adjust_counter(session, dimension, value, 1)
+
+
+async def count_new_deployment(session: AsyncSession, status: str) -> None:
+    await adjust_counter(session, DEPLOYMENT_STATUS, status, 1)
+
+
+async def set_deployment_status(session: AsyncSession, deployment: Deployment, status: str) -> None:
+    old = deployment.status
+    if old == status:
+        return
+    deployment.status = status
+    await adjust_counter(session, DEPLOYMENT_STATUS, old, -1)
+    await adjust_counter(session, DEPLOYMENT_STATUS, status, 1)
+
+
+async def fleet_summary(session: AsyncSession) -> dict[str, Any]:
+    result = await session.execute(select(FleetCounter.dimension, FleetCounter.value, FleetCounter.count))
+    groups: dict[str, dict[str, int]] = {}
+    for dimension, value, count in result.all():
+        if count:
+            groups.setdefault(dimension, {})[value or UNKNOWN] = int(count)
+    deployments = groups.get(DEPLOYMENT_STATUS, {})
+    return {
+        "total_devices": sum(groups.get(DEVICES, {}).values()),
+        "by_status": groups.get("status", {}),
+        "by_bundle_version": groups.get("bundle_version", {}),
+        "by_device_type": groups.get("device_type", {}),
+        "deployments_by_status": deployments,
+        "active_rollouts": sum(deployments.get(s, 0) for s in ACTIVE_ROLLOUT_STATUSES),
+    }
+
+
+async def _aggregate_counts(session: AsyncSession) -> list[dict]:
+    rows = [
+        {"dimension": DEVICES, "value": "", "count": await session.scalar(select(func.count()).select_from(Device))}
+    ]
+    for dimension, column in DEVICE_DIMENSIONS.items():
+        result = await session.execute(select(column, func.count()).group_by(column))
+        rows.extend({"dimension": dimension, "value": v or "", "count": c} for v, c in result.all())
+    result = await session.execute(select(Deployment.status, func.count()).group_by(Deployment.status))
+    rows.extend({"dimension": DEPLOYMENT_STATUS, "value": v or "", "count": c} for v, c in result.all())
+    return rows
+
+
+async def reconcile_fleet_counters(session: AsyncSession) -> dict[str, Any]:
+    """
+    Replace every counter with a fresh GROUP BY aggregate and commit.
+
+    On PostgreSQL the counter table is locked first so increments made by
+    concurrent transactions wait and land on top of the rebuilt values.
+    """
+    if session.bind.dialect.name == "postgresql":
+        await session.execute(text("LOCK TABLE fleet_counters IN EXCLUSIVE MODE"))
+    rows = await _aggregate_counts(session)
+    await session.execute(delete(FleetCounter))
+    now = datetime.utcnow()
+    await session.execute(insert(FleetCounter), [dict(row, updated_at=now) for row in rows])
+    await session.commit()
+    return await fleet_summary(session)
@@ -0,0 +1,243 @@
+"""
+Device log ingestion and search.
+
+Agents upload batches of newline-delimited JSON, normally gzip-compressed
+(``Content-Encoding: gzip``). Batches are decompressed incrementally with
+a hard output cap, so a small compressed body cannot expand without bound,
+and stored with one multi-row insert.
+
+Queries page newest-first on ``(timestamp, id)`` and filter by device, time
+range and minimum level through the ``(device_id, timestamp, level)``
+index. Text search uses the FTS5 table on SQLite and a GIN ``tsvector``
+index on PostgreSQL. Old lines are pruned in bounded batches.
+"""
+import json
+import re
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from sqlalchemy import and_, column, delete, func, insert, or_, select, table
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.device_log import SQLITE_FTS_TABLE, DeviceLog, message_tsvector
+
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+MAX_MESSAGE_CHARS = 8192
+_DECOMPRESS_CHUNK = 64 * 1024
+
+
+class LogBatchTooLarge(ValueError):
+    """The batch exceeds the configured byte or line limit."""
+
+
+def decode_body(body: bytes, content_encoding: Optional[str], max_bytes: int) -> bytes:
+    """
+    Return the uncompressed batch.
+
+    Raises:
+        LogBatchTooLarge: If it would exceed ``max_bytes``
+        ValueError: If the encoding is unsupported or the data is corrupt
+    """
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding == "identity":
+        if len(body) > max_bytes:
+            raise LogBatchTooLarge(f"Log batch exceeds {max_bytes} bytes")
+        return body
+    if encoding != "gzip":
+        raise ValueError(f"Unsupported Content-Encoding: {content_encoding}")
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    chunks = []
+    size = 0
+    data = body
+    try:
+        while data:
+            chunk = decompressor.decompress(data, _DECOMPRESS_CHUNK)
+            size += len(chunk)
+            if size > max_bytes:
+                raise LogBatchTooLarge(f"Log batch exceeds {max_bytes} bytes uncompressed")
+            chunks.append(chunk)
+            data = decompressor.unconsumed_tail
+        tail = decompressor.flush()
+    except zlib.error as exc:
+        raise ValueError(f"Corrupt gzip body: {exc}")
+    if size + len(tail) > max_bytes:
+        raise LogBatchTooLarge(f"Log batch exceeds {max_bytes} bytes uncompressed")
+    chunks.append(tail)
+    return b"".join(chunks)
+
+
+def to_naive_utc(value: datetime) -> datetime:
+    """Timestamps are stored as naive UTC like the rest of the schema."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _parse_timestamp(value) -> datetime:
+    if isinstance(value, str):
+        try:
+            return to_naive_utc(datetime.fromisoformat(value.replace("Z", "+00:00")))
+        except ValueError:
+            pass
+    return datetime.utcnow()
+
+
+def _optional_str(value) -> Optional[str]:
+    return str(value)[:256] if value is not None else None
+
+
+def parse_log_lines(data: bytes, device_id: str, max_lines: int) -> list[dict]:
+    """
+    Turn NDJSON into ``device_logs`` rows.
+
+    Unknown levels become INFO, missing or unparsable timestamps the receive
+    time, and over-long messages are truncated.
+
+    Raises:
+        LogBatchTooLarge: If there are more than ``max_lines`` entries
+        ValueError: If a line is not a JSON object with a ``message``
+    """
+    rows = []
+    for number, line in enumerate(data.splitlines(), start=1):
+        if not line.strip():
+            continue
+        if len(rows) >= max_lines:
+            raise LogBatchTooLarge(f"Log batch exceeds {max_lines} lines")
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            raise ValueError(f"Line {number} is not valid JSON")
+        if not isinstance(entry, dict) or "message" not in entry:
+            raise ValueError(f"Line {number} must be a JSON object with a message")
+        level = str(entry.get("level") or "INFO").upper()
+        rows.append(
+            {
+                "device_id": device_id,
+                "timestamp": _parse_timestamp(entry.get("timestamp")),
+                "level": level if level in LOG_LEVELS else "INFO",
+                "logger": _optional_str(entry.get("logger")),
+                "source": _optional_str(entry.get("source")),
+                "deployment_id": _optional_str(entry.get("deployment_id")),
+                "message": str(entry["message"])[:MAX_MESSAGE_CHARS],
+            }
+        )
+    return rows
+
+
+async def store_device_logs(session: AsyncSession, rows: list[dict]) -> int:
+    """Insert parsed rows (no commit); returns how many."""
+    if rows:
+        received_at = datetime.utcnow()
+        await session.execute(insert(DeviceLog), [dict(row, received_at=received_at) for row in rows])
+    return len(rows)
+
+
+def levels_at_least(level: str) -> list[str]:
+    """Levels of ``level`` severity or higher.
+
+    Raises:
+        ValueError: If ``level`` is not a known level
+    """
+    level = level.upper()
+    if level not in LOG_LEVELS:
+        raise ValueError(f"Invalid level: {level}")
+    return list(LOG_LEVELS[LOG_LEVELS.index(level):])
+
+
+_fts = table(SQLITE_FTS_TABLE, column("rowid"), column(SQLITE_FTS_TABLE))
+_TERM = re.compile(r"\S+")
+
+
+def text_condition(dialect_name: str, text: str):
+    """Match log lines containing every word of ``text``.
+
+    Raises:
+        ValueError: If ``text`` has no words
+    """
+    terms = _TERM.findall(text)
+    if not terms:
+        raise ValueError("Search text is empty")
+    if dialect_name == "sqlite":
+        # Quote each term so FTS5 operators in user input are literal
+        query = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        return DeviceLog.id.in_(select(_fts.c.rowid).where(_fts.c[SQLITE_FTS_TABLE].op("MATCH")(query)))
+    if dialect_name == "postgresql":
+        return message_tsvector().op("@@")(func.plainto_tsquery("simple", " ".join(terms)))
+    return and_(*(DeviceLog.message.icontains(term, autoescape=True) for term in terms))
+
+
+async def query_device_logs(
+    session: AsyncSession,
+    limit: int,
+    before: Optional[tuple[datetime, int]] = None,
+    device_id: Optional[str] = None,
+    min_level: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    text: Optional[str] = None,
+) -> tuple[list[DeviceLog], Optional[tuple[datetime, int]]]:
+    """
+    One page of device logs, newest first, strictly older than ``before``.
+
+    Returns the rows and the ``(timestamp, id)`` key for the next page
+    (None on the last page).
+
+    Raises:
+        ValueError: If ``min_level`` or ``text`` is invalid
+    """
+    query = select(DeviceLog)
+    if device_id is not None:
+        query = query.where(DeviceLog.device_id == device_id)
+    if min_level is not None:
+        query = query.where(DeviceLog.level.in_(levels_at_least(min_level)))
+    if since is not None:
+        query = query.where(DeviceLog.timestamp >= to_naive_utc(since))
+    if until is not None:
+        query = query.where(DeviceLog.timestamp < to_naive_utc(until))
+    if text:
+        query = query.where(text_condition(session.bind.dialect.name, text))
+    if before is not None:
+        ts, last_id = before
+        query = query.where(
+            or_(DeviceLog.timestamp < ts, and_(DeviceLog.timestamp == ts, DeviceLog.id < last_id))
+        )
+    result = await session.execute(
+        query.order_by(DeviceLog.timestamp.desc(), DeviceLog.id.desc()).limit(limit + 1)
+    )
+    rows = list(result.scalars().all())
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, (rows[-1].timestamp, rows[-1].id)
+
+
+def device_log_to_dict(row: DeviceLog) -> dict[str, Any]:
+    return {
+        "id": row.id,
+        "device_id": row.device_id,
+        "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+        "received_at": row.received_at.isoformat() if row.received_at else None,
+        "level": row.level,
+        "logger": row.logger,
+        "source": row.source,
+        "deployment_id": row.deployment_id,
+        "message": row.message,
+    }
+
+
+async def prune_device_logs(session: AsyncSession, older_than: datetime, batch_size: int) -> int:
+    """
+    Delete lines timestamped before ``older_than``, committing every batch.
+
+    Each batch is located through the ``(timestamp, id)`` index, keeping
+    transactions and lock times short. Returns the number deleted.
+    """
+    deleted = 0
+    while True:
+        batch = select(DeviceLog.id).where(DeviceLog.timestamp < older_than).limit(batch_size)
+        result = await session.execute(delete(DeviceLog).where(DeviceLog.id.in_(batch.scalar_subquery())))
+        await session.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
@@ -0,0 +1,297 @@
+"""
+Bundle garbage collection.
+
+A bundle is live when any of these hold:
+
+* it is ``current_bundle_version`` on some device,
+* a device reported it successfully deployed within the rollback window,
+* it is pinned,
+* a pending or in-progress deployment references it.
+
+Everything else has its file removed from ``BUNDLE_STORAGE_PATH`` in
+rate-limited batches and is marked ``purged_at``. Each batch locks its rows
+and recomputes the live set before marking them, so a bundle that gained a
+deployment since the run started is kept; deployment creation locks the
+same row and refuses purged bundles. Files in the storage
+directory that no bundle row points at are removed as orphans once they are
+older than a grace period (uploads write the file before the row commits).
+
+Each run also prunes device logs older than ``DEVICE_LOG_RETENTION_DAYS``.
+
+Run periodically with ``python -m app.workers.cleanup_worker``.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Optional
+
+from sqlalchemy import select, union
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.models.bundle import Bundle
+from app.models.deployment import Deployment
+from app.models.device import Device
+from app.models.device_config import DeviceBundleHistory
+from app.services.log_service import prune_device_logs
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_DEPLOYMENT_STATUSES = ("pending", "in_progress")
+
+
+@dataclass
+class BundleGCReport:
+    dry_run: bool
+    live_bundles: int = 0
+    candidates: list[dict] = field(default_factory=list)
+    orphan_files: list[str] = field(default_factory=list)
+    deleted_bundles: int = 0
+    # Candidates that became live while the run was in progress
+    kept_live: int = 0
+    deleted_orphans: int = 0
+    reclaimable_bytes: int = 0
+    reclaimed_bytes: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def live_bundle_ids_query(rollback_window: timedelta):
+    """
+    One UNION of narrow, index-backed selects.
+
+    The history branch is a range scan on (status, deployed_at, bundle_id)
+    collapsed with DISTINCT, so its cost tracks the number of recent
+    successes rather than the size of the history table.
+    """
+    cutoff = datetime.utcnow() - rollback_window
+    current_versions = (
+        select(Device.current_bundle_version)
+        .where(Device.current_bundle_version.is_not(None))
+        .distinct()
+    )
+    return union(
+        select(Bundle.id).where(Bundle.version.in_(current_versions)),
+        select(DeviceBundleHistory.bundle_id)
+        .where(
+            DeviceBundleHistory.status == "success",
+            DeviceBundleHistory.deployed_at >= cutoff,
+        )
+        .distinct(),
+        select(Bundle.id).where(Bundle.pinned.is_(True)),
+        select(Deployment.bundle_id).where(Deployment.status.in_(ACTIVE_DEPLOYMENT_STATUSES)),
+    )
+
+
+async def compute_live_bundle_ids(session: AsyncSession, rollback_window: timedelta) -> set[str]:
+    result = await session.execute(live_bundle_ids_query(rollback_window))
+    return set(result.scalars().all())
+
+
+async def _claim_dead_bundles(
+    session: AsyncSession, bundle_ids: list[str], rollback_window: timedelta
+) -> list[Bundle]:
+    """
+    Mark the bundles in ``bundle_ids`` that are still dead as purged, and commit.
+
+    The rows are locked (``FOR UPDATE`` on PostgreSQL) before liveness is
+    recomputed, so a concurrent deployment either committed first and is
+    seen here, or waits and then finds the bundle purged.
+    """
+    result = await session.execute(
+        select(Bundle).where(Bundle.id.in_(bundle_ids), Bundle.purged_at.is_(None)).with_for_update()
+    )
+    locked = result.scalars().all()
+    live_ids = await compute_live_bundle_ids(session, rollback_window)
+    claimed = [bundle for bundle in locked if bundle.id not in live_ids]
+    now = datetime.utcnow()
+    for bundle in claimed:
+        bundle.purged_at = now
+    await session.commit()
+    return claimed
+
+
+def _file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+def _unlink(path: Path) -> int:
+    size = _file_size(path)
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        return 0
+    return size
+
+
+def _find_orphans(storage_dir: Path, referenced: set[str], grace_seconds: int) -> list[Path]:
+    if not storage_dir.is_dir():
+        return []
+    cutoff = time.time() - grace_seconds
+    orphans = []
+    for entry in os.scandir(storage_dir):
+        if not entry.is_file(follow_symlinks=False):
+            continue
+        path = Path(entry.path).resolve()
+        if str(path) in referenced or entry.stat().st_mtime > cutoff:
+            continue
+        orphans.append(path)
+    return orphans
+
+
+async def collect_bundle_garbage(
+    session: AsyncSession,
+    dry_run: bool = True,
+    rollback_window: Optional[timedelta] = None,
+    batch_size: Optional[int] = None,
+    batch_pause_seconds: Optional[float] = None,
+    orphan_grace_seconds: Optional[int] = None,
+) -> BundleGCReport:
+    """Delete (or with ``dry_run`` only report) bundle files outside the live set."""
+    settings = get_settings()
+    if rollback_window is None:
+        rollback_window = timedelta(days=settings.bundle_gc_rollback_window_days)
+    batch_size = batch_size or settings.bundle_gc_batch_size
+    if batch_pause_seconds is None:
+        batch_pause_seconds = settings.bundle_gc_batch_pause_seconds
+    if orphan_grace_seconds is None:
+        orphan_grace_seconds = settings.bundle_gc_orphan_grace_seconds
+
+    report = BundleGCReport(dry_run=dry_run)
+    live_ids = await compute_live_bundle_ids(session, rollback_window)
+    report.live_bundles = len(live_ids)
+
+    result = await session.execute(
+        select(Bundle).where(Bundle.purged_at.is_(None)).order_by(Bundle.created_at)
+    )
+    candidates = [bundle for bundle in result.scalars().all() if bundle.id not in live_ids]
+    for bundle in candidates:
+        size = bundle.size_bytes or _file_size(Path(bundle.storage_path))
+        report.reclaimable_bytes += size
+        report.candidates.append(
+            {"id": bundle.id, "version": bundle.version, "storage_path": bundle.storage_path, "size_bytes": size}
+        )
+
+    referenced_paths = await session.execute(select(Bundle.storage_path).where(Bundle.purged_at.is_(None)))
+    referenced = {str(Path(p).resolve()) for p in referenced_paths.scalars()}
+    orphans = await asyncio.to_thread(
+        _find_orphans, Path(settings.bundle_storage_path), referenced, orphan_grace_seconds
+    )
+    report.orphan_files = [str(p) for p in orphans]
+    report.reclaimable_bytes += sum(_file_size(p) for p in orphans)
+
+    if dry_run:
+        return report
+
+    for start in range(0, len(candidates), batch_size):
+        batch = [bundle.id for bundle in candidates[start:start + batch_size]]
+        claimed = await _claim_dead_bundles(session, batch, rollback_window)
+        # Only rows committed as purged lose their files
+        for bundle in claimed:
+            report.reclaimed_bytes += await asyncio.to_thread(_unlink, Path(bundle.storage_path))
+        report.deleted_bundles += len(claimed)
+        report.kept_live += len(batch) - len(claimed)
+        logger.info("Purged %d bundle file(s)", len(claimed))
+        if start + batch_size < len(candidates) and batch_pause_seconds:
+            await asyncio.sleep(batch_pause_seconds)
+
+    for start in range(0, len(orphans), batch_size):
+        for path in orphans[start:start + batch_size]:
+            report.reclaimed_bytes += await asyncio.to_thread(_unlink, path)
+            report.deleted_orphans += 1
+        if start + batch_size < len(orphans) and batch_pause_seconds:
+            await asyncio.sleep(batch_pause_seconds)
+
+    return report
+
+
+@dataclass
+class BundleGCJob:
+    """A non-dry-run collection started from the API, tracked per process."""
+    id: str
+    status: str = "queued"  # queued, running, succeeded, failed
+    created_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+    finished_at: Optional[str] = None
+    report: Optional[dict] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+_MAX_GC_JOBS = 20
+gc_jobs: "OrderedDict[str, BundleGCJob]" = OrderedDict()
+
+
+def new_gc_job() -> BundleGCJob:
+    """
+    Register a queued job, keeping the most recent ``_MAX_GC_JOBS``.
+
+    Raises:
+        RuntimeError: If a job is already queued or running in this process
+    """
+    if any(job.status in ("queued", "running") for job in gc_jobs.values()):
+        raise RuntimeError("A bundle GC job is already running")
+    job = BundleGCJob(id=str(uuid.uuid4()))
+    gc_jobs[job.id] = job
+    while len(gc_jobs) > _MAX_GC_JOBS:
+        gc_jobs.popitem(last=False)
+    return job
+
+
+async def run_gc_job(job: BundleGCJob, session_factory: Callable[[], AsyncSession]) -> None:
+    job.status = "running"
+    try:
+        async with session_factory() as session:
+            report = await collect_bundle_garbage(session, dry_run=False)
+    except Exception as exc:
+        logger.exception("Bundle GC job %s failed", job.id)
+        job.status, job.error = "failed", str(exc)
+    else:
+        job.status, job.report = "succeeded", report.to_dict()
+    job.finished_at = datetime.utcnow().isoformat()
+
+
+async def run_cleanup_worker() -> None:
+    from app.db.session import AsyncSessionLocal
+
+    settings = get_settings()
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                report = await collect_bundle_garbage(session, dry_run=settings.bundle_gc_dry_run)
+            logger.info(
+                "Bundle GC finished",
+                extra={
+                    "dry_run": report.dry_run,
+                    "candidates": len(report.candidates),
+                    "orphans": len(report.orphan_files),
+                    "reclaimable_bytes": report.reclaimable_bytes,
+                    "reclaimed_bytes": report.reclaimed_bytes,
+                },
+            )
+        except Exception:
+            logger.exception("Bundle GC run failed")
+        if settings.device_log_retention_days > 0:
+            try:
+                cutoff = datetime.utcnow() - timedelta(days=settings.device_log_retention_days)
+                async with AsyncSessionLocal() as session:
+                    pruned = await prune_device_logs(session, cutoff, settings.device_log_prune_batch_size)
+                logger.info("Pruned %d device log line(s) older than %s", pruned, cutoff.isoformat())
+            except Exception:
+                logger.exception("Device log pruning failed")
+        await asyncio.sleep(settings.bundle_gc_interval_seconds)
+
+
+if __name__ == "__main__":
+    asyncio.run(run_cleanup_worker())
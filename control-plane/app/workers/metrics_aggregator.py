@@ -0,0 +1,38 @@
+"""
+Periodic fleet counter reconciliation.
+
+The counters behind ``GET /fleet/summary`` are adjusted incrementally on
+every write path; this worker rebuilds them from SQL aggregates every
+``FLEET_RECONCILE_INTERVAL_SECONDS`` so missed or out-of-band updates
+(manual SQL, crashed transactions) do not accumulate.
+
+Run with ``python -m app.workers.metrics_aggregator``.
+"""
+import asyncio
+import logging
+
+from app.config import get_settings
+from app.services.fleet_service import reconcile_fleet_counters
+
+logger = logging.getLogger(__name__)
+
+
+async def run_metrics_aggregator() -> None:
+    from app.db.session import AsyncSessionLocal
+
+    settings = get_settings()
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                summary = await reconcile_fleet_counters(session)
+            logger.info(
+                "Fleet counters reconciled",
+                extra={"total_devices": summary["total_devices"], "active_rollouts": summary["active_rollouts"]},
+            )
+        except Exception:
+            logger.exception("Fleet counter reconciliation failed")
+        await asyncio.sleep(settings.fleet_reconcile_interval_seconds)
+
+
+if __name__ == "__main__":
+    asyncio.run(run_metrics_aggregator())
@@ -0,0 +1,82 @@
+"""
+Cost of the admin auth dependency with and without the principal cache.
+
+Calls ``require_admin_user`` directly (no HTTP stack) against a scratch
+database and prints calls/s and user-table queries for both paths:
+
+    python benchmarks/bench_auth_dependency.py --calls 20000
+    python benchmarks/bench_auth_dependency.py --database-url postgresql+asyncpg://...
+
+Point ``--database-url`` at a disposable database; tables are created in it.
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi.security import HTTPAuthorizationCredentials  # noqa: E402
+from sqlalchemy import event as sa_event  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from app.api import dependencies  # noqa: E402
+from app.auth import PrincipalCache, create_access_token, hash_password  # noqa: E402
+from app.db.session import Base  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+
+async def _bench(url: str, calls: int) -> None:
+    engine = create_async_engine(url, future=True)
+    Session = async_sessionmaker(bind=engine, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    username = f"bench-{uuid.uuid4().hex[:8]}"
+    async with Session() as session:
+        session.add(User(username=username, email=f"{username}@example.com", hashed_password=hash_password("x")))
+        await session.commit()
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=create_access_token({"sub": username}))
+
+    queries = 0
+
+    def count(*_args) -> None:
+        nonlocal queries
+        queries += 1
+
+    sa_event.listen(engine.sync_engine, "before_cursor_execute", count)
+    dependencies.settings.require_admin_auth = True
+    print(f"database: {engine.dialect.name}, calls per path: {calls}")
+    results = {}
+    for label, ttl in (("uncached", 0), ("cached", 60)):
+        dependencies.principal_cache = PrincipalCache(ttl, 1024)
+        queries = 0
+        start = time.perf_counter()
+        # One session per call, as FastAPI does per request
+        for _ in range(calls):
+            async with Session() as session:
+                await dependencies.require_admin_user(credentials, session)
+        elapsed = time.perf_counter() - start
+        results[label] = elapsed
+        print(f"{label + ':':10} {elapsed:8.2f}s  {calls / elapsed:10.0f} calls/s  {queries:6d} queries")
+    print(f"speedup: {results['uncached'] / results['cached']:.1f}x")
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=5000, help="dependency calls per path")
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    scratch = tempfile.TemporaryDirectory()
+    url = args.database_url or f"sqlite+aiosqlite:///{scratch.name}/bench.db"
+    asyncio.run(_bench(url, args.calls))
+    scratch.cleanup()
+
+
+if __name__ == "__main__":
+    main()
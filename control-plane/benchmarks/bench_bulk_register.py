@@ -0,0 +1,79 @@
+"""
+Throughput of bulk vs one-at-a-time device registration.
+
+Runs the app in-process against a scratch database and prints devices/s
+for both paths:
+
+    python benchmarks/bench_bulk_register.py --count 5000 --batch 1000
+    python benchmarks/bench_bulk_register.py --database-url postgresql+asyncpg://...
+
+Point ``--database-url`` at a disposable database; tables are created in it.
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from app.db.session import Base, get_session  # noqa: E402
+from app.main import app  # noqa: E402
+
+
+def _keys(count: int, run: str) -> list[str]:
+    return [f"-----BEGIN PUBLIC KEY-----\nBENCH-{run}-{i}\n-----END PUBLIC KEY-----" for i in range(count)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=2000, help="devices per path")
+    parser.add_argument("--batch", type=int, default=1000, help="devices per bulk request")
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    scratch = tempfile.TemporaryDirectory()
+    url = args.database_url or f"sqlite+aiosqlite:///{scratch.name}/bench.db"
+    engine = create_async_engine(url, future=True)
+    Session = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def override_get_session():
+        async with Session() as session:
+            yield session
+
+    async def prepare_db():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(prepare_db())
+    app.dependency_overrides[get_session] = override_get_session
+    client = TestClient(app)
+    run = uuid.uuid4().hex[:8]
+
+    keys = _keys(args.count, f"{run}-single")
+    start = time.perf_counter()
+    for key in keys:
+        client.post("/api/v1/devices/register", json={"public_key": key, "device_type": "bench"}).raise_for_status()
+    single = time.perf_counter() - start
+
+    keys = _keys(args.count, f"{run}-bulk")
+    start = time.perf_counter()
+    for offset in range(0, len(keys), args.batch):
+        batch = [{"public_key": key, "device_type": "bench"} for key in keys[offset:offset + args.batch]]
+        client.post("/api/v1/devices/register/bulk", json={"devices": batch}).raise_for_status()
+    bulk = time.perf_counter() - start
+
+    print(f"database: {engine.dialect.name}, devices per path: {args.count}, bulk batch: {args.batch}")
+    print(f"single register: {single:8.2f}s  {args.count / single:10.0f} devices/s")
+    print(f"bulk register:   {bulk:8.2f}s  {args.count / bulk:10.0f} devices/s  ({single / bulk:.1f}x)")
+    app.dependency_overrides.clear()
+    scratch.cleanup()
+
+
+if __name__ == "__main__":
+    main()
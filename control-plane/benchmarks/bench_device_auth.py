@@ -0,0 +1,109 @@
+"""
+Heartbeat throughput with and without HMAC device authentication.
+
+Runs the app in-process against a scratch database, registers a fleet, and
+sends round-robin heartbeats unsigned (auth off) and signed (auth
+required). Also prints the bare cost of one signature check:
+
+    python benchmarks/bench_device_auth.py --devices 1000 --heartbeats 5000
+    python benchmarks/bench_device_auth.py --database-url postgresql+asyncpg://...
+
+Point ``--database-url`` at a disposable database; tables are created in it.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+import timeit
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from app.api import dependencies  # noqa: E402
+from app.db.session import Base, get_session  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services.device_auth import check_signature, sign_request  # noqa: E402
+
+BODY = json.dumps({"agent_version": "0.1.0", "memory_mb": 128, "cpu_pct": 3.5, "status": "healthy"}).encode()
+
+
+def _signed_headers(device_id: str, token: str) -> dict:
+    timestamp = str(int(time.time()))
+    path = f"/devices/{device_id}/heartbeat"
+    return {
+        "Content-Type": "application/json",
+        "X-Kernex-Device": device_id,
+        "X-Kernex-Timestamp": timestamp,
+        "X-Kernex-Signature": sign_request(token, "POST", path, timestamp, BODY),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=500, help="registered devices")
+    parser.add_argument("--heartbeats", type=int, default=3000, help="heartbeats per path")
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    scratch = tempfile.TemporaryDirectory()
+    url = args.database_url or f"sqlite+aiosqlite:///{scratch.name}/bench.db"
+    engine = create_async_engine(url, future=True)
+    Session = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def override_get_session():
+        async with Session() as session:
+            yield session
+
+    async def prepare_db():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(prepare_db())
+    app.dependency_overrides[get_session] = override_get_session
+    client = TestClient(app)
+    run = uuid.uuid4().hex[:8]
+
+    fleet = []
+    for i in range(args.devices):
+        key = f"-----BEGIN PUBLIC KEY-----\nBENCH-{run}-{i}\n-----END PUBLIC KEY-----"
+        data = client.post("/api/v1/devices/register", json={"public_key": key}).json()
+        fleet.append((data["device_id"], data["registration_token"]))
+
+    results = {}
+    for label, required in (("unsigned", False), ("signed", True)):
+        dependencies.settings.require_device_auth = required
+        start = time.perf_counter()
+        for i in range(args.heartbeats):
+            device_id, token = fleet[i % len(fleet)]
+            headers = _signed_headers(device_id, token) if required else {"Content-Type": "application/json"}
+            client.post(f"/api/v1/devices/{device_id}/heartbeat", content=BODY, headers=headers).raise_for_status()
+        results[label] = time.perf_counter() - start
+
+    device_id, token = fleet[0]
+    headers = _signed_headers(device_id, token)
+    path = f"/devices/{device_id}/heartbeat"
+    checks = 100000
+    per_check = timeit.timeit(
+        lambda: check_signature(
+            token, "POST", path, headers["X-Kernex-Timestamp"], headers["X-Kernex-Signature"], BODY, 300
+        ),
+        number=checks,
+    ) / checks
+
+    print(f"database: {engine.dialect.name}, devices: {args.devices}, heartbeats per path: {args.heartbeats}")
+    for label, elapsed in results.items():
+        print(f"{label + ':':10} {elapsed:8.2f}s  {args.heartbeats / elapsed:10.0f} heartbeats/s")
+    print(f"overhead: {(results['signed'] / results['unsigned'] - 1) * 100:+.1f}%")
+    print(f"signature check: {per_check * 1e6:.2f} us")
+    app.dependency_overrides.clear()
+    scratch.cleanup()
+
+
+if __name__ == "__main__":
+    main()
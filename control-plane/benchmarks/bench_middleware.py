@@ -0,0 +1,87 @@
+"""
+Requests/s through the security middleware stack, on and off.
+
+Serves a small JSON route and a file download from two otherwise identical
+apps, one bare and one wrapped in the rate limiter, security headers, CORS
+and request metrics, and drives both in-process over ASGI:
+
+    python benchmarks/bench_middleware.py --requests 5000 --concurrency 20
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from fastapi.responses import FileResponse  # noqa: E402
+
+from app.observability import MetricsMiddleware  # noqa: E402
+from app.security import InputValidationMiddleware, RateBudget, RateLimitMiddleware, setup_cors  # noqa: E402
+
+
+def _build_app(blob: Path, middleware: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/v1/ping")
+    async def ping() -> dict:
+        return {"status": "ok"}
+
+    @app.get("/api/v1/bundles/{bundle_id}")
+    async def download(bundle_id: str):
+        return FileResponse(blob, media_type="application/octet-stream")
+
+    if middleware:
+        # Budgets high enough that nothing is throttled; the cost measured is the check itself
+        budget = RateBudget(per_minute=1e9, burst=10**9)
+        app.add_middleware(
+            RateLimitMiddleware, budgets={"heartbeat": budget, "download": budget, "admin": budget}
+        )
+        app.add_middleware(InputValidationMiddleware)
+        setup_cors(app)
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def _drive(app: FastAPI, path: str, requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", headers={"User-Agent": "kernex-bench"}
+    ) as client:
+        remaining = iter(range(requests))
+
+        async def worker() -> None:
+            for _ in remaining:
+                (await client.get(path)).raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000, help="requests per route and stack")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--blob-kb", type=int, default=256, help="size of the downloaded file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        blob = Path(scratch) / "bundle.bin"
+        blob.write_bytes(b"\0" * args.blob_kb * 1024)
+        print(f"requests per run: {args.requests}, concurrency: {args.concurrency}")
+        for label, path in (("json", "/api/v1/ping"), ("download", "/api/v1/bundles/b1")):
+            off = asyncio.run(_drive(_build_app(blob, False), path, args.requests, args.concurrency))
+            on = asyncio.run(_drive(_build_app(blob, True), path, args.requests, args.concurrency))
+            print(
+                f"{label + ':':10} off {args.requests / off:8.0f} req/s   on {args.requests / on:8.0f} req/s"
+                f"   ({(off / on - 1) * 100:+.1f}%)"
+            )
+
+
+if __name__ == "__main__":
+    main()
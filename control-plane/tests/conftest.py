@@ -1,5 +1,7 @@
 import inspect
+import os
 import sys
+import tempfile
 from pathlib import Path
 
 import httpx
@@ -8,6 +10,10 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
+# Settings reads BUNDLE_STORAGE_PATH at import; keep uploads out of ./data/bundles
+_bundle_storage = tempfile.TemporaryDirectory(prefix="kernex-test-bundles-")
+os.environ["BUNDLE_STORAGE_PATH"] = _bundle_storage.name
+
 
 def _patch_httpx_client_for_starlette_testclient() -> None:
     """
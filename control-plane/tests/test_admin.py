@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.main import app
+from app.db.session import Base, get_session
+
+
+@pytest.fixture(scope="module")
+def test_client():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", future=True)
+    TestSession = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def override_get_session():
+        async with TestSession() as session:
+            yield session
+
+    async def prepare_db():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.get_event_loop().run_until_complete(prepare_db())
+    app.dependency_overrides[get_session] = override_get_session
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_profile_returns_collapsed_thread_and_task_stacks(test_client):
+    from app.profiling import sampling_profiler
+
+    response = test_client.get("/api/v1/admin/profile", params={"seconds": 0.3, "interval_ms": 10})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) >= 1
+        assert stack.startswith(("thread:", "task:"))
+    # The handler itself is a suspended task awaiting the sampler
+    assert any(line.startswith("task:") and "profile_worker (app/api/v1/admin.py:" in line for line in lines)
+    assert any(line.startswith("thread:MainThread;") for line in lines)
+
+    sampling_profiler._lock.acquire()
+    try:
+        assert test_client.get("/api/v1/admin/profile", params={"seconds": 0.1}).status_code == 409
+    finally:
+        sampling_profiler._lock.release()
+    assert test_client.get("/api/v1/admin/profile", params={"seconds": 600}).status_code == 422
+
+
+def test_tracemalloc_snapshots_report_growth(test_client):
+    import tracemalloc
+
+    assert test_client.get("/api/v1/admin/tracemalloc/snapshot").status_code == 409
+    assert test_client.post("/api/v1/admin/tracemalloc", json={"frames": 5}).status_code == 204
+    try:
+        assert tracemalloc.is_tracing()
+        retained = [bytearray(1024) for _ in range(2000)]
+        response = test_client.get("/api/v1/admin/tracemalloc/snapshot", params={"limit": 10})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["traced_bytes"] >= len(retained) * 1024
+        assert data["peak_bytes"] >= data["traced_bytes"]
+        assert any(
+            "test_admin.py" in stat["location"] and stat["size_diff_bytes"] >= 1024 * 1024
+            for stat in data["growth"]
+        )
+
+        # The next diff is against the snapshot just taken
+        again = test_client.get("/api/v1/admin/tracemalloc/snapshot", params={"limit": 10}).json()
+        assert not any(
+            "test_admin.py" in stat["location"] and stat["size_diff_bytes"] >= 1024 * 1024
+            for stat in again["growth"]
+        )
+        del retained
+    finally:
+        assert test_client.delete("/api/v1/admin/tracemalloc").status_code == 204
+    assert not tracemalloc.is_tracing()
@@ -119,3 +119,273 @@ def test_production_allows_valid_token_for_protected_endpoint(test_client):
     finally:
         api_dependencies.settings.environment = original_env
         api_dependencies.settings.require_admin_auth = original_required
+
+
+def test_admin_token_cached_until_user_deactivated(test_client, monkeypatch):
+    from sqlalchemy import event as sa_event, select
+
+    from app.models.user import User
+
+    monkeypatch.setattr(api_dependencies.settings, "environment", "production")
+    api_dependencies.principal_cache.clear()
+    test_client.post(
+        "/api/v1/auth/register",
+        json={"username": "cached_admin", "email": "cached_admin@example.com", "password": "secret123"},
+    )
+    token = test_client.post(
+        "/api/v1/auth/login", json={"username": "cached_admin", "password": "secret123"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def engine():
+        async for session in app.dependency_overrides[get_session]():
+            return session.bind
+
+    user_queries = []
+
+    def count_user_queries(conn, cursor, statement, *args):
+        if 'FROM "user"' in statement or "FROM user" in statement:
+            user_queries.append(statement)
+
+    sync_engine = asyncio.get_event_loop().run_until_complete(engine()).sync_engine
+    sa_event.listen(sync_engine, "before_cursor_execute", count_user_queries)
+    try:
+        for _ in range(3):
+            assert test_client.get("/api/v1/devices", headers=headers).status_code == 200
+        assert len(user_queries) == 1
+
+        async def deactivate():
+            async for session in app.dependency_overrides[get_session]():
+                user = await session.scalar(select(User).where(User.username == "cached_admin"))
+                user.is_active = False
+                await session.commit()
+
+        asyncio.get_event_loop().run_until_complete(deactivate())
+        assert test_client.get("/api/v1/devices", headers=headers).status_code == 403
+    finally:
+        sa_event.remove(sync_engine, "before_cursor_execute", count_user_queries)
+
+
+def test_principal_cache_expires_and_evicts():
+    from app.auth import PrincipalCache, User as Principal
+
+    cache = PrincipalCache(ttl_seconds=10, max_entries=2)
+    alice = Principal(id=1, username="alice", email="a@example.com", is_active=True)
+    bob = Principal(id=2, username="bob", email="b@example.com", is_active=True)
+    cache.put("t1", alice, now=0)
+    cache.put("t2", bob, now=0)
+    assert cache.get("t1", now=5) is alice
+    cache.put("t3", bob, now=5)
+    assert cache.get("t2", now=5) is None  # least recently used
+    assert cache.get("t1", now=10) is None  # expired
+    assert cache.invalidate_user("bob") == 1 and len(cache) == 0
+    cache.put("t4", alice, exp=0)  # token already expired
+    assert len(cache) == 0
+
+
+def test_password_hasher_refuses_work_beyond_queue(monkeypatch):
+    import threading
+
+    from app import auth
+
+    release = threading.Event()
+    monkeypatch.setattr(auth, "hash_password", lambda password: release.wait(5) and f"hashed:{password}")
+    hasher = auth.PasswordHasher(workers=1, max_pending=1)
+
+    async def scenario():
+        first = asyncio.ensure_future(hasher.hash("one"))
+        await asyncio.sleep(0)
+        with pytest.raises(auth.PasswordHasherBusy):
+            await hasher.hash("two")
+        release.set()
+        return await first, hasher.pending
+
+    assert asyncio.get_event_loop().run_until_complete(scenario()) == ("hashed:one", 0)
+
+
+def test_login_returns_503_when_hasher_saturated(test_client, monkeypatch):
+    from app.api.v1 import auth as auth_api
+    from app.auth import PasswordHasher
+
+    monkeypatch.setattr(auth_api, "password_hasher", PasswordHasher(workers=1, max_pending=0))
+    response = test_client.post(
+        "/api/v1/auth/register",
+        json={"username": "busy_user", "email": "busy_user@example.com", "password": "secret123"},
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_logs_cursor_pages_newest_first(test_client):
+    register = test_client.post(
+        "/api/v1/devices/register",
+        json={"public_key": "-----BEGIN RSA PUBLIC KEY-----\nLOGPAGES\n-----END RSA PUBLIC KEY-----"},
+    )
+    device_id = register.json()["device_id"]
+    for status in ("healthy", "degraded", "error", "healthy"):
+        test_client.post(f"/api/v1/devices/{device_id}/heartbeat", json={"status": status})
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2, "device_id": device_id}
+        if cursor:
+            params["cursor"] = cursor
+        page = test_client.get("/api/v1/logs", params=params).json()
+        seen.extend(page["logs"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert [e["message"].rsplit(" ", 1)[-1] for e in seen] == ["healthy", "error", "degraded", "healthy"]
+    assert [e["level"] for e in seen] == ["INFO", "ERROR", "WARNING", "INFO"]
+    assert len({e["id"] for e in seen}) == 4
+
+    errors = test_client.get("/api/v1/logs", params={"level": "ERROR", "device_id": device_id}).json()
+    assert [e["level"] for e in errors["logs"]] == ["ERROR"]
+    assert test_client.get("/api/v1/logs", params={"cursor": "garbage"}).status_code == 400
+
+
+def test_log_stream_catches_up_then_follows_commits():
+    from app.api.v1.logs import tail_events
+    from app.services.event_service import record_event
+
+    class FakeRequest:
+        async def is_disconnected(self):
+            return False
+
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:", future=True)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+        async with factory() as writer, factory() as reader:
+            first = await record_event(writer, "heartbeat", "before subscribe")
+            await writer.commit()
+            first_id = first.id
+
+            stream = tail_events(FakeRequest(), reader, after_id=0, keepalive_seconds=5)
+            frames = [await stream.__anext__()]
+
+            await record_event(writer, "heartbeat", "rolled back")
+            await writer.rollback()
+            await record_event(writer, "deployment", "live", level="WARNING")
+            await writer.commit()
+            frames.append(await asyncio.wait_for(stream.__anext__(), timeout=2))
+            await stream.aclose()
+        await engine.dispose()
+        return first_id, frames
+
+    first_id, frames = asyncio.get_event_loop().run_until_complete(scenario())
+    assert frames[0].startswith(f"id: {first_id}\n") and "before subscribe" in frames[0]
+    assert "event: log" in frames[1] and '"live"' in frames[1] and "rolled back" not in frames[1]
+
+
+def test_log_stream_picks_up_events_committed_out_of_id_order():
+    from app.api.v1.logs import tail_events
+    from app.models.event import Event
+
+    class FakeRequest:
+        async def is_disconnected(self):
+            return False
+
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:", future=True)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+        async with factory() as writer, factory() as reader:
+            writer.add_all([Event(id=1, kind="heartbeat", message="one"), Event(id=4, kind="heartbeat", message="four")])
+            await writer.commit()
+
+            stream = tail_events(FakeRequest(), reader, after_id=0, keepalive_seconds=0.05)
+            frames = [await stream.__anext__(), await stream.__anext__()]
+            # Took its id before 4 but committed after it was sent
+            writer.add(Event(id=3, kind="heartbeat", message="three"))
+            await writer.commit()
+            for _ in range(4):
+                frames.append(await asyncio.wait_for(stream.__anext__(), timeout=2))
+            await stream.aclose()
+        await engine.dispose()
+        return frames
+
+    frames = asyncio.get_event_loop().run_until_complete(scenario())
+    sent = [frame.split("\n", 1)[0] for frame in frames if frame.startswith("id:")]
+    assert sent == ["id: 1", "id: 4", "id: 3"]
+
+
+def test_device_log_search_filters_and_pages(test_client):
+    import json
+
+    device_ids = []
+    for name in ("SEARCHA", "SEARCHB"):
+        register = test_client.post(
+            "/api/v1/devices/register",
+            json={"public_key": f"-----BEGIN RSA PUBLIC KEY-----\n{name}\n-----END RSA PUBLIC KEY-----"},
+        )
+        device_ids.append(register.json()["device_id"])
+    a, b = device_ids
+    lines = [
+        {"timestamp": "2026-10-19T10:00:00Z", "level": "INFO", "message": "model loaded in 2s"},
+        {"timestamp": "2026-10-19T10:01:00Z", "level": "WARNING", "message": "camera frame dropped"},
+        {"timestamp": "2026-10-19T10:02:00Z", "level": "ERROR", "message": "camera disconnected: usb reset"},
+        {"timestamp": "2026-10-19T10:03:00Z", "level": "INFO", "message": "camera reconnected"},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines).encode()
+    assert test_client.post(f"/api/v1/devices/{a}/logs", content=body).json() == {"accepted": 4}
+    test_client.post(f"/api/v1/devices/{b}/logs", content=b'{"level": "ERROR", "message": "camera missing"}')
+
+    def search(**params):
+        response = test_client.get("/api/v1/logs/devices", params=params)
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    newest_first = search(device_id=a)["logs"]
+    assert [row["message"] for row in newest_first][0] == "camera reconnected"
+    assert len(newest_first) == 4
+
+    assert [r["level"] for r in search(device_id=a, level="warning")["logs"]] == ["ERROR", "WARNING"]
+    assert [r["message"] for r in search(device_id=a, q="camera usb")["logs"]] == ["camera disconnected: usb reset"]
+    # FTS operators in user input are treated as plain words
+    assert search(device_id=a, q='camera OR "reset')["logs"] == []
+    window = search(device_id=a, since="2026-10-19T10:01:00Z", until="2026-10-19T10:03:00Z")["logs"]
+    assert [r["level"] for r in window] == ["ERROR", "WARNING"]
+    assert {r["device_id"] for r in search(q="camera", level="ERROR")["logs"]} >= {a, b}
+
+    page = search(device_id=a, limit=3)
+    rest = search(device_id=a, limit=3, cursor=page["next_cursor"])
+    assert [r["id"] for r in page["logs"] + rest["logs"]] == [r["id"] for r in newest_first]
+    assert rest["next_cursor"] is None
+
+    assert test_client.get("/api/v1/logs/devices", params={"level": "LOUD"}).status_code == 400
+
+
+def test_prune_device_logs_deletes_old_lines_in_batches():
+    from datetime import datetime, timedelta
+
+    from sqlalchemy import func, select, text
+
+    from app.models.device_log import DeviceLog
+    from app.services.log_service import prune_device_logs, store_device_logs
+
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:", future=True)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+        now = datetime.utcnow()
+        async with factory() as session:
+            rows = [
+                {"device_id": "d", "timestamp": now - timedelta(days=days), "level": "INFO", "message": f"old {days}"}
+                for days in range(1, 26)
+            ]
+            await store_device_logs(session, rows)
+            await session.commit()
+            pruned = await prune_device_logs(session, now - timedelta(days=10), batch_size=4)
+            remaining = await session.scalar(select(func.count()).select_from(DeviceLog))
+            indexed = await session.scalar(text("SELECT count(*) FROM device_logs_fts WHERE device_logs_fts MATCH 'old'"))
+        await engine.dispose()
+        return pruned, remaining, indexed
+
+    pruned, remaining, indexed = asyncio.get_event_loop().run_until_complete(scenario())
+    assert (pruned, remaining, indexed) == (15, 10, 10)
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.main import app
+from app.db.session import Base, get_session
+from app import config as cfg
+
+
+@pytest.fixture(scope="module")
+def test_client():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", future=True)
+    TestSession = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def override_get_session():
+        async with TestSession() as session:
+            yield session
+
+    async def prepare_db():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.get_event_loop().run_until_complete(prepare_db())
+    app.dependency_overrides[get_session] = override_get_session
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_gc_keeps_live_and_pinned_bundles(test_client, monkeypatch, tmp_path):
+    settings = cfg.get_settings()
+    monkeypatch.setattr(settings, "bundle_storage_path", str(tmp_path))
+    monkeypatch.setattr(settings, "bundle_gc_batch_pause_seconds", 0.0)
+
+    def upload(version):
+        resp = test_client.post(
+            "/api/v1/bundles",
+            files={"file": ("gc.tar.gz", version.encode())},
+            data={"manifest": f'{{"version": "{version}"}}'},
+        )
+        assert resp.status_code == 201, resp.text
+        return resp.json()["bundle_id"]
+
+    live, pinned, dead = upload("gc-live"), upload("gc-pinned"), upload("gc-dead")
+    device_id = test_client.post(
+        "/api/v1/devices/register",
+        json={"public_key": "-----BEGIN PUBLIC KEY-----\nGC\n-----END PUBLIC KEY-----"},
+    ).json()["device_id"]
+    deployment_id = test_client.post(
+        "/api/v1/deployments",
+        json={"bundle_version": "gc-live", "target_devices": [device_id]},
+    ).json()["deployment_id"]
+    test_client.post(
+        f"/api/v1/deployments/{deployment_id}/result",
+        params={"device_id": device_id, "status_str": "success"},
+    )
+    assert test_client.post(f"/api/v1/bundles/{pinned}/pin").json()["pinned"] is True
+
+    orphan = tmp_path / "stray.tar.gz"
+    orphan.write_bytes(b"stray")
+    old = time.time() - 7200
+    os.utime(orphan, (old, old))
+
+    report = test_client.post("/api/v1/bundles/gc").json()
+    assert report["dry_run"] is True
+    assert [c["id"] for c in report["candidates"]] == [dead]
+    assert report["orphan_files"] == [str(orphan.resolve())]
+    assert report["reclaimable_bytes"] == len(b"gc-dead") + len(b"stray")
+    assert orphan.exists()
+    assert test_client.get(f"/api/v1/bundles/{dead}").status_code == 200
+
+    started = test_client.post("/api/v1/bundles/gc", params={"dry_run": False})
+    assert started.status_code == 202
+    # Background tasks finish before the test client returns
+    job = test_client.get(f"/api/v1/bundles/gc/jobs/{started.json()['id']}").json()
+    assert job["status"] == "succeeded"
+    report = job["report"]
+    assert report["deleted_bundles"] == 1
+    assert report["deleted_orphans"] == 1
+    assert report["reclaimed_bytes"] == len(b"gc-dead") + len(b"stray")
+    assert not orphan.exists()
+    assert test_client.get(f"/api/v1/bundles/{dead}").status_code == 410
+    assert test_client.get(f"/api/v1/bundles/{live}").status_code == 200
+    assert test_client.get(f"/api/v1/bundles/{pinned}").status_code == 200
+
+    # Purged bundles are not reported again, nor deployable
+    assert test_client.post("/api/v1/bundles/gc").json()["candidates"] == []
+    assert test_client.post(
+        "/api/v1/deployments", json={"bundle_version": "gc-dead", "target_devices": [device_id]}
+    ).status_code == 410
+
+
+def test_gc_rechecks_liveness_before_each_batch(tmp_path):
+    from app.models.bundle import Bundle
+    from app.models.deployment import Deployment
+    from app.workers import cleanup_worker
+
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", future=True)
+    Session = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        paths = {}
+        async with Session() as session:
+            for version in ("race-a", "race-b"):
+                path = tmp_path / f"{version}.tar.gz"
+                path.write_bytes(version.encode())
+                bundle = Bundle(version=version, storage_path=str(path), checksum_sha256="0" * 64, size_bytes=6)
+                session.add(bundle)
+                await session.flush()
+                paths[bundle.id] = path
+            await session.commit()
+
+            async def deploy_during_pause(_seconds):
+                # A deployment for the second candidate lands between batches
+                session.add(Deployment(bundle_id=later, target_device_ids=[], status="pending"))
+                await session.commit()
+
+            first, later = list(paths)
+            cleanup_worker.asyncio.sleep, real_sleep = deploy_during_pause, cleanup_worker.asyncio.sleep
+            try:
+                report = await cleanup_worker.collect_bundle_garbage(
+                    session, dry_run=False, batch_size=1, batch_pause_seconds=1.0, orphan_grace_seconds=3600
+                )
+            finally:
+                cleanup_worker.asyncio.sleep = real_sleep
+        return report, paths[first], paths[later]
+
+    report, purged, kept = asyncio.get_event_loop().run_until_complete(scenario())
+    assert len(report.candidates) == 2
+    assert (report.deleted_bundles, report.kept_live) == (1, 1)
+    assert not purged.exists()
+    assert kept.exists()
@@ -59,3 +59,33 @@ def test_upload_and_list_bundle(test_client, monkeypatch):
         list_resp = test_client.get("/api/v1/bundles")
         assert list_resp.status_code == 200
         assert len(list_resp.json()["bundles"]) == 1
+
+
+def test_upload_rejects_malformed_file_entries(test_client):
+    manifest = {"version": "v0.2-files", "files": [{"path": "../model.bin", "sha256": "0" * 64, "size": 1}]}
+    resp = test_client.post(
+        "/api/v1/bundles",
+        files={
+            "file": ("bundle.tar.gz", b"dummydata", "application/gzip"),
+            "manifest": (None, json.dumps(manifest)),
+        },
+    )
+    assert resp.status_code == 400
+    assert "invalid path" in resp.json()["detail"]
+
+
+def test_bundle_list_counts_exactly_unless_purged_are_included(test_client, monkeypatch):
+    from app.api.v1 import bundles as bundle_routes
+
+    calls = []
+
+    async def recording_count_rows(session, query, table_name, filtered):
+        calls.append(filtered)
+        return 0, False
+
+    monkeypatch.setattr(bundle_routes, "count_rows", recording_count_rows)
+    assert test_client.get("/api/v1/bundles").status_code == 200
+    assert test_client.get("/api/v1/bundles", params={"include_purged": "true"}).status_code == 200
+    assert test_client.get("/api/v1/bundles", params={"include_purged": "true", "version": "v0.1"}).status_code == 200
+    # The default listing hides purged rows, so the pg_class estimate would overcount it
+    assert calls == [True, False, True]
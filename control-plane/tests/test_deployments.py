@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.main import app
+from app.db.session import Base, get_session
+
+
+@pytest.fixture(scope="module")
+def test_client():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", future=True)
+    TestSession = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def override_get_session():
+        async with TestSession() as session:
+            yield session
+
+    async def prepare_db():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.get_event_loop().run_until_complete(prepare_db())
+    app.dependency_overrides[get_session] = override_get_session
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def _register(test_client, name, tags):
+    resp = test_client.post(
+        "/api/v1/devices/register",
+        json={"public_key": f"-----BEGIN PUBLIC KEY-----\n{name}\n-----END PUBLIC KEY-----", "tags": tags},
+    )
+    assert resp.status_code == 201, resp.text
+    return resp.json()["device_id"]
+
+
+def test_selector_deployment_targets_every_matching_device(test_client):
+    berlin_jetson = _register(test_client, "SEL_A", {"site": "berlin", "hw": "jetson"})
+    berlin_pi = _register(test_client, "SEL_B", {"site": "berlin", "hw": "rpi"})
+    paris_jetson = _register(test_client, "SEL_C", {"site": "paris", "hw": "jetson"})
+    retagged = _register(test_client, "SEL_D", {})
+    resp = test_client.put(f"/api/v1/devices/{retagged}/tags", json={"tags": {"site": "berlin", "hw": "jetson"}})
+    assert resp.json()["tags"] == {"site": "berlin", "hw": "jetson"}
+
+    test_client.post(
+        "/api/v1/bundles",
+        files={"file": ("sel.tar.gz", b"selector")},
+        data={"manifest": '{"version": "sel-v1"}'},
+    )
+    created = test_client.post(
+        "/api/v1/deployments",
+        json={"bundle_version": "sel-v1", "selector": "site=berlin, hw=jetson"},
+    )
+    assert created.status_code == 201, created.text
+    assert created.json()["target_count"] == 2
+    deployment_id = created.json()["deployment_id"]
+
+    detail = test_client.get(f"/api/v1/deployments/{deployment_id}").json()
+    assert detail["selector"] == "site=berlin, hw=jetson"
+    assert detail["target_devices"] == sorted([berlin_jetson, retagged])
+
+    def commands(device_id):
+        return test_client.post(f"/api/v1/devices/{device_id}/heartbeat", json={"status": "healthy"}).json()["commands"]
+
+    # Every matching device gets the command, even after the first one picked it up
+    assert [c["deployment_id"] for c in commands(berlin_jetson)] == [deployment_id]
+    assert [c["deployment_id"] for c in commands(retagged)] == [deployment_id]
+    assert commands(berlin_jetson) == []
+    assert commands(berlin_pi) == [] and commands(paris_jetson) == []
+
+    forbidden = test_client.post(
+        f"/api/v1/deployments/{deployment_id}/result",
+        params={"device_id": berlin_pi, "status_str": "success"},
+    )
+    assert forbidden.status_code == 403
+
+    for device_id in (berlin_jetson, retagged):
+        test_client.post(
+            f"/api/v1/deployments/{deployment_id}/result",
+            params={"device_id": device_id, "status_str": "success"},
+        )
+        status = test_client.get(f"/api/v1/deployments/{deployment_id}").json()["status"]
+        assert status == ("success" if device_id == retagged else "in_progress")
+
+
+def test_repeated_results_count_once(test_client):
+    first = _register(test_client, "REPEAT_A", {"site": "lyon"})
+    second = _register(test_client, "REPEAT_B", {"site": "lyon"})
+    test_client.post(
+        "/api/v1/bundles",
+        files={"file": ("repeat.tar.gz", b"repeat")},
+        data={"manifest": '{"version": "repeat-v1"}'},
+    )
+    deployment_id = test_client.post(
+        "/api/v1/deployments", json={"bundle_version": "repeat-v1", "selector": "site=lyon"}
+    ).json()["deployment_id"]
+
+    def report(device_id, outcome):
+        test_client.post(
+            f"/api/v1/deployments/{deployment_id}/result",
+            params={"device_id": device_id, "status_str": outcome},
+        )
+        return test_client.get(f"/api/v1/deployments/{deployment_id}").json()["status"]
+
+    # A retried report is not a second target
+    assert report(first, "failed") == "pending"
+    assert report(first, "failed") == "pending"
+    assert report(second, "success") == "failed"
+
+
+def test_selector_validation(test_client):
+    test_client.post(
+        "/api/v1/bundles",
+        files={"file": ("sel2.tar.gz", b"selector2")},
+        data={"manifest": '{"version": "sel-v2"}'},
+    )
+    for selector in ("site", "site=berlin,site=paris", "site=nowhere"):
+        resp = test_client.post("/api/v1/deployments", json={"bundle_version": "sel-v2", "selector": selector})
+        assert resp.status_code == 400, selector
+    both = test_client.post(
+        "/api/v1/deployments",
+        json={"bundle_version": "sel-v2", "selector": "site=berlin", "target_devices": ["x"]},
+    )
+    assert both.status_code == 400
@@ -56,9 +56,10 @@ def test_device_register_duplicate_public_key_conflict(test_client):
     }
     first = test_client.post("/api/v1/devices/register", json=payload)
     assert first.status_code == 201
+    # Without proof of the private key, the existing credentials stay secret
     second = test_client.post("/api/v1/devices/register", json=payload)
-    assert second.status_code == 201
-    assert second.json()["device_id"] == first.json()["device_id"]
+    assert second.status_code == 409
+    assert "registration_token" not in second.text
 
 
 def test_device_heartbeat(test_client):
@@ -176,3 +177,433 @@ def test_heartbeat_with_pending_deployment(test_client):
     assert commands[0]["type"] == "deploy"
     assert commands[0]["deployment_id"] == deployment_id
     assert commands[0]["bundle_version"] == "v1.0.0"
+
+
+def test_deploy_command_includes_same_site_peer_hints(test_client):
+    def register(tag):
+        resp = test_client.post(
+            "/api/v1/devices/register",
+            json={"public_key": f"-----BEGIN PUBLIC KEY-----\nPEER_{tag}\n-----END PUBLIC KEY-----"},
+        )
+        return resp.json()["device_id"]
+
+    def heartbeat(device_id, peer_url):
+        resp = test_client.post(
+            f"/api/v1/devices/{device_id}/heartbeat",
+            json={"agent_version": "0.1.0", "status": "healthy", "peer_url": peer_url},
+        )
+        assert resp.status_code == 200
+        return resp.json()["commands"]
+
+    def deploy(device_id):
+        resp = test_client.post(
+            "/api/v1/deployments",
+            json={"bundle_version": "peer-v1", "target_devices": [device_id]},
+        )
+        return resp.json()["deployment_id"]
+
+    seeder, neighbour, remote = register("A"), register("B"), register("C")
+    bundle = test_client.post(
+        "/api/v1/bundles",
+        files={"file": ("peer.tar.gz", b"peer-bundle")},
+        data={"manifest": '{"version": "peer-v1"}'},
+    ).json()
+
+    seed_deployment = deploy(seeder)
+    commands = heartbeat(seeder, "http://192.168.7.10:8765")
+    assert commands[0]["peers"] == []
+    assert commands[0]["checksum_sha256"] == bundle["checksum_sha256"]
+    test_client.post(
+        f"/api/v1/deployments/{seed_deployment}/result",
+        params={"device_id": seeder, "status_str": "success"},
+    )
+    heartbeat(seeder, "http://192.168.7.10:8765")
+
+    deploy(neighbour)
+    assert heartbeat(neighbour, "http://192.168.7.11:8765")[0]["peers"] == ["http://192.168.7.10:8765"]
+
+    deploy(remote)
+    assert heartbeat(remote, "http://10.20.30.40:8765")[0]["peers"] == []
+
+
+def test_heartbeat_batch_reports_per_device_results(test_client):
+    reg = test_client.post(
+        "/api/v1/devices/register",
+        json={"public_key": "-----BEGIN PUBLIC KEY-----\nBATCH\n-----END PUBLIC KEY-----"},
+    )
+    device_id = reg.json()["device_id"]
+
+    resp = test_client.post(
+        "/api/v1/devices/heartbeat/batch",
+        json={
+            "heartbeats": [
+                {"device_id": device_id, "body": '{"agent_version": "0.1.0", "status": "degraded"}'},
+                {"device_id": "missing-device", "body": "{}"},
+                {"device_id": device_id, "body": '{"cpu_pct": "not-a-number"}'},
+            ]
+        },
+    )
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    assert [r["status_code"] for r in results] == [200, 404, 422]
+    assert results[0]["commands"] == []
+
+    detail = test_client.get(f"/api/v1/devices/{device_id}").json()
+    assert detail["status"] == "degraded"
+
+
+def test_heartbeat_records_bundle_store_inventory(test_client):
+    reg = test_client.post(
+        "/api/v1/devices/register",
+        json={"public_key": "-----BEGIN PUBLIC KEY-----\nSTORE\n-----END PUBLIC KEY-----"},
+    )
+    device_id = reg.json()["device_id"]
+    inventory = {"active_version": "1.0", "versions": ["1.0"], "used_bytes": 1024, "free_bytes": 2048}
+
+    test_client.post(
+        f"/api/v1/devices/{device_id}/heartbeat",
+        json={"status": "healthy", "bundle_store": inventory},
+    )
+    assert test_client.get(f"/api/v1/devices/{device_id}").json()["bundle_store"] == inventory
+
+    test_client.post(
+        "/api/v1/bundles",
+        files={"file": ("sized.tar.gz", b"x" * 321)},
+        data={"manifest": '{"version": "sized-v1"}'},
+    )
+    test_client.post(
+        "/api/v1/deployments",
+        json={"bundle_version": "sized-v1", "target_devices": [device_id]},
+    )
+    commands = test_client.post(f"/api/v1/devices/{device_id}/heartbeat", json={"status": "healthy"}).json()["commands"]
+    assert commands[0]["size_bytes"] == 321
+
+
+def test_list_devices_keyset_pagination_filters_and_fields(test_client):
+    for i in range(5):
+        test_client.post(
+            "/api/v1/devices/register",
+            json={
+                "public_key": f"-----BEGIN PUBLIC KEY-----\nPAGE_{i}\n-----END PUBLIC KEY-----",
+                "device_type": "pager",
+            },
+        )
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"device_type": "pager", "limit": 2, "fields": "status"}
+        if cursor:
+            params["cursor"] = cursor
+        page = test_client.get("/api/v1/devices", params=params).json()
+        assert page["total"] == 5
+        assert page["total_is_estimate"] is False
+        for device in page["devices"]:
+            assert set(device) == {"device_id", "status"}
+        seen.extend(d["device_id"] for d in page["devices"])
+        cursor = page.get("next_cursor")
+        if not cursor:
+            break
+    assert len(seen) == 5
+    assert seen == sorted(seen)
+
+    assert test_client.get("/api/v1/devices", params={"fields": "public_key"}).status_code == 400
+    assert test_client.get("/api/v1/devices", params={"cursor": "not-a-cursor!"}).status_code == 400
+    stale = test_client.get(
+        "/api/v1/devices", params={"device_type": "pager", "heartbeat_older_than_seconds": 3600}
+    ).json()
+    assert stale["devices"] == [] and stale["total"] == 0
+
+
+def test_bulk_register_dedupes_and_returns_credentials_in_order(test_client):
+    existing = test_client.post(
+        "/api/v1/devices/register",
+        json={"public_key": "-----BEGIN PUBLIC KEY-----\nBULK_0\n-----END PUBLIC KEY-----"},
+    ).json()
+    keys = [f"-----BEGIN PUBLIC KEY-----\nBULK_{i}\n-----END PUBLIC KEY-----" for i in range(4)]
+    payload = {
+        "devices": [
+            {"public_key": keys[0]},
+            {"public_key": keys[1], "device_type": "jetson", "tags": {"site": "factory"}},
+            {"public_key": keys[2], "hardware_metadata": {"ram_gb": 8}},
+            {"public_key": keys[1]},
+            {"public_key": keys[3]},
+        ]
+    }
+    resp = test_client.post("/api/v1/devices/register/bulk", json=payload)
+    assert resp.status_code == 201, resp.text
+    data = resp.json()
+    assert (data["created"], data["existing"]) == (3, 2)
+    results = data["devices"]
+    assert results[0] == {**existing, "created": False}
+    assert results[3]["device_id"] == results[1]["device_id"] and not results[3]["created"]
+    assert len({r["device_id"] for r in results}) == 4
+
+    detail = test_client.get(f"/api/v1/devices/{results[1]['device_id']}").json()
+    assert detail["device_type"] == "jetson"
+    assert detail["tags"] == {"site": "factory"}
+
+    again = test_client.post("/api/v1/devices/register/bulk", json=payload).json()
+    assert again["created"] == 0
+    assert [r["device_id"] for r in again["devices"]] == [r["device_id"] for r in results]
+
+
+def test_register_matches_public_key_by_fingerprint(test_client):
+    pem = "-----BEGIN PUBLIC KEY-----\nFINGERPRINT\n-----END PUBLIC KEY-----"
+    first = test_client.post("/api/v1/devices/register", json={"public_key": pem}).json()
+    # Same key with CRLF line endings and a trailing newline
+    variant = pem.replace("\n", "\r\n") + "\r\n"
+    assert test_client.post("/api/v1/devices/register", json={"public_key": variant}).status_code == 409
+    bulk = test_client.post("/api/v1/devices/register/bulk", json={"devices": [{"public_key": variant}]}).json()
+    assert bulk["devices"][0]["device_id"] == first["device_id"]
+
+
+def test_register_validates_typed_keys_and_verifies_signatures(test_client):
+    import base64
+    import time
+
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+
+    from app.services.device_keys import load_public_key, registration_proof_message, verify_signature
+
+    private = ed25519.Ed25519PrivateKey.generate()
+    pem = private.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+
+    assert test_client.post(
+        "/api/v1/devices/register", json={"public_key": pem, "key_type": "rsa"}
+    ).status_code == 400
+    assert test_client.post(
+        "/api/v1/devices/register", json={"public_key": "not a key", "key_type": "ed25519"}
+    ).status_code == 400
+    registered = test_client.post("/api/v1/devices/register", json={"public_key": pem, "key_type": "ed25519"})
+    assert registered.status_code == 201
+
+    assert verify_signature(pem, private.sign(b"body"), b"body")
+    assert not verify_signature(pem, private.sign(b"body"), b"tampered")
+    assert load_public_key(pem) is load_public_key(pem.replace("\n", "\r\n"))
+
+    def proof(key, timestamp):
+        message = registration_proof_message(pem, str(timestamp))
+        return {"proof_timestamp": str(timestamp), "proof_signature": base64.b64encode(key.sign(message)).decode()}
+
+    now = int(time.time())
+    other = ed25519.Ed25519PrivateKey.generate()
+    assert test_client.post("/api/v1/devices/register", json={"public_key": pem}).status_code == 409
+    recovered = test_client.post("/api/v1/devices/register", json={"public_key": pem, **proof(private, now)})
+    assert recovered.status_code == 201
+    assert recovered.json() == registered.json()
+    assert test_client.post(
+        "/api/v1/devices/register", json={"public_key": pem, **proof(other, now)}
+    ).status_code == 401
+    assert test_client.post(
+        "/api/v1/devices/register", json={"public_key": pem, **proof(private, now - 3600)}
+    ).status_code == 401
+
+
+def test_device_logs_accepts_gzip_ndjson_and_enforces_limits(test_client, monkeypatch):
+    import gzip
+    import json
+
+    from app import config as cfg
+
+    device_id = test_client.post(
+        "/api/v1/devices/register",
+        json={"public_key": "-----BEGIN RSA PUBLIC KEY-----\nLOGSHIP\n-----END RSA PUBLIC KEY-----"},
+    ).json()["device_id"]
+    lines = [
+        {"timestamp": "2026-10-19T10:00:00+00:00", "level": "warning", "logger": "kernex.main", "message": "hello"},
+        {"level": "INFO", "message": "deploy ok", "source": "script", "deployment_id": "dep-1"},
+    ]
+    body = gzip.compress("\n".join(json.dumps(line) for line in lines).encode())
+    headers = {"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"}
+
+    response = test_client.post(f"/api/v1/devices/{device_id}/logs", content=body, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {"accepted": 2}
+
+    plain = test_client.post(f"/api/v1/devices/{device_id}/logs", content=b'{"message": "x"}\n')
+    assert plain.json() == {"accepted": 1}
+
+    assert test_client.post(f"/api/v1/devices/{device_id}/logs", content=b"not json").status_code == 400
+    assert test_client.post("/api/v1/devices/nope/logs", content=body, headers=headers).status_code == 404
+
+    monkeypatch.setattr(cfg.get_settings(), "device_log_max_batch_lines", 1)
+    assert test_client.post(f"/api/v1/devices/{device_id}/logs", content=body, headers=headers).status_code == 413
+    monkeypatch.setattr(cfg.get_settings(), "device_log_max_batch_lines", 5000)
+    monkeypatch.setattr(cfg.get_settings(), "device_log_max_batch_bytes", 1024)
+    bomb = gzip.compress(b'{"message": "' + b"a" * 100_000 + b'"}')
+    assert test_client.post(f"/api/v1/devices/{device_id}/logs", content=bomb, headers=headers).status_code == 413
+
+    # Chunked uploads carry no Content-Length; the cap applies while reading
+    def chunks():
+        for _ in range(100):
+            yield b'{"message": "' + b"a" * 500 + b'"}\n'
+
+    assert test_client.post(f"/api/v1/devices/{device_id}/logs", content=chunks()).status_code == 413
+
+
+def _signed(device_id: str, token: str, method: str, path: str, body: bytes = b"", timestamp=None) -> dict:
+    import time
+
+    from app.services.device_auth import sign_request
+
+    timestamp = str(int(time.time()) if timestamp is None else timestamp)
+    return {
+        "X-Kernex-Device": device_id,
+        "X-Kernex-Timestamp": timestamp,
+        "X-Kernex-Signature": sign_request(token, method, path, timestamp, body),
+    }
+
+
+def test_device_endpoints_require_hmac_signature(test_client, monkeypatch):
+    import json
+
+    from app.api import dependencies as api_dependencies
+
+    def register(name):
+        data = test_client.post(
+            "/api/v1/devices/register",
+            json={"public_key": f"-----BEGIN PUBLIC KEY-----\n{name}\n-----END PUBLIC KEY-----"},
+        ).json()
+        return data["device_id"], data["registration_token"]
+
+    device_id, token = register("HMAC-A")
+    other_id, other_token = register("HMAC-B")
+    monkeypatch.setattr(api_dependencies.settings, "require_device_auth", True)
+    path = f"/devices/{device_id}/heartbeat"
+    body = json.dumps({"agent_version": "0.1.0", "status": "healthy"}).encode()
+
+    def heartbeat(headers):
+        headers = {"Content-Type": "application/json", **headers}
+        return test_client.post(f"/api/v1{path}", content=body, headers=headers)
+
+    assert heartbeat({}).status_code == 401
+    assert heartbeat(_signed(device_id, token, "POST", path, body)).status_code == 200
+    assert heartbeat(_signed(device_id, token, "POST", path, b"{}")).status_code == 401
+    assert heartbeat(_signed(device_id, token, "POST", path, body, timestamp=1)).status_code == 401
+    assert heartbeat(_signed(device_id, other_token, "POST", path, body)).status_code == 401
+    assert heartbeat(_signed(other_id, other_token, "POST", path, body)).status_code == 403
+
+    logs_path = f"/devices/{device_id}/logs"
+    logs = test_client.post(
+        f"/api/v1{logs_path}",
+        content=b'{"message": "signed"}\n',
+        headers=_signed(device_id, token, "POST", logs_path, b'{"message": "signed"}\n'),
+    )
+    assert logs.json() == {"accepted": 1}
+
+    result_path = f"/deployments/missing/result?device_id={device_id}&status_str=failed&error_message=a+b%3A+c"
+    result = test_client.post(f"/api/v1{result_path}", headers=_signed(device_id, token, "POST", result_path))
+    assert result.status_code == 404  # signature accepted, deployment unknown
+    assert test_client.post(f"/api/v1{result_path}").status_code == 401
+    assert test_client.get("/api/v1/bundles/missing").status_code == 401
+
+    signed = _signed(device_id, token, "POST", path, body)
+    batch = test_client.post(
+        "/api/v1/devices/heartbeat/batch",
+        json={
+            "heartbeats": [
+                {
+                    "device_id": device_id,
+                    "body": body.decode(),
+                    "timestamp": signed["X-Kernex-Timestamp"],
+                    "signature": signed["X-Kernex-Signature"],
+                },
+                {"device_id": other_id, "body": body.decode()},
+            ]
+        },
+    )
+    assert [r["status_code"] for r in batch.json()["results"]] == [200, 401]
+
+
+def test_request_metrics_use_route_templates(test_client):
+    from prometheus_client import REGISTRY
+
+    template = "/api/v1/devices/{device_id}/heartbeat"
+    labels = {"method": "POST", "endpoint": template, "status_code": "200"}
+
+    def sample(name, extra=None):
+        return REGISTRY.get_sample_value(name, extra if extra is not None else labels) or 0.0
+
+    before = sample("http_requests_total")
+    sized_before = sample("http_request_size_bytes_sum", {"method": "POST", "endpoint": template})
+    commands_before = sample("heartbeat_commands_returned_count", {})
+    device_id = test_client.post(
+        "/api/v1/devices/register",
+        json={"public_key": "-----BEGIN PUBLIC KEY-----\nMETRICS\n-----END PUBLIC KEY-----"},
+    ).json()["device_id"]
+    body = b'{"status": "healthy"}'
+    response = test_client.post(
+        f"/api/v1/devices/{device_id}/heartbeat", content=body, headers={"Content-Type": "application/json"}
+    )
+    assert response.status_code == 200
+
+    assert sample("http_requests_total") == before + 1
+    assert sample("http_request_size_bytes_sum", {"method": "POST", "endpoint": template}) == sized_before + len(body)
+    assert sample("heartbeat_commands_returned_count", {}) == commands_before + 1
+    assert sample("heartbeat_stage_duration_seconds_count", {"stage": "commit"}) >= 1
+    assert REGISTRY.get_sample_value(
+        "http_requests_total", {"method": "POST", "endpoint": f"/api/v1/devices/{device_id}/heartbeat", "status_code": "200"}
+    ) is None
+
+    test_client.get("/api/v1/no-such-route")
+    assert sample("http_requests_total", {"method": "GET", "endpoint": "<unmatched>", "status_code": "404"}) >= 1
+
+
+def test_query_instrumentation_counts_per_request_and_logs_slow_queries(test_client, caplog):
+    from prometheus_client import REGISTRY
+
+    from app.db.instrumentation import classify_statement, query_instrumentation
+
+    assert classify_statement('SELECT devices.device_id FROM "devices" WHERE 1') == ("select", "devices")
+    assert classify_statement("INSERT INTO device_logs (device_id) VALUES (?)") == ("insert", "device_logs")
+    assert classify_statement("UPDATE devices SET status=?") == ("update", "devices")
+    assert classify_statement("PRAGMA main.table_info(\"devices\")") == ("other", "-")
+
+    template = "/api/v1/devices/{device_id}/heartbeat"
+    labels = {"method": "POST", "endpoint": template}
+    count_before = REGISTRY.get_sample_value("http_request_db_queries_count", labels) or 0.0
+    sum_before = REGISTRY.get_sample_value("http_request_db_queries_sum", labels) or 0.0
+    selects_before = REGISTRY.get_sample_value(
+        "database_operations_total", {"operation": "select", "table": "devices"}
+    ) or 0.0
+    device_id = test_client.post(
+        "/api/v1/devices/register",
+        json={"public_key": "-----BEGIN PUBLIC KEY-----\nQUERIES\n-----END PUBLIC KEY-----"},
+    ).json()["device_id"]
+
+    original = test_client.get("/api/v1/admin/db-instrumentation").json()
+    assert original["enabled"] is True
+    updated = test_client.put(
+        "/api/v1/admin/db-instrumentation", json={"slow_query_ms": 0, "request_query_warn": 1}
+    )
+    assert updated.status_code == 200
+    assert updated.json()["slow_query_ms"] == 0
+    try:
+        with caplog.at_level("WARNING", logger="app.db.instrumentation"):
+            response = test_client.post(f"/api/v1/devices/{device_id}/heartbeat", json={"status": "healthy"})
+        assert response.status_code == 200
+    finally:
+        test_client.put("/api/v1/admin/db-instrumentation", json=original)
+
+    queries = REGISTRY.get_sample_value("http_request_db_queries_sum", labels) - sum_before
+    assert REGISTRY.get_sample_value("http_request_db_queries_count", labels) == count_before + 1
+    assert queries >= 2
+    assert REGISTRY.get_sample_value(
+        "database_operations_total", {"operation": "select", "table": "devices"}
+    ) > selects_before
+    messages = [record.getMessage() for record in caplog.records]
+    assert any(m.startswith("Slow query") and f"POST {template}" in m for m in messages)
+    assert sum(m.startswith(f"Request to POST {template} ran more than 1 queries") for m in messages) == 1
+
+    test_client.put("/api/v1/admin/db-instrumentation", json={"enabled": False})
+    try:
+        sum_before = REGISTRY.get_sample_value("http_request_db_queries_sum", labels)
+        test_client.post(f"/api/v1/devices/{device_id}/heartbeat", json={"status": "healthy"})
+        assert REGISTRY.get_sample_value("http_request_db_queries_sum", labels) == sum_before
+    finally:
+        query_instrumentation.enabled = True
+    assert test_client.put("/api/v1/admin/db-instrumentation", json={"slow_query_ms": -1}).status_code == 422
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.main import app
+from app.db.session import Base, get_session
+from app.models.fleet import FleetCounter
+
+engine = create_async_engine("sqlite+aiosqlite:///:memory:", future=True)
+TestSession = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+
+@pytest.fixture(scope="module")
+def test_client():
+    async def override_get_session():
+        async with TestSession() as session:
+            yield session
+
+    async def prepare_db():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.get_event_loop().run_until_complete(prepare_db())
+    app.dependency_overrides[get_session] = override_get_session
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_fleet_summary_tracks_registrations_heartbeats_and_results(test_client):
+    ids = []
+    for i, device_type in enumerate(["camera", "camera", "gateway"]):
+        resp = test_client.post(
+            "/api/v1/devices/register",
+            json={
+                "public_key": f"-----BEGIN PUBLIC KEY-----\nFLEET_{i}\n-----END PUBLIC KEY-----",
+                "device_type": device_type,
+            },
+        )
+        ids.append(resp.json()["device_id"])
+
+    summary = test_client.get("/api/v1/fleet/summary").json()
+    assert summary["total_devices"] == 3
+    assert summary["by_status"] == {"online": 3}
+    assert summary["by_device_type"] == {"camera": 2, "gateway": 1}
+    assert summary["by_bundle_version"] == {"unknown": 3}
+
+    test_client.post(f"/api/v1/devices/{ids[0]}/heartbeat", json={"status": "degraded"})
+    test_client.post(
+        "/api/v1/bundles",
+        files={"file": ("fleet.tar.gz", b"fleet")},
+        data={"manifest": '{"version": "fleet-v1"}'},
+    )
+    deployment_id = test_client.post(
+        "/api/v1/deployments",
+        json={"bundle_version": "fleet-v1", "target_devices": [ids[1]]},
+    ).json()["deployment_id"]
+    assert test_client.get("/api/v1/fleet/summary").json()["active_rollouts"] == 1
+
+    test_client.post(f"/api/v1/devices/{ids[1]}/heartbeat", json={"status": "healthy"})
+    test_client.post(
+        f"/api/v1/deployments/{deployment_id}/result",
+        params={"device_id": ids[1], "status_str": "success"},
+    )
+
+    summary = test_client.get("/api/v1/fleet/summary").json()
+    assert summary["by_status"] == {"online": 1, "degraded": 1, "healthy": 1}
+    assert summary["by_bundle_version"] == {"unknown": 2, "fleet-v1": 1}
+    assert summary["deployments_by_status"] == {"success": 1}
+    assert summary["active_rollouts"] == 0
+
+
+def test_reconcile_repairs_drifted_counters(test_client):
+    before = test_client.get("/api/v1/fleet/summary").json()
+
+    async def corrupt():
+        async with TestSession() as session:
+            await session.execute(
+                update(FleetCounter).where(FleetCounter.dimension == "devices").values(count=999)
+            )
+            await session.commit()
+
+    asyncio.get_event_loop().run_until_complete(corrupt())
+    assert test_client.get("/api/v1/fleet/summary").json()["total_devices"] == 999
+
+    reconciled = test_client.post("/api/v1/fleet/summary/reconcile").json()
+    assert reconciled == before
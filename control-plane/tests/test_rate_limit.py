@@ -0,0 +1,177 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.api import dependencies
+from app.security import InputValidationMiddleware, MemoryBucketStore, RateBudget, RateLimitMiddleware
+from app.services.device_auth import sign_request
+
+
+def _take(store, key, budget, now):
+    return asyncio.get_event_loop().run_until_complete(store.take(key, budget, now=now))
+
+
+def test_bucket_allows_burst_then_refills():
+    store = MemoryBucketStore()
+    budget = RateBudget(per_minute=60, burst=3)
+
+    assert [_take(store, "k", budget, 0.0)[0] for _ in range(3)] == [True, True, True]
+    allowed, retry_after = _take(store, "k", budget, 0.0)
+    assert not allowed and retry_after == 1.0
+
+    assert _take(store, "k", budget, 1.0)[0]
+    assert not _take(store, "k", budget, 1.0)[0]
+
+
+def test_idle_buckets_are_evicted_and_keys_capped():
+    store = MemoryBucketStore(max_keys=3)
+    budget = RateBudget(per_minute=60, burst=2)  # full again after 2s idle
+
+    for i in range(3):
+        _take(store, f"k{i}", budget, 0.0)
+    _take(store, "k3", budget, 0.5)
+    assert len(store) == 3
+
+    _take(store, "k4", budget, 10.0)
+    assert len(store) == 1
+
+
+DEVICE_SECRETS = {"a": "secret-a", "b": "secret-b"}
+
+
+@pytest.fixture(autouse=True)
+def device_secrets(monkeypatch):
+    async def device_secret(_session, device_id):
+        return DEVICE_SECRETS.get(device_id)
+
+    monkeypatch.setattr(dependencies, "device_secret", device_secret)
+
+
+def _signed(device_id, secret=None):
+    timestamp = str(int(time.time()))
+    secret = secret or DEVICE_SECRETS.get(device_id, "unknown")
+    return {
+        "X-Kernex-Device": device_id,
+        "X-Kernex-Timestamp": timestamp,
+        "X-Kernex-Signature": sign_request(secret, "POST", f"/devices/{device_id}/heartbeat", timestamp, b""),
+    }
+
+
+def _limited_app(ip_budget=None):
+    app = FastAPI()
+
+    @app.post("/api/v1/devices/{device_id}/heartbeat")
+    async def heartbeat(device_id: str, request: Request):
+        await dependencies.authenticate_device(request, None)
+        return {"ok": True}
+
+    @app.post("/api/v1/devices/heartbeat/batch")
+    async def heartbeat_batch():
+        return {"results": []}
+
+    @app.get("/api/v1/devices")
+    async def list_devices():
+        return []
+
+    @app.post("/api/v1/auth/login")
+    async def login():
+        return {"access_token": "t"}
+
+    app.add_middleware(
+        RateLimitMiddleware,
+        budgets={
+            "heartbeat": RateBudget(per_minute=1, burst=2),
+            "download": RateBudget(per_minute=1, burst=1),
+            "admin": RateBudget(per_minute=1, burst=1),
+            "batch": RateBudget(per_minute=1, burst=3),
+        },
+        ip_budget=ip_budget,
+        known_token=lambda token: token == "validated",
+    )
+    return TestClient(app, headers={"User-Agent": "kernex-agent"})
+
+
+def test_device_routes_are_limited_per_device_not_per_ip():
+    client = _limited_app()
+
+    def heartbeat(device_id):
+        return client.post(f"/api/v1/devices/{device_id}/heartbeat", headers=_signed(device_id))
+
+    codes = [heartbeat("a").status_code for _ in range(3)]
+    assert codes == [200, 200, 429]
+    # Same client IP, different device: separate bucket
+    assert heartbeat("b").status_code == 200
+
+    throttled = heartbeat("a")
+    assert int(throttled.headers["Retry-After"]) >= 1
+
+    # Admin budget is separate, and keyed by a validated token before IP
+    assert client.get("/api/v1/devices").status_code == 200
+    assert client.get("/api/v1/devices").status_code == 429
+    assert client.get("/api/v1/devices", headers={"Authorization": "Bearer validated"}).status_code == 200
+
+    # Relay batches have their own budget
+    assert [client.post("/api/v1/devices/heartbeat/batch").status_code for _ in range(4)] == [200, 200, 200, 429]
+
+
+def test_forged_tokens_and_device_ids_share_the_ip_bucket():
+    client = _limited_app()
+
+    assert client.post("/api/v1/auth/login").status_code == 200
+    codes = [
+        client.post("/api/v1/auth/login", headers={"Authorization": f"Bearer junk{i}"}).status_code
+        for i in range(3)
+    ]
+    assert codes == [429, 429, 429]
+
+    # Unsigned heartbeats, and ones whose header names another device, are keyed by IP
+    unsigned = [client.post("/api/v1/devices/a/heartbeat").status_code for _ in range(3)]
+    assert unsigned == [200, 200, 429]
+    assert client.post("/api/v1/devices/a/heartbeat", headers=_signed("b")).status_code == 429
+
+    # A forged signature in the victim's name fails without spending the victim's bucket
+    forged = [
+        client.post("/api/v1/devices/a/heartbeat", headers=_signed("a", secret="guess")).status_code
+        for _ in range(3)
+    ]
+    assert forged == [401, 401, 401]
+    assert client.post("/api/v1/devices/a/heartbeat", headers=_signed("a")).status_code == 200
+
+
+def test_ip_ceiling_applies_across_keys():
+    client = _limited_app(ip_budget=RateBudget(per_minute=1, burst=3))
+
+    codes = [
+        client.post(f"/api/v1/devices/{device_id}/heartbeat", headers=_signed(device_id)).status_code
+        for device_id in ("a", "a", "b", "b")
+    ]
+    assert codes == [200, 200, 200, 429]
+    assert client.get("/api/v1/devices", headers={"Authorization": "Bearer validated"}).status_code == 429
+
+
+def test_security_headers_reach_streamed_and_throttled_responses():
+    from fastapi.responses import StreamingResponse
+
+    app = FastAPI()
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for i in range(3):
+                yield f"chunk-{i}\n".encode()
+
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    app.add_middleware(RateLimitMiddleware, budgets={"admin": RateBudget(per_minute=1, burst=1)})
+    app.add_middleware(InputValidationMiddleware)
+    client = TestClient(app, headers={"User-Agent": "kernex-agent"})
+
+    first = client.get("/stream")
+    assert first.text == "chunk-0\nchunk-1\nchunk-2\n"
+    assert first.headers["X-Frame-Options"] == "DENY"
+    throttled = client.get("/stream")
+    assert throttled.status_code == 429
+    assert throttled.headers["X-Content-Type-Options"] == "nosniff"
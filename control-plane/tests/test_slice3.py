@@ -99,6 +99,11 @@ def test_download_bundle_endpoint_returns_file(test_client):
         assert download_resp.headers["content-type"] == "application/octet-stream"
         assert len(download_resp.content) > 0
 
+        # Relays check access with a conditional request that carries no body
+        for tag in ("*", download_resp.headers["etag"]):
+            check = test_client.get(f"/api/v1/bundles/{bundle_id}", headers={"If-None-Match": tag})
+            assert check.status_code == 304 and check.content == b""
+
 
 def test_deployment_with_bundle_includes_bundle_id_in_command(test_client):
     """Test that heartbeat returns commands with bundle_id for download."""
@@ -399,3 +399,92 @@ def test_bundle_history_order(client):
     returned_versions = [h["bundle_version"] for h in history]
     assert len(returned_versions) == 3
     assert set(returned_versions) == {"1.0.0", "1.1.0", "1.2.0"}
+
+
+def test_rollback_reports_every_failing_device(client):
+    """Test that rollback validation lists all blocking devices in one error"""
+    device_ids = [
+        client.post(
+            "/api/v1/devices/register",
+            json={"public_key": f"test-key-rollback-{i}", "device_type": "test"},
+        ).json()["device_id"]
+        for i in range(3)
+    ]
+    client.post(
+        "/api/v1/bundles",
+        data={"manifest": '{"version": "rb-1.0.0"}'},
+        files={"file": ("test.tar.gz", b"rollback bundle")},
+    )
+    deployment_id = client.post(
+        "/api/v1/deployments",
+        json={"bundle_version": "rb-1.0.0", "target_devices": [device_ids[0]]},
+    ).json()["deployment_id"]
+    client.post(
+        f"/api/v1/deployments/{deployment_id}/result",
+        params={"device_id": device_ids[0], "status_str": "success"},
+    )
+
+    rollback_response = client.post(
+        "/api/v1/devices/rollback",
+        json={
+            "bundle_version": "rb-1.0.0",
+            "target_device_ids": device_ids + ["ghost-device"],
+        },
+    )
+    assert rollback_response.status_code == 400
+    detail = rollback_response.json()["detail"]
+    assert "ghost-device" in detail
+    assert device_ids[1] in detail and device_ids[2] in detail
+    assert device_ids[0] not in detail
+
+    ok = client.post(
+        "/api/v1/devices/rollback",
+        json={"bundle_version": "rb-1.0.0", "target_device_ids": [device_ids[0]]},
+    )
+    assert ok.status_code == 200
+
+
+def test_rollback_fleet_to_previous_good_version(client):
+    """Test that each device is rolled back to its own previous good version"""
+    def register(name):
+        return client.post(
+            "/api/v1/devices/register",
+            json={"public_key": f"test-key-prev-{name}", "device_type": "test"},
+        ).json()["device_id"]
+
+    def deploy_ok(version, device_id):
+        deployment_id = client.post(
+            "/api/v1/deployments",
+            json={"bundle_version": version, "target_devices": [device_id]},
+        ).json()["deployment_id"]
+        client.post(
+            f"/api/v1/deployments/{deployment_id}/result",
+            params={"device_id": device_id, "status_str": "success"},
+        )
+
+    for version in ("pg-1", "pg-2", "pg-3"):
+        client.post(
+            "/api/v1/bundles",
+            data={"manifest": f'{{"version": "{version}"}}'},
+            files={"file": ("test.tar.gz", version.encode())},
+        )
+    a, b, fresh = register("a"), register("b"), register("fresh")
+    deploy_ok("pg-1", a)
+    deploy_ok("pg-3", a)
+    deploy_ok("pg-2", b)
+    deploy_ok("pg-3", b)
+    deploy_ok("pg-3", fresh)
+
+    detail = client.get(f"/api/v1/devices/{a}").json()
+    assert detail["last_good_bundle_version"] == "pg-3"
+    assert detail["previous_good_bundle_version"] == "pg-1"
+
+    response = client.post(
+        "/api/v1/devices/rollback/previous-good",
+        json={"target_device_ids": [a, b, fresh]},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    targets = {d["bundle_version"]: d["target_device_ids"] for d in data["deployments"]}
+    assert targets == {"pg-1": [a], "pg-2": [b]}
+    assert data["skipped_device_ids"] == [fresh]
@@ -0,0 +1,52 @@
+"""
+First-boot identity cost per key type.
+
+Times ``ensure_keypair`` generating a fresh key (first boot) and loading an
+existing one (every later boot), plus one signature:
+
+    python benchmarks/bench_identity.py --rounds 3
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from kernex.device.identity import KEY_TYPES, ensure_keypair, sign_message  # noqa: E402
+
+
+def _best(fn, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=3, help="best-of rounds per measurement")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        print(f"{'key type':10} {'generate':>12} {'load':>12} {'sign':>12}")
+        for key_type in KEY_TYPES:
+            counter = iter(range(10**6))
+
+            def generate():
+                ensure_keypair(tmp_path / f"{key_type}-{next(counter)}.pem", key_type)
+
+            generate_s = _best(generate, args.rounds)
+            existing = tmp_path / f"{key_type}-existing.pem"
+            private_pem, _ = ensure_keypair(existing, key_type)
+            load_s = _best(lambda: ensure_keypair(existing, key_type), args.rounds)
+            sign_s = _best(lambda: sign_message(private_pem, b"x" * 256), args.rounds)
+            print(f"{key_type:10} {generate_s * 1000:10.1f}ms {load_s * 1000:10.2f}ms {sign_s * 1000:10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
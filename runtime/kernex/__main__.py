@@ -1,6 +1,16 @@
-from kernex.main import main
 import asyncio
+import logging
+import sys
+
+from kernex.config import get_settings
+from kernex.main import CONSOLE_FORMAT, main
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if sys.argv[1:2] == ["relay"]:
+        from kernex.agent.relay import run_relay
+
+        logging.basicConfig(level=get_settings().log_level.upper(), format=CONSOLE_FORMAT)
+        asyncio.run(run_relay())
+    else:
+        asyncio.run(main())
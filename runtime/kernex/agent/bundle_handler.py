@@ -4,50 +4,124 @@ Bundle operations: download, extract, and verification.
 import asyncio
 import hashlib
 import json
+import logging
+import os
 import tarfile
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 import httpx
 
+from kernex.update.atomic import clone_file
+from kernex.update.integrity import sha256_file, verify_file_checksum, verify_file_entries
 
-async def download_bundle(control_plane_url: str, bundle_id: str, target_dir: Path) -> Path:
+logger = logging.getLogger(__name__)
+
+
+def _filename_from_headers(headers: httpx.Headers, default: str) -> str:
+    """The server's suggested file name, or ``default`` unless it is a bare file name."""
+    # Parse: attachment; filename="version-filename.tar.gz"
+    cd = headers.get("content-disposition", "")
+    if 'filename="' not in cd:
+        return default
+    name = cd.split('filename="')[-1].rstrip('"')
+    # Never let a header choose a directory: no separators, no "..", no absolute paths
+    if name in ("", ".", "..") or name != Path(name).name or "\\" in name:
+        return default
+    return name
+
+
+async def _fetch_bundle(
+    client: httpx.AsyncClient,
+    url: str,
+    bundle_id: str,
+    target_dir: Path,
+    expected_checksum: Optional[str],
+    use_server_filename: bool = True,
+) -> Path:
+    """
+    Stream one source into a ``.part`` file, hashing as we write.
+
+    The file only takes its final name once the checksum matches, so a
+    failed or corrupt source never leaves a usable-looking archive behind.
+    With ``use_server_filename`` off the file is named after ``bundle_id``.
+    """
+    h = hashlib.sha256()
+    async with client.stream("GET", url) as response:
+        response.raise_for_status()
+        filename = bundle_id
+        if use_server_filename:
+            filename = _filename_from_headers(response.headers, bundle_id)
+        bundle_path = target_dir / filename
+        part_path = bundle_path.with_name(f".{bundle_path.name}.part")
+        try:
+            with await asyncio.to_thread(part_path.open, "wb") as f:
+                async for chunk in response.aiter_bytes(chunk_size=8192):
+                    h.update(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+            if expected_checksum and h.hexdigest() != expected_checksum:
+                raise ValueError(
+                    f"Checksum mismatch: expected {expected_checksum}, got {h.hexdigest()}"
+                )
+            os.replace(part_path, bundle_path)
+        finally:
+            if part_path.exists():
+                part_path.unlink()
+    return bundle_path
+
+
+async def download_bundle(
+    control_plane_url: str,
+    bundle_id: str,
+    target_dir: Path,
+    expected_checksum: Optional[str] = None,
+    peers: Optional[List[str]] = None,
+    peer_timeout: float = 5.0,
+    auth: Optional[httpx.Auth] = None,
+) -> Path:
     """
-    Download bundle from control plane and save to target directory.
+    Download bundle and save to target directory.
+
+    Peers on the LAN are tried first when a checksum is available to verify
+    what they serve; any peer error or mismatch falls through to the next
+    peer and finally to the control plane.
     
     Args:
         control_plane_url: Base URL of control plane API (e.g., http://localhost:8000/api/v1)
         bundle_id: UUID of bundle to download
         target_dir: Directory to save the bundle file
+        expected_checksum: SHA-256 the downloaded archive must match
+        peers: Base URLs of agents that already hold this bundle
+        peer_timeout: Per-peer request timeout in seconds
+        auth: Signs the control-plane request; never sent to peers
     
     Returns:
         Path to downloaded bundle file
     
     Raises:
         HTTPError: If download fails
+        ValueError: If the control plane copy fails checksum verification
         IOError: If file write fails
     """
     target_dir.mkdir(parents=True, exist_ok=True)
+
+    if expected_checksum:
+        for peer_url in peers or []:
+            url = f"{peer_url.rstrip('/')}/bundles/{bundle_id}"
+            try:
+                async with httpx.AsyncClient(timeout=peer_timeout) as client:
+                    # The checksum covers the bytes, not the name a LAN peer suggests
+                    path = await _fetch_bundle(
+                        client, url, bundle_id, target_dir, expected_checksum, use_server_filename=False
+                    )
+                logger.info("Fetched bundle %s from peer %s", bundle_id, peer_url)
+                return path
+            except Exception as exc:
+                logger.warning("Peer %s could not serve bundle %s: %s", peer_url, bundle_id, exc)
+
     url = f"{control_plane_url}/bundles/{bundle_id}"
-    
-    async with httpx.AsyncClient(timeout=300.0) as client:
-        async with client.stream("GET", url) as response:
-            response.raise_for_status()
-            
-            # Extract filename from Content-Disposition or use bundle_id
-            filename = bundle_id
-            if "content-disposition" in response.headers:
-                # Parse: attachment; filename="version-filename.tar.gz"
-                cd = response.headers["content-disposition"]
-                if "filename=" in cd:
-                    filename = cd.split('filename="')[-1].rstrip('"')
-            
-            bundle_path = target_dir / filename
-            async with await asyncio.to_thread(bundle_path.open, "wb") as f:
-                async for chunk in response.aiter_bytes(chunk_size=8192):
-                    await asyncio.to_thread(f.write, chunk)
-    
-    return bundle_path
+    async with httpx.AsyncClient(timeout=300.0, auth=auth) as client:
+        return await _fetch_bundle(client, url, bundle_id, target_dir, expected_checksum)
 
 
 async def compute_sha256(file_path: Path) -> str:
@@ -80,25 +154,108 @@ async def verify_checksum(file_path: Path, expected_checksum: str) -> bool:
     return True
 
 
-async def extract_bundle(bundle_path: Path, extract_dir: Path) -> Path:
+def _manifest_member(members: List[tarfile.TarInfo]) -> Optional[tarfile.TarInfo]:
+    """manifest.json at the archive root or inside a single top-level directory."""
+    for member in members:
+        parts = member.name.lstrip("./").split("/")
+        if member.isfile() and parts[-1] == "manifest.json" and len(parts) <= 2:
+            return member
+    return None
+
+
+def _manifest_file_index(manifest: Dict[str, Any]) -> Dict[str, tuple]:
+    try:
+        verify_file_entries(manifest.get("files"))
+    except ValueError:
+        return {}
+    return {entry["path"]: (entry["sha256"], entry["size"]) for entry in manifest["files"]}
+
+
+def _reusable_files(previous_dir: Path, wanted: Dict[str, tuple]) -> Dict[str, Path]:
+    """Files of the previous version whose manifest hash and size match ``wanted``."""
+    manifest_path = previous_dir / "manifest.json"
+    if not wanted or not manifest_path.exists():
+        return {}
+    try:
+        previous = _manifest_file_index(json.loads(manifest_path.read_text()))
+    except (OSError, json.JSONDecodeError):
+        return {}
+    reusable = {}
+    for rel, digest in wanted.items():
+        if previous.get(rel) != digest:
+            continue
+        candidate = previous_dir / rel
+        if candidate.is_file() and not candidate.is_symlink() and candidate.stat().st_size == digest[1]:
+            reusable[rel] = candidate
+    return reusable
+
+
+async def extract_bundle(
+    bundle_path: Path,
+    extract_dir: Path,
+    previous_dir: Optional[Path] = None,
+) -> Path:
     """
     Extract tar.gz bundle to directory.
+
+    When the bundle manifest lists per-file ``sha256``/``size`` entries,
+    every listed file is checked against its hash. If ``previous_dir`` holds
+    an earlier version with matching entries, files whose hash still
+    matches on disk are cloned from it (reflink or hardlink) instead of
+    being decompressed and written again.
     
     Args:
         bundle_path: Path to bundle .tar.gz file
         extract_dir: Directory to extract to
+        previous_dir: Extracted root of the currently deployed version
     
     Returns:
         Path to extracted bundle root directory
     
     Raises:
         tarfile.TarError: If extraction fails
+        ValueError: If an extracted file does not match its manifest sha256
     """
     extract_dir.mkdir(parents=True, exist_ok=True)
+    if previous_dir is not None:
+        previous_dir = previous_dir.resolve()
+        if previous_dir == extract_dir.resolve() or extract_dir.resolve() in previous_dir.parents:
+            previous_dir = None
     
     def _extract():
+        reused = 0
         with tarfile.open(bundle_path, "r:gz") as tar:
-            tar.extractall(path=extract_dir)
+            members = tar.getmembers()
+            wanted: Dict[str, tuple] = {}
+            reusable: Dict[str, Path] = {}
+            prefix = ""
+            manifest_member = _manifest_member(members)
+            if manifest_member is not None:
+                prefix = manifest_member.name[: -len("manifest.json")]
+                try:
+                    manifest = json.load(tar.extractfile(manifest_member))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    manifest = {}
+                if isinstance(manifest, dict):
+                    wanted = _manifest_file_index(manifest)
+            if previous_dir is not None:
+                reusable = _reusable_files(previous_dir, wanted)
+            for member in members:
+                rel = member.name[len(prefix):] if member.name.startswith(prefix) else None
+                digest = wanted.get(rel) if member.isfile() else None
+                source = reusable.get(rel) if digest is not None else None
+                # The previous version's copy may have been modified since it was deployed
+                if source is not None and source.stat().st_size == member.size and sha256_file(source) == digest[0]:
+                    method = clone_file(source, extract_dir / member.name)
+                    if method != "hardlink":
+                        os.chmod(extract_dir / member.name, member.mode)
+                    reused += 1
+                    continue
+                tar.extract(member, path=extract_dir)
+                if digest is not None:
+                    verify_file_checksum(extract_dir / member.name, digest[0])
+        if reused:
+            logger.info("Reused %d unchanged file(s) from %s", reused, previous_dir)
         # Most bundles have a top-level directory; if so, return its path
         # Otherwise return extract_dir
         contents = list(extract_dir.iterdir())
@@ -148,5 +305,8 @@ async def validate_manifest(manifest: Dict[str, Any]) -> bool:
     for field in required_fields:
         if field not in manifest:
             raise ValueError(f"Manifest missing required field: {field}")
+
+    if "files" in manifest:
+        verify_file_entries(manifest["files"])
     
     return True
@@ -0,0 +1,154 @@
+"""
+Minimal asyncio HTTP/1.1 server used for agent-to-agent traffic on the LAN.
+
+Only what the peer cache and relay need: one request per connection, bodies
+delimited by Content-Length, and responses streamed from bytes or a file.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 8 * 1024 * 1024
+FILE_CHUNK_BYTES = 64 * 1024
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    query: Dict[str, list[str]]
+    headers: Dict[str, str]
+    body: bytes = b""
+    # Query string as received, for forwarding byte-for-byte
+    raw_query: str = ""
+
+
+@dataclass
+class Response:
+    status: int = 200
+    headers: Dict[str, str] = field(default_factory=dict)
+    body: bytes = b""
+    file_path: Optional[Path] = None
+
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+        return None
+    if len(head) > MAX_HEADER_BYTES:
+        return None
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _version = lines[0].split(" ", 2)
+    except ValueError:
+        return None
+    headers: Dict[str, str] = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_BODY_BYTES:
+        raise ValueError("body too large")
+    body = await reader.readexactly(length) if length else b""
+    parts = urlsplit(target)
+    return Request(
+        method=method.upper(),
+        path=parts.path,
+        query=parse_qs(parts.query),
+        headers=headers,
+        body=body,
+        raw_query=parts.query,
+    )
+
+
+async def _write_response(writer: asyncio.StreamWriter, response: Response, head_only: bool) -> None:
+    headers = dict(response.headers)
+    if response.file_path is not None:
+        length = response.file_path.stat().st_size
+    else:
+        length = len(response.body)
+    headers["Content-Length"] = str(length)
+    headers["Connection"] = "close"
+    try:
+        reason = HTTPStatus(response.status).phrase
+    except ValueError:
+        reason = ""
+    lines = [f"HTTP/1.1 {response.status} {reason}"]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    if head_only:
+        await writer.drain()
+        return
+    if response.file_path is None:
+        writer.write(response.body)
+        await writer.drain()
+        return
+    f = await asyncio.to_thread(response.file_path.open, "rb")
+    try:
+        while True:
+            chunk = await asyncio.to_thread(f.read, FILE_CHUNK_BYTES)
+            if not chunk:
+                break
+            writer.write(chunk)
+            await writer.drain()
+    finally:
+        f.close()
+
+
+class HttpServer:
+    """Serve ``handler`` on ``host:port``; port 0 picks a free port."""
+
+    def __init__(self, handler: Handler, host: str = "0.0.0.0", port: int = 0):
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        head_only = False
+        try:
+            try:
+                request = await _read_request(reader)
+            except ValueError:
+                await _write_response(writer, Response(status=413), head_only=False)
+                return
+            if request is None:
+                return
+            head_only = request.method == "HEAD"
+            try:
+                response = await self.handler(request)
+            except Exception:
+                logger.exception("Unhandled error serving %s %s", request.method, request.path)
+                response = Response(status=500)
+            await _write_response(writer, response, head_only)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
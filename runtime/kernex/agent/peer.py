@@ -0,0 +1,99 @@
+"""
+LAN peer sharing: serve completed bundles to agents on the same subnet.
+
+Only bundles whose archive has been fully downloaded and verified are
+registered here, so peers never see partial files. Receivers still verify
+every peer-served byte against the bundle SHA-256 before using it.
+"""
+import re
+import socket
+from pathlib import Path
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+from kernex.agent.httpd import HttpServer, Request, Response
+
+_BUNDLE_PATH = re.compile(r"^/bundles/([A-Za-z0-9._-]+)$")
+
+BundleLookup = Callable[[str], Optional[Path]]
+
+
+class PeerServer:
+    """Serve ``GET /bundles/{bundle_id}`` from the local bundle cache."""
+
+    def __init__(
+        self,
+        host: str = "0.0.0.0",
+        port: int = 0,
+        advertise_host: Optional[str] = None,
+        lookup: Optional[BundleLookup] = None,
+    ):
+        self._archives: Dict[str, Path] = {}
+        self._lookup = lookup
+        self.advertise_host = advertise_host
+        self._http = HttpServer(self._handle, host=host, port=port)
+
+    @property
+    def port(self) -> int:
+        return self._http.port
+
+    @property
+    def url(self) -> str:
+        host = self.advertise_host or self._http.host
+        return f"http://{host}:{self.port}"
+
+    async def start(self) -> None:
+        await self._http.start()
+
+    async def stop(self) -> None:
+        await self._http.stop()
+
+    def register(self, bundle_id: str, archive_path: Path) -> None:
+        """Make a verified archive available to peers."""
+        self._archives[bundle_id] = archive_path
+
+    def unregister(self, bundle_id: str) -> None:
+        self._archives.pop(bundle_id, None)
+
+    def _resolve(self, bundle_id: str) -> Optional[Path]:
+        path = self._archives.get(bundle_id)
+        if path is None and self._lookup is not None:
+            path = self._lookup(bundle_id)
+        if path is None or not path.is_file():
+            return None
+        return path
+
+    async def _handle(self, request: Request) -> Response:
+        if request.method not in {"GET", "HEAD"}:
+            return Response(status=405)
+        match = _BUNDLE_PATH.match(request.path)
+        if not match:
+            return Response(status=404)
+        path = self._resolve(match.group(1))
+        if path is None:
+            return Response(status=404)
+        return Response(
+            headers={
+                "Content-Type": "application/octet-stream",
+                "Content-Disposition": f'attachment; filename="{path.name}"',
+            },
+            file_path=path,
+        )
+
+
+def detect_lan_address(control_plane_url: str) -> str:
+    """
+    Return the local address used to reach the control plane.
+
+    Connecting a UDP socket sends no packets; it only asks the kernel which
+    interface would be used, which is the address peers on the LAN can reach.
+    """
+    parts = urlsplit(control_plane_url)
+    host = parts.hostname or "127.0.0.1"
+    port = parts.port or 80
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect((host, port))
+            return sock.getsockname()[0]
+    except OSError:
+        return "127.0.0.1"
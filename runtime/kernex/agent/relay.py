@@ -0,0 +1,358 @@
+"""
+Site caching relay.
+
+One agent per site runs ``python -m kernex relay`` and downstream agents set
+``CONTROL_PLANE_URL`` to the relay's root URL. The relay:
+
+* caches bundle blobs on disk under an LRU size budget,
+* coalesces concurrent requests for the same bundle into one upstream fetch,
+* batches heartbeats into ``POST /devices/heartbeat/batch``,
+* passes every other request through unchanged.
+
+The relay holds no device secrets. Device signatures travel upstream
+untouched: passthrough headers, per-item fields in heartbeat batches, and
+the first requester's headers on a bundle cache fill. Every other request
+for a cached bundle is checked upstream with the requester's own headers
+and ``If-None-Match: *``, which the control plane answers with 304 (or
+401/403/404) and no body, so the relay never hands a bundle to a caller
+the control plane would refuse.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from kernex.agent.httpd import HttpServer, Request, Response
+from kernex.config import get_settings
+from kernex.device.signing import SIGNATURE_HEADER, SIGNATURE_HEADERS, TIMESTAMP_HEADER
+
+logger = logging.getLogger(__name__)
+
+_HEARTBEAT_PATH = re.compile(r"^/devices/([^/]+)/heartbeat$")
+_BUNDLE_PATH = re.compile(r"^/bundles/([A-Za-z0-9._-]+)$")
+_SIGNATURE_HEADERS = tuple(name.lower() for name in SIGNATURE_HEADERS)
+_FORWARDED_HEADERS = ("content-type", "content-encoding", "authorization") + _SIGNATURE_HEADERS
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class BundleCache:
+    """
+    Bundle blobs on local disk, evicted least-recently-used first.
+
+    Files are named by bundle_id. Recency survives restarts through file
+    mtimes, which are bumped on every hit.
+    """
+
+    def __init__(self, cache_dir: Path, budget_bytes: int):
+        self.cache_dir = cache_dir
+        self.budget_bytes = budget_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._entries.values())
+
+    def load(self) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        files = [p for p in self.cache_dir.iterdir() if p.is_file() and not p.name.startswith(".")]
+        for path in sorted(files, key=lambda p: p.stat().st_mtime):
+            self._entries[path.name] = path.stat().st_size
+        self._evict()
+
+    def path_for(self, bundle_id: str) -> Path:
+        return self.cache_dir / bundle_id
+
+    def get(self, bundle_id: str) -> Optional[Path]:
+        if bundle_id not in self._entries:
+            return None
+        path = self.path_for(bundle_id)
+        if not path.exists():
+            self._entries.pop(bundle_id, None)
+            return None
+        self._entries.move_to_end(bundle_id)
+        os.utime(path)
+        return path
+
+    async def fetch(
+        self,
+        bundle_id: str,
+        client: httpx.AsyncClient,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Tuple[Path, bool]:
+        """
+        Return the cached blob, downloading it once no matter how many callers wait.
+
+        The flag is True only for the caller whose ``headers`` the download used.
+        """
+        cached = self.get(bundle_id)
+        if cached is not None:
+            return cached, False
+        task = self._inflight.get(bundle_id)
+        filled = task is None
+        if filled:
+            task = asyncio.create_task(self._fill(bundle_id, client, url, headers))
+            self._inflight[bundle_id] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(bundle_id, None))
+        # shield: one caller disconnecting must not cancel the shared download
+        return await asyncio.shield(task), filled
+
+    async def _fill(
+        self,
+        bundle_id: str,
+        client: httpx.AsyncClient,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Path:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self.path_for(bundle_id)
+        part_path = path.with_name(f".{bundle_id}.part")
+        h = hashlib.sha256()
+        try:
+            async with client.stream("GET", url, headers=headers) as response:
+                if response.status_code >= 400:
+                    raise UpstreamError(response.status_code, f"Upstream returned {response.status_code}")
+                expected = response.headers.get("x-checksum-sha256")
+                with await asyncio.to_thread(part_path.open, "wb") as f:
+                    async for chunk in response.aiter_bytes(chunk_size=64 * 1024):
+                        h.update(chunk)
+                        await asyncio.to_thread(f.write, chunk)
+            if expected and h.hexdigest() != expected:
+                raise UpstreamError(502, f"Checksum mismatch for bundle {bundle_id}")
+            os.replace(part_path, path)
+        finally:
+            if part_path.exists():
+                part_path.unlink()
+        self._entries[bundle_id] = path.stat().st_size
+        self._entries.move_to_end(bundle_id)
+        self._evict(keep=bundle_id)
+        return path
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        while self.total_bytes > self.budget_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            self._entries.pop(oldest)
+            try:
+                self.path_for(oldest).unlink()
+            except FileNotFoundError:
+                pass
+            logger.info("Evicted bundle %s from relay cache", oldest)
+
+
+class HeartbeatBatcher:
+    """
+    Collect heartbeats for ``window`` seconds and forward them upstream together.
+
+    Callers still get their own device's commands back, so downstream agents
+    see ordinary heartbeat semantics.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, upstream_url: str, window: float, max_batch: int):
+        self._client = client
+        self._url = f"{upstream_url}/devices/heartbeat/batch"
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: List[Tuple[Dict[str, str], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # The loop holds tasks weakly; keep each send alive until it finishes
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches_sent = 0
+
+    async def submit(
+        self,
+        device_id: str,
+        body: bytes,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        item = {"device_id": device_id, "body": body.decode() or "{}"}
+        headers = headers or {}
+        if SIGNATURE_HEADER.lower() in headers:
+            item["timestamp"] = headers.get(TIMESTAMP_HEADER.lower())
+            item["signature"] = headers[SIGNATURE_HEADER.lower()]
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush_soon()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush_soon)
+        return await future
+
+    def _flush_soon(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[Dict[str, str], asyncio.Future]]) -> None:
+        self.batches_sent += 1
+        try:
+            response = await self._client.post(self._url, json={"heartbeats": [item for item, _ in batch]})
+            response.raise_for_status()
+            results = response.json()["results"]
+            if len(results) != len(batch):
+                # Results are matched by position; a short list would leave callers waiting forever
+                raise ValueError(f"Upstream returned {len(results)} results for {len(batch)} heartbeats")
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+class RelayServer:
+    def __init__(
+        self,
+        upstream_url: str,
+        cache_dir: Path,
+        cache_budget_bytes: int,
+        batch_window: float = 0.2,
+        max_batch: int = 100,
+        host: str = "0.0.0.0",
+        port: int = 0,
+    ):
+        self.upstream_url = upstream_url.rstrip("/")
+        self.cache = BundleCache(cache_dir, cache_budget_bytes)
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._client: Optional[httpx.AsyncClient] = None
+        self.batcher: Optional[HeartbeatBatcher] = None
+        self._http = HttpServer(self._handle, host=host, port=port)
+
+    @property
+    def port(self) -> int:
+        return self._http.port
+
+    async def start(self) -> None:
+        self.cache.load()
+        self._client = httpx.AsyncClient(timeout=300.0)
+        self.batcher = HeartbeatBatcher(self._client, self.upstream_url, self.batch_window, self.max_batch)
+        await self._http.start()
+
+    async def stop(self) -> None:
+        await self._http.stop()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _handle(self, request: Request) -> Response:
+        heartbeat = _HEARTBEAT_PATH.match(request.path)
+        if heartbeat and request.method == "POST":
+            return await self._heartbeat(heartbeat.group(1), request)
+        bundle = _BUNDLE_PATH.match(request.path)
+        if bundle and request.method in {"GET", "HEAD"}:
+            return await self._bundle(bundle.group(1), request)
+        return await self._passthrough(request)
+
+    async def _heartbeat(self, device_id: str, request: Request) -> Response:
+        try:
+            result = await self.batcher.submit(device_id, request.body, request.headers)
+        except Exception as exc:
+            logger.warning("Heartbeat batch failed upstream: %s", exc)
+            return _json_response(502, {"detail": "Upstream heartbeat failed"})
+        if result.get("status_code", 200) != 200:
+            return _json_response(result["status_code"], {"detail": result.get("detail")})
+        return _json_response(200, {"commands": result.get("commands", [])})
+
+    async def _bundle(self, bundle_id: str, request: Request) -> Response:
+        headers = {k: v for k, v in request.headers.items() if k in _SIGNATURE_HEADERS or k == "authorization"}
+        url = f"{self.upstream_url}/bundles/{bundle_id}"
+        try:
+            path, filled = await self.cache.fetch(bundle_id, self._client, url, headers)
+            if not filled:
+                await self._authorize(url, headers)
+        except UpstreamError as exc:
+            return _json_response(exc.status_code, {"detail": exc.detail})
+        except httpx.HTTPError as exc:
+            logger.warning("Bundle %s fetch failed upstream: %s", bundle_id, exc)
+            return _json_response(502, {"detail": "Upstream bundle fetch failed"})
+        return Response(
+            headers={
+                "Content-Type": "application/octet-stream",
+                "Content-Disposition": f'attachment; filename="{bundle_id}"',
+            },
+            file_path=path,
+        )
+
+    async def _authorize(self, url: str, headers: Dict[str, str]) -> None:
+        """
+        Check that upstream would serve this requester the bundle, without downloading it.
+
+        Raises:
+            UpstreamError: If upstream refuses the requester
+        """
+        async with self._client.stream("GET", url, headers={**headers, "If-None-Match": "*"}) as response:
+            # A control plane without conditional downloads answers 200; the body is left unread
+            if response.status_code not in (200, 304):
+                raise UpstreamError(response.status_code, f"Upstream returned {response.status_code}")
+
+    async def _passthrough(self, request: Request) -> Response:
+        headers = {k: v for k, v in request.headers.items() if k in _FORWARDED_HEADERS}
+        # The raw query keeps signed requests verifiable upstream
+        url = f"{self.upstream_url}{request.path}"
+        if request.raw_query:
+            url = f"{url}?{request.raw_query}"
+        try:
+            upstream = await self._client.request(
+                request.method,
+                url,
+                content=request.body or None,
+                headers=headers,
+            )
+        except httpx.HTTPError as exc:
+            logger.warning("Passthrough %s %s failed: %s", request.method, request.path, exc)
+            return _json_response(502, {"detail": "Upstream request failed"})
+        headers = {"Content-Type": upstream.headers.get("content-type", "application/octet-stream")}
+        if "retry-after" in upstream.headers:
+            headers["Retry-After"] = upstream.headers["retry-after"]
+        return Response(status=upstream.status_code, headers=headers, body=upstream.content)
+
+
+def _json_response(status_code: int, payload: Dict[str, Any]) -> Response:
+    return Response(
+        status=status_code,
+        headers={"Content-Type": "application/json"},
+        body=json.dumps(payload).encode(),
+    )
+
+
+async def run_relay() -> None:
+    settings = get_settings()
+    relay = RelayServer(
+        upstream_url=str(settings.control_plane_url),
+        cache_dir=Path(settings.relay_cache_dir).expanduser(),
+        cache_budget_bytes=settings.relay_cache_budget_mb * 1024 * 1024,
+        batch_window=settings.relay_batch_window_ms / 1000,
+        max_batch=settings.relay_max_batch,
+        host=settings.relay_bind_host,
+        port=settings.relay_port,
+    )
+    await relay.start()
+    logger.info("Relay listening on port %s, upstream %s", relay.port, relay.upstream_url)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await relay.stop()
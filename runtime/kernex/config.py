@@ -8,12 +8,37 @@ class Settings(BaseModel):
         default=os.getenv("CONTROL_PLANE_URL", "http://localhost:8000/api/v1")
     )
     device_id: str | None = None
+    # HMAC key for signed requests, issued at registration
+    registration_token: str | None = None
     key_path: str = os.getenv("KERNEX_KEY_PATH", "./device_key.pem")
+    # Used only when generating a new key; existing keys keep their type
+    key_type: str = os.getenv("KERNEX_KEY_TYPE", "ed25519")
     polling_interval: int = int(os.getenv("POLLING_INTERVAL", "60"))
     config_path: str = os.getenv("KERNEX_CONFIG_PATH", "./device_config.json")
     heartbeat_timeout: int = int(os.getenv("HEARTBEAT_TIMEOUT", "30"))
     deploy_timeout: int = int(os.getenv("DEPLOY_TIMEOUT", "300"))
     log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    # Managed bundle store: archives plus extracted versions under one budget
+    bundle_dir: str = os.getenv("KERNEX_BUNDLE_DIR", "~/.kernex/bundles")
+    bundle_disk_budget_mb: int = int(os.getenv("KERNEX_BUNDLE_DISK_BUDGET_MB", "4096"))
+    min_free_disk_mb: int = int(os.getenv("KERNEX_MIN_FREE_DISK_MB", "256"))
+    # LAN peer sharing; port 0 disables serving bundles to peers
+    peer_port: int = int(os.getenv("KERNEX_PEER_PORT", "0"))
+    peer_bind_host: str = os.getenv("KERNEX_PEER_BIND_HOST", "0.0.0.0")
+    peer_advertise_host: str | None = os.getenv("KERNEX_PEER_ADVERTISE_HOST")
+    peer_timeout: float = float(os.getenv("KERNEX_PEER_TIMEOUT", "5"))
+    # Log shipping: gzip NDJSON batches spooled on disk until uploaded
+    log_spool_dir: str = os.getenv("KERNEX_LOG_SPOOL_DIR", "~/.kernex/log-spool")
+    log_spool_max_mb: int = int(os.getenv("KERNEX_LOG_SPOOL_MAX_MB", "32"))
+    log_batch_lines: int = int(os.getenv("KERNEX_LOG_BATCH_LINES", "500"))
+    log_flush_interval: float = float(os.getenv("KERNEX_LOG_FLUSH_INTERVAL", "5"))
+    # Site relay mode (python -m kernex relay)
+    relay_port: int = int(os.getenv("KERNEX_RELAY_PORT", "8765"))
+    relay_bind_host: str = os.getenv("KERNEX_RELAY_BIND_HOST", "0.0.0.0")
+    relay_cache_dir: str = os.getenv("KERNEX_RELAY_CACHE_DIR", "~/.kernex/relay-cache")
+    relay_cache_budget_mb: int = int(os.getenv("KERNEX_RELAY_CACHE_BUDGET_MB", "2048"))
+    relay_batch_window_ms: int = int(os.getenv("KERNEX_RELAY_BATCH_WINDOW_MS", "200"))
+    relay_max_batch: int = int(os.getenv("KERNEX_RELAY_MAX_BATCH", "100"))
 
 
 @lru_cache()
@@ -1,14 +1,42 @@
+import base64
+import hashlib
+import time
 from pathlib import Path
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
+from typing import Dict, Optional
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, padding, rsa
 
+KEY_TYPES = ("ed25519", "rsa")
 
-def ensure_keypair(path: Path) -> tuple[str, str]:
-    """Generate or load RSA keypair; returns (private_pem, public_pem)."""
+
+def _generate_private_key(key_type: str):
+    if key_type == "ed25519":
+        # Generation is effectively instant, unlike RSA-4096 on small ARM cores
+        return ed25519.Ed25519PrivateKey.generate()
+    if key_type == "rsa":
+        return rsa.generate_private_key(public_exponent=65537, key_size=4096)
+    raise ValueError(f"Unsupported key type: {key_type!r} (expected one of {', '.join(KEY_TYPES)})")
+
+
+def key_type_of(key) -> str:
+    if isinstance(key, (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey)):
+        return "ed25519"
+    if isinstance(key, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+        return "rsa"
+    raise ValueError(f"Unsupported key: {type(key).__name__}")
+
+
+def ensure_keypair(path: Path, key_type: str = "ed25519") -> tuple[str, str]:
+    """
+    Generate or load the device keypair; returns (private_pem, public_pem).
+
+    ``key_type`` only applies when generating. An existing key is always
+    reused, so devices provisioned with RSA keep their identity.
+    """
     if path.exists():
         private_pem = path.read_bytes()
     else:
-        key = rsa.generate_private_key(public_exponent=65537, key_size=4096)
+        key = _generate_private_key(key_type)
         private_pem = key.private_bytes(
             encoding=serialization.Encoding.PEM,
             format=serialization.PrivateFormat.PKCS8,
@@ -22,3 +50,23 @@ def ensure_keypair(path: Path) -> tuple[str, str]:
         format=serialization.PublicFormat.SubjectPublicKeyInfo,
     )
     return private_pem.decode(), public_pem.decode()
+
+
+def public_key_type(public_pem: str) -> str:
+    return key_type_of(serialization.load_pem_public_key(public_pem.encode()))
+
+
+def sign_message(private_pem: str, message: bytes) -> bytes:
+    """Sign with the device key: Ed25519, or RSA PKCS#1 v1.5 over SHA-256."""
+    key = serialization.load_pem_private_key(private_pem.encode(), password=None)
+    if key_type_of(key) == "ed25519":
+        return key.sign(message)
+    return key.sign(message, padding.PKCS1v15(), hashes.SHA256())
+
+
+def registration_proof(private_pem: str, public_pem: str, now: Optional[float] = None) -> Dict[str, str]:
+    """``proof_timestamp``/``proof_signature`` registration fields proving this device holds the key."""
+    timestamp = str(int(time.time() if now is None else now))
+    fingerprint = hashlib.sha256("".join(public_pem.split()).encode()).hexdigest()
+    signature = sign_message(private_pem, f"kernex-register\n{fingerprint}\n{timestamp}".encode())
+    return {"proof_timestamp": timestamp, "proof_signature": base64.b64encode(signature).decode()}
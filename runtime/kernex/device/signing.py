@@ -0,0 +1,70 @@
+"""
+HMAC request signing with the device's registration token.
+
+``DeviceAuth`` plugs into an ``httpx`` client and adds ``X-Kernex-Device``,
+``X-Kernex-Timestamp`` and ``X-Kernex-Signature`` to every request. The
+signature covers the method, the path and query below the control-plane
+base URL, the timestamp and the SHA-256 of the body, matching the control
+plane's ``app.services.device_auth``.
+"""
+import hashlib
+import hmac
+import time
+from typing import Dict, Generator, Optional
+
+import httpx
+
+DEVICE_HEADER = "X-Kernex-Device"
+TIMESTAMP_HEADER = "X-Kernex-Timestamp"
+SIGNATURE_HEADER = "X-Kernex-Signature"
+SIGNATURE_HEADERS = (DEVICE_HEADER, TIMESTAMP_HEADER, SIGNATURE_HEADER)
+
+
+def sign_request(secret: str, method: str, path: str, timestamp: str, body: bytes) -> str:
+    message = f"{method.upper()}\n{path}\n{timestamp}\n{hashlib.sha256(body).hexdigest()}".encode()
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def signed_headers(
+    device_id: str,
+    secret: str,
+    method: str,
+    path: str,
+    body: bytes,
+    now: Optional[float] = None,
+) -> Dict[str, str]:
+    timestamp = str(int(time.time() if now is None else now))
+    return {
+        DEVICE_HEADER: device_id,
+        TIMESTAMP_HEADER: timestamp,
+        SIGNATURE_HEADER: sign_request(secret, method, path, timestamp, body),
+    }
+
+
+class DeviceAuth(httpx.Auth):
+    """Sign requests to the control plane (or a relay) at ``base_url``."""
+
+    requires_request_body = True
+
+    def __init__(self, device_id: str, secret: str, base_url: str):
+        self.device_id = device_id
+        self._secret = secret
+        self._base_path = httpx.URL(base_url).raw_path.split(b"?", 1)[0].rstrip(b"/")
+
+    def signing_path(self, url: httpx.URL) -> str:
+        path = url.raw_path
+        if self._base_path and path.startswith(self._base_path):
+            path = path[len(self._base_path):]
+        return path.decode("ascii")
+
+    def auth_flow(self, request: httpx.Request) -> Generator[httpx.Request, httpx.Response, None]:
+        request.headers.update(
+            signed_headers(
+                self.device_id,
+                self._secret,
+                request.method,
+                self.signing_path(request.url),
+                request.content,
+            )
+        )
+        yield request
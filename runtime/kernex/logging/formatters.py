@@ -0,0 +1,34 @@
+"""
+Log record serialization for shipping to the control plane.
+
+Each record becomes one compact JSON object per line (NDJSON) with the
+fields ``POST /devices/{device_id}/logs`` accepts.
+"""
+import json
+import logging
+from datetime import datetime, timezone
+
+# Control-plane limit; longer messages are truncated on the device
+MAX_MESSAGE_CHARS = 8192
+# Extra ``LogRecord`` attributes copied into the entry when present
+EXTRA_FIELDS = ("deployment_id", "source")
+
+
+class NdjsonFormatter(logging.Formatter):
+    """Format a record as a single JSON line (without the trailing newline)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        if record.exc_info:
+            message = f"{message}\n{self.formatException(record.exc_info)}"
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": message[:MAX_MESSAGE_CHARS],
+        }
+        for name in EXTRA_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        return json.dumps(entry, separators=(",", ":"), default=str)
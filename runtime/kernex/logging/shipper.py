@@ -0,0 +1,237 @@
+"""
+Disk-spooled log shipping.
+
+``SpoolingHandler`` is a ``logging.Handler`` whose ``emit`` only appends the
+formatted line to a bounded in-memory buffer, so logging never waits on
+disk or network. A writer thread drains the buffer into gzip-compressed
+NDJSON segment files in a ``LogSpool``; each segment is exactly the body
+of one upload. ``LogShipper`` runs on the event loop and posts segments
+oldest first to ``POST /devices/{device_id}/logs``, deleting each one only
+after the control plane accepts it.
+
+Memory is bounded by the handler's buffer and disk by the spool budget:
+when the device is offline for long enough, the oldest segments are
+discarded and the loss is recorded in the log itself.
+"""
+import asyncio
+import gzip
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Deque, List, Optional
+
+import httpx
+
+from kernex.logging.formatters import NdjsonFormatter
+from kernex.update.atomic import atomic_write_bytes
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".ndjson.gz"
+# Statuses meaning "not now": keep the segment and wait. 401 is usually a
+# signature timestamp outside the allowed window while the clock is off.
+_RETRY_STATUSES = {401, 404, 408, 429, 500, 502, 503, 504}
+
+
+class LogSpool:
+    """
+    Size-bounded directory of compressed log batches.
+
+    Segment names sort in creation order. Shared by the writer thread and
+    the shipper, so the index is guarded by a lock.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.dropped_segments = 0
+        self._segments: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+
+    def load(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for stray in self.directory.glob(f".*{SEGMENT_SUFFIX}.*"):
+            stray.unlink(missing_ok=True)
+        with self._lock:
+            for path in sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}")):
+                self._segments[path.name] = path.stat().st_size
+
+    @property
+    def used_bytes(self) -> int:
+        with self._lock:
+            return sum(self._segments.values())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._segments)
+
+    def write_batch(self, lines: List[str]) -> Path:
+        """Compress ``lines`` into a new segment, evicting the oldest ones over budget."""
+        body = gzip.compress(("\n".join(lines) + "\n").encode(), compresslevel=6)
+        name = f"{time.time_ns():020d}-{next(self._seq) % 1000000:06d}{SEGMENT_SUFFIX}"
+        path = self.directory / name
+        atomic_write_bytes(path, body)
+        with self._lock:
+            self._segments[name] = len(body)
+            while sum(self._segments.values()) > self.max_bytes and len(self._segments) > 1:
+                oldest, _ = self._segments.popitem(last=False)
+                (self.directory / oldest).unlink(missing_ok=True)
+                self.dropped_segments += 1
+        return path
+
+    def oldest(self) -> Optional[Path]:
+        with self._lock:
+            name = next(iter(self._segments), None)
+        return self.directory / name if name else None
+
+    def remove(self, path: Path) -> None:
+        with self._lock:
+            self._segments.pop(path.name, None)
+        path.unlink(missing_ok=True)
+
+
+class SpoolingHandler(logging.Handler):
+    """
+    Non-blocking handler feeding a ``LogSpool`` from a background thread.
+
+    Records arriving while ``buffer_lines`` are already waiting are dropped
+    and counted rather than blocking the caller.
+    """
+
+    def __init__(
+        self,
+        spool: LogSpool,
+        batch_lines: int = 500,
+        flush_interval: float = 5.0,
+        buffer_lines: int = 10000,
+    ):
+        super().__init__()
+        self.setFormatter(NdjsonFormatter())
+        self.spool = spool
+        self.batch_lines = batch_lines
+        self.flush_interval = flush_interval
+        self.buffer_lines = buffer_lines
+        self.dropped = 0
+        self._buffer: Deque[str] = deque()
+        self._wake = threading.Event()
+        self._closing = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="kernex-log-spool", daemon=True)
+        self._thread.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if len(self._buffer) >= self.buffer_lines:
+            self.dropped += 1
+            return
+        try:
+            self._buffer.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self._buffer) >= self.batch_lines:
+            self._wake.set()
+
+    def _drain(self) -> None:
+        while self._buffer:
+            lines = []
+            while self._buffer and len(lines) < self.batch_lines:
+                lines.append(self._buffer.popleft())
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                lines.append(self._notice(f"{dropped} log records dropped: buffer full"))
+            try:
+                self.spool.write_batch(lines)
+            except OSError:
+                # Disk full or unwritable; losing logs beats stalling the agent
+                self.dropped += len(lines)
+
+    def _notice(self, message: str) -> str:
+        record = logging.LogRecord(logger.name, logging.WARNING, __file__, 0, message, None, None)
+        return self.format(record)
+
+    def _run(self) -> None:
+        while not self._closing.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._drain()
+        self._drain()
+
+    def flush(self) -> None:
+        self._wake.set()
+
+    def close(self) -> None:
+        self._closing.set()
+        self._wake.set()
+        self._thread.join(timeout=5)
+        super().close()
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+class LogShipper:
+    """Upload spooled segments oldest first, backing off when told to."""
+
+    def __init__(self, spool: LogSpool, url: str, idle_interval: float = 5.0, max_backoff: float = 300.0):
+        self.spool = spool
+        self.url = url
+        self.idle_interval = idle_interval
+        self.max_backoff = max_backoff
+        self._backoff = 1.0
+        self._reported_drops = 0
+
+    def _fail(self, retry_after: Optional[float] = None) -> float:
+        delay = retry_after if retry_after is not None else self._backoff
+        self._backoff = min(self._backoff * 2, self.max_backoff)
+        return min(delay, self.max_backoff)
+
+    async def ship_once(self, client: httpx.AsyncClient) -> float:
+        """Send the oldest segment; returns how long to wait before the next attempt."""
+        if self.spool.dropped_segments > self._reported_drops:
+            logger.warning(
+                "Log spool full: discarded %d oldest batches",
+                self.spool.dropped_segments - self._reported_drops,
+            )
+            self._reported_drops = self.spool.dropped_segments
+        path = self.spool.oldest()
+        if path is None:
+            return self.idle_interval
+        try:
+            body = await asyncio.to_thread(path.read_bytes)
+        except FileNotFoundError:
+            # Evicted by the writer thread meanwhile
+            self.spool.remove(path)
+            return 0.0
+        try:
+            response = await client.post(
+                self.url,
+                content=body,
+                headers={"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"},
+            )
+        except httpx.HTTPError as exc:
+            logger.debug("Log upload failed: %s", exc)
+            return self._fail()
+        if response.status_code in _RETRY_STATUSES:
+            if response.status_code == 401:
+                logger.warning("Log upload unauthorized; keeping the batch (is the device clock right?)")
+            return self._fail(_retry_after(response))
+        if response.is_error:
+            # The control plane will never accept this batch (e.g. 400, 413)
+            logger.warning("Log batch %s rejected with %d; discarding", path.name, response.status_code)
+        self.spool.remove(path)
+        self._backoff = 1.0
+        return 0.0
+
+    async def run(self, client: httpx.AsyncClient) -> None:
+        while True:
+            delay = await self.ship_once(client)
+            if delay:
+                await asyncio.sleep(delay)
@@ -1,19 +1,85 @@
 import asyncio
+import logging
 import httpx
 from pathlib import Path
 
 from kernex.config import get_settings
-from kernex.device.identity import ensure_keypair
+from kernex.device.identity import ensure_keypair, public_key_type, registration_proof
 from kernex.device.config import load_device_config, save_device_config
+from kernex.device.signing import DeviceAuth
 from kernex.device.info import collect_device_info
 from kernex.polling.heartbeat import build_heartbeat_payload
-from kernex.agent.launcher import run_script
+from kernex.agent.launcher import LaunchResult, run_script
+from kernex.agent.peer import PeerServer, detect_lan_address
 from kernex.agent.bundle_handler import (
     download_bundle,
     extract_bundle,
     load_manifest,
     validate_manifest,
 )
+from kernex.logging.shipper import LogShipper, LogSpool, SpoolingHandler
+from kernex.update.store import BundleStore
+
+logger = logging.getLogger(__name__)
+# Deploy/rollback script output, tagged with the deployment it belongs to
+script_logger = logging.getLogger("kernex.script")
+CONSOLE_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Serves verified bundles to LAN peers when KERNEX_PEER_PORT is set
+peer_server: PeerServer | None = None
+# Uploads spooled logs while main() runs
+shipper_task: asyncio.Task | None = None
+bundle_store: BundleStore | None = None
+
+
+def get_bundle_store() -> BundleStore:
+    global bundle_store
+    if bundle_store is None:
+        settings = get_settings()
+        bundle_store = BundleStore(
+            Path(settings.bundle_dir).expanduser(),
+            budget_bytes=settings.bundle_disk_budget_mb * 1024 * 1024,
+            min_free_bytes=settings.min_free_disk_mb * 1024 * 1024,
+        )
+        bundle_store.load()
+    return bundle_store
+
+
+def configure_logging() -> LogSpool:
+    """
+    Log the ``kernex`` hierarchy to the console and to the upload spool.
+
+    Returns the spool for ``LogShipper``; records are spooled from the
+    start, before the device id needed to upload them is known.
+    """
+    settings = get_settings()
+    spool = LogSpool(
+        Path(settings.log_spool_dir).expanduser(),
+        max_bytes=settings.log_spool_max_mb * 1024 * 1024,
+    )
+    spool.load()
+    root = logging.getLogger("kernex")
+    root.setLevel(settings.log_level.upper())
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+    root.addHandler(console)
+    root.addHandler(
+        SpoolingHandler(
+            spool,
+            batch_lines=settings.log_batch_lines,
+            flush_interval=settings.log_flush_interval,
+        )
+    )
+    return spool
+
+
+def log_script_output(result: LaunchResult, deployment_id: str | None) -> None:
+    """Log a deploy script's stdout at INFO and stderr at WARNING, one record per line."""
+    extra = {"source": "script", "deployment_id": deployment_id}
+    for line in result.stdout.splitlines():
+        script_logger.info(line, extra=extra)
+    for line in result.stderr.splitlines():
+        script_logger.warning(line, extra=extra)
 
 
 async def register_device() -> None:
@@ -22,75 +88,112 @@ async def register_device() -> None:
     cached_device_id, cached_token = load_device_config(config_path)
     if cached_device_id:
         settings.device_id = cached_device_id
+        settings.registration_token = cached_token
         return
 
-    _, public_key = ensure_keypair(Path(settings.key_path))
+    private_key, public_key = ensure_keypair(Path(settings.key_path), settings.key_type)
     payload = {
         "public_key": public_key,
+        "key_type": public_key_type(public_key),
         "device_type": "python_sim",
         "hardware_metadata": collect_device_info(),
+        # Proof that this device holds the private key
+        **registration_proof(private_key, public_key),
     }
     async with httpx.AsyncClient(timeout=10.0) as client:
         resp = await client.post(f"{settings.control_plane_url}/devices/register", json=payload)
         resp.raise_for_status()
         data = resp.json()
-        print(f"Registered device_id={data['device_id']}")
+        logger.info("Registered device_id=%s", data["device_id"])
         settings.device_id = data["device_id"]
+        settings.registration_token = data["registration_token"]
         save_device_config(config_path, data["device_id"], data["registration_token"])
 
 
+def device_auth() -> DeviceAuth | None:
+    """Request signer for this device, once registered."""
+    settings = get_settings()
+    if not settings.device_id or not settings.registration_token:
+        return None
+    return DeviceAuth(settings.device_id, settings.registration_token, str(settings.control_plane_url))
+
+
+async def stage_bundle(
+    command: dict,
+    store: BundleStore,
+    log_tag: str,
+    auth: httpx.Auth | None = None,
+) -> Path:
+    """Download and extract the bundle named in ``command``; returns the extracted root."""
+    settings = get_settings()
+    bundle_id = command.get("bundle_id")
+    bundle_version = command.get("bundle_version")
+    checksum = command.get("checksum_sha256")
+
+    # Archive plus extracted tree; evicts old versions before the download starts
+    store.ensure_space(2 * int(command.get("size_bytes") or 0))
+
+    logger.info("[%s] Downloading bundle %s...", log_tag, bundle_id)
+    bundle_path = await download_bundle(
+        str(settings.control_plane_url),
+        bundle_id,
+        store.root,
+        expected_checksum=checksum,
+        peers=command.get("peers"),
+        peer_timeout=settings.peer_timeout,
+        auth=auth,
+    )
+    logger.info("[%s] Downloaded to %s", log_tag, bundle_path)
+    store.add_archive(bundle_id, bundle_version, bundle_path, verified=bool(checksum))
+
+    logger.info("[%s] Extracting bundle...", log_tag)
+    version_dir = store.root / bundle_version
+    extracted_dir = await extract_bundle(bundle_path, version_dir, previous_dir=store.active_root())
+    store.add_tree(bundle_version, version_dir, extracted_dir)
+    logger.info("[%s] Extracted to %s", log_tag, extracted_dir)
+    return extracted_dir
+
+
 async def execute_command(command: dict, client: httpx.AsyncClient) -> None:
     """Execute a command received from the control plane."""
     cmd_type = command.get("type")
     if cmd_type == "deploy":
         deployment_id = command.get("deployment_id")
-        bundle_id = command.get("bundle_id")
         bundle_version = command.get("bundle_version")
         
-        print(f"[COMMAND] Deploying bundle {bundle_version} (deployment_id={deployment_id})")
+        logger.info("[COMMAND] Deploying bundle %s (deployment_id=%s)", bundle_version, deployment_id)
         
         settings = get_settings()
-        bundle_dir = Path.home() / ".kernex" / "bundles"
+        store = get_bundle_store()
         
         try:
-            # Step 1: Download bundle
-            print(f"[DEPLOY] Downloading bundle {bundle_id}...")
-            bundle_path = await download_bundle(
-                str(settings.control_plane_url),
-                bundle_id,
-                bundle_dir
-            )
-            print(f"[DEPLOY] Downloaded to {bundle_path}")
-            
-            # Step 2: Verify checksum (we need to get it from control plane)
-            # For now, we'll verify after extraction by checking manifest
-            
-            # Step 3: Extract bundle
-            print(f"[DEPLOY] Extracting bundle...")
-            extracted_dir = await extract_bundle(bundle_path, bundle_dir / bundle_version)
-            print(f"[DEPLOY] Extracted to {extracted_dir}")
+            # Steps 1-3: Make room, download (peers first, checksum verified
+            # while streaming) and extract into the managed store
+            extracted_dir = await stage_bundle(command, store, "DEPLOY", client.auth)
             
             # Step 4: Load and validate manifest
-            print(f"[DEPLOY] Loading manifest...")
+            logger.info("[DEPLOY] Loading manifest...")
             manifest = await load_manifest(extracted_dir)
             await validate_manifest(manifest)
-            print(f"[DEPLOY] Manifest validated: version={manifest.get('version')}")
+            logger.info("[DEPLOY] Manifest validated: version=%s", manifest.get("version"))
             
             # Step 5: Execute deployment script if specified
             deploy_script = manifest.get("deploy", {}).get("script")
             if deploy_script:
-                print(f"[DEPLOY] Running deployment script: {deploy_script}")
+                logger.info("[DEPLOY] Running deployment script: %s", deploy_script)
                 result = await run_script(
                     deploy_script,
                     cwd=extracted_dir,
                     timeout_seconds=300,
                 )
+                log_script_output(result, deployment_id)
                 if result.return_code != 0:
                     raise RuntimeError(f"Deploy script failed: {result.stderr}")
-                print(f"[DEPLOY] Script output: {result.stdout}")
             
+            store.activate(bundle_version)
+
             # Step 6: Report success
-            print(f"[DEPLOY] Deployment succeeded; reporting to control plane...")
+            logger.info("[DEPLOY] Deployment succeeded; reporting to control plane...")
             result_url = f"{settings.control_plane_url}/deployments/{deployment_id}/result"
             resp = await client.post(
                 result_url,
@@ -100,10 +203,10 @@ async def execute_command(command: dict, client: httpx.AsyncClient) -> None:
                 }
             )
             resp.raise_for_status()
-            print(f"[DEPLOY] Success reported to control plane")
+            logger.info("[DEPLOY] Success reported to control plane")
             
         except Exception as exc:
-            print(f"[DEPLOY] Failed: {exc}")
+            logger.error("[DEPLOY] Failed: %s", exc)
             # Report failure
             try:
                 result_url = f"{settings.control_plane_url}/deployments/{deployment_id}/result"
@@ -117,49 +220,46 @@ async def execute_command(command: dict, client: httpx.AsyncClient) -> None:
                 )
                 resp.raise_for_status()
             except Exception as report_exc:
-                print(f"[DEPLOY] Failed to report error: {report_exc}")
+                logger.error("[DEPLOY] Failed to report error: %s", report_exc)
     
     elif cmd_type == "rollback":
         deployment_id = command.get("deployment_id")
         bundle_version = command.get("bundle_version")
         
-        print(f"[COMMAND] Rolling back to bundle {bundle_version} (deployment_id={deployment_id})")
+        logger.info("[COMMAND] Rolling back to bundle %s (deployment_id=%s)", bundle_version, deployment_id)
         
         settings = get_settings()
-        bundle_dir = Path.home() / ".kernex" / "bundles"
+        store = get_bundle_store()
         
         try:
-            # Rollback is same as deploy but for a previous version
-            bundle_id = command.get("bundle_id")
-            
-            print(f"[ROLLBACK] Downloading bundle {bundle_id}...")
-            bundle_path = await download_bundle(
-                str(settings.control_plane_url),
-                bundle_id,
-                bundle_dir
-            )
-            
-            print(f"[ROLLBACK] Extracting bundle...")
-            extracted_dir = await extract_bundle(bundle_path, bundle_dir / bundle_version)
+            # A resident version (normally the previous one) is switched to
+            # in place; anything else is downloaded like a deploy
+            extracted_dir = store.tree_root(bundle_version)
+            if extracted_dir is not None:
+                logger.info("[ROLLBACK] Version %s is resident at %s; skipping download", bundle_version, extracted_dir)
+            else:
+                extracted_dir = await stage_bundle(command, store, "ROLLBACK", client.auth)
             
-            print(f"[ROLLBACK] Loading manifest...")
+            logger.info("[ROLLBACK] Loading manifest...")
             manifest = await load_manifest(extracted_dir)
             await validate_manifest(manifest)
             
             rollback_script = manifest.get("rollback", {}).get("script") or manifest.get("deploy", {}).get("script")
             if rollback_script:
-                print(f"[ROLLBACK] Running rollback script: {rollback_script}")
+                logger.info("[ROLLBACK] Running rollback script: %s", rollback_script)
                 result = await run_script(
                     rollback_script,
                     cwd=extracted_dir,
                     timeout_seconds=300,
                 )
+                log_script_output(result, deployment_id)
                 if result.return_code != 0:
                     raise RuntimeError(f"Rollback script failed: {result.stderr}")
-                print(f"[ROLLBACK] Script output: {result.stdout}")
             
+            store.activate(bundle_version)
+
             # Report success
-            print(f"[ROLLBACK] Rollback succeeded; reporting to control plane...")
+            logger.info("[ROLLBACK] Rollback succeeded; reporting to control plane...")
             result_url = f"{settings.control_plane_url}/deployments/{deployment_id}/result"
             resp = await client.post(
                 result_url,
@@ -169,10 +269,10 @@ async def execute_command(command: dict, client: httpx.AsyncClient) -> None:
                 }
             )
             resp.raise_for_status()
-            print(f"[ROLLBACK] Success reported to control plane")
+            logger.info("[ROLLBACK] Success reported to control plane")
             
         except Exception as exc:
-            print(f"[ROLLBACK] Failed: {exc}")
+            logger.error("[ROLLBACK] Failed: %s", exc)
             try:
                 result_url = f"{settings.control_plane_url}/deployments/{deployment_id}/result"
                 resp = await client.post(
@@ -185,7 +285,7 @@ async def execute_command(command: dict, client: httpx.AsyncClient) -> None:
                 )
                 resp.raise_for_status()
             except Exception as report_exc:
-                print(f"[ROLLBACK] Failed to report error: {report_exc}")
+                logger.error("[ROLLBACK] Failed to report error: %s", report_exc)
     
     elif cmd_type == "configure":
         config_version = command.get("config_version")
@@ -194,8 +294,8 @@ async def execute_command(command: dict, client: httpx.AsyncClient) -> None:
         deploy_timeout = command.get("deploy_timeout", "300")
         log_level = command.get("log_level", "INFO")
         
-        print(f"[COMMAND] Applying configuration (version={config_version})")
-        print(f"[CONFIG] polling_interval={polling_interval}s, log_level={log_level}")
+        logger.info("[COMMAND] Applying configuration (version=%s)", config_version)
+        logger.info("[CONFIG] polling_interval=%ss, log_level=%s", polling_interval, log_level)
         
         settings = get_settings()
         # Update runtime settings
@@ -203,42 +303,82 @@ async def execute_command(command: dict, client: httpx.AsyncClient) -> None:
             settings.polling_interval = int(polling_interval)
             settings.heartbeat_timeout = int(heartbeat_timeout)
             settings.deploy_timeout = int(deploy_timeout)
+            logging.getLogger("kernex").setLevel(log_level.upper())
             settings.log_level = log_level
-            print(f"[CONFIG] Configuration applied successfully")
+            logger.info("[CONFIG] Configuration applied successfully")
         except Exception as exc:
-            print(f"[CONFIG] Failed to apply config: {exc}")
+            logger.error("[CONFIG] Failed to apply config: %s", exc)
     
     else:
-        print(f"[COMMAND] Unknown command type: {cmd_type}")
+        logger.warning("[COMMAND] Unknown command type: %s", cmd_type)
+
+
+async def start_peer_server() -> None:
+    global peer_server
+    settings = get_settings()
+    if not settings.peer_port:
+        return
+    advertise_host = settings.peer_advertise_host or detect_lan_address(str(settings.control_plane_url))
+    peer_server = PeerServer(
+        host=settings.peer_bind_host,
+        port=settings.peer_port,
+        advertise_host=advertise_host,
+        lookup=get_bundle_store().archive_path,
+    )
+    await peer_server.start()
+    logger.info("Serving bundles to peers at %s", peer_server.url)
+
+
+def _report_shipper_exit(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Log shipper stopped", exc_info=task.exception())
 
 
 async def main() -> None:
+    global shipper_task
+    spool = configure_logging()
     await register_device()
     settings = get_settings()
     if not settings.device_id:
-        print("No device_id; registration failed")
+        logger.error("No device_id; registration failed")
         return
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        backoff = 1
-        while True:
-            try:
-                payload = build_heartbeat_payload(agent_version="0.1.0")
-                resp = await client.post(
-                    f"{settings.control_plane_url}/devices/{settings.device_id}/heartbeat",
-                    json=payload,
-                )
-                resp.raise_for_status()
-                commands = resp.json().get("commands", [])
-                print(f"Heartbeat sent; received {len(commands)} command(s)")
-                for cmd in commands:
-                    await execute_command(cmd, client)
-                backoff = 1  # reset after success
-            except Exception as exc:
-                print(f"Heartbeat failed: {exc}; retrying in {backoff}s")
-                await asyncio.sleep(backoff)
-                backoff = min(backoff * 2, 60)
-                continue
-            await asyncio.sleep(settings.polling_interval)
+    await start_peer_server()
+    async with httpx.AsyncClient(timeout=10.0, auth=device_auth()) as client:
+        shipper = LogShipper(
+            spool,
+            f"{settings.control_plane_url}/devices/{settings.device_id}/logs",
+            idle_interval=settings.log_flush_interval,
+        )
+        shipper_task = asyncio.create_task(shipper.run(client), name="kernex-log-shipper")
+        shipper_task.add_done_callback(_report_shipper_exit)
+        try:
+            backoff = 1
+            while True:
+                try:
+                    payload = build_heartbeat_payload(
+                        agent_version="0.1.0",
+                        peer_url=peer_server.url if peer_server else None,
+                        bundle_store=get_bundle_store().inventory(),
+                    )
+                    resp = await client.post(
+                        f"{settings.control_plane_url}/devices/{settings.device_id}/heartbeat",
+                        json=payload,
+                    )
+                    resp.raise_for_status()
+                    commands = resp.json().get("commands", [])
+                    logger.info("Heartbeat sent; received %d command(s)", len(commands))
+                    for cmd in commands:
+                        await execute_command(cmd, client)
+                    backoff = 1  # reset after success
+                except Exception as exc:
+                    logger.warning("Heartbeat failed: %s; retrying in %ss", exc, backoff)
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 60)
+                    continue
+                await asyncio.sleep(settings.polling_interval)
+        finally:
+            shipper_task.cancel()
+            await asyncio.gather(shipper_task, return_exceptions=True)
 
 
 if __name__ == "__main__":
@@ -4,14 +4,23 @@ from typing import Dict, Any
 from kernex.agent.monitor import collect_health_snapshot
 
 
-def build_heartbeat_payload(agent_version: str | None = None) -> Dict[str, Any]:
+def build_heartbeat_payload(
+    agent_version: str | None = None,
+    peer_url: str | None = None,
+    bundle_store: Dict[str, Any] | None = None,
+) -> Dict[str, Any]:
     snapshot = collect_health_snapshot()
-    return {
+    payload = {
         "agent_version": agent_version,
         "memory_mb": snapshot.memory_mb,
         "cpu_pct": snapshot.cpu_pct,
         "status": snapshot.status,
     }
+    if peer_url:
+        payload["peer_url"] = peer_url
+    if bundle_store is not None:
+        payload["bundle_store"] = bundle_store
+    return payload
 
 
 def sleep_interval(seconds: int) -> None:
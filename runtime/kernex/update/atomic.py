@@ -3,6 +3,9 @@ import shutil
 import tempfile
 from pathlib import Path
 
+# ioctl request number for FICLONE (linux/fs.h); shares extents copy-on-write
+FICLONE = 0x40049409
+
 
 def atomic_write_bytes(target: Path, content: bytes) -> None:
     target.parent.mkdir(parents=True, exist_ok=True)
@@ -32,3 +35,80 @@ def atomic_replace_dir(source_dir: Path, target_dir: Path) -> None:
     os.replace(source_dir, target_dir)
     if backup_dir.exists():
         shutil.rmtree(backup_dir)
+
+
+def atomic_symlink(target: Path, link: Path) -> None:
+    """
+    Point ``link`` at ``target`` in one rename.
+
+    A temporary symlink is created next to ``link`` and renamed over it, so
+    readers always see either the old or the new target, never a missing link.
+    ``target`` is stored as given; pass a relative path to keep the link valid
+    if the parent directory moves.
+    """
+    link.parent.mkdir(parents=True, exist_ok=True)
+    tmp_link = link.with_name(f".{link.name}.{os.getpid()}.tmp")
+    if tmp_link.is_symlink() or tmp_link.exists():
+        tmp_link.unlink()
+    os.symlink(target, tmp_link)
+    try:
+        os.replace(tmp_link, link)
+    except OSError:
+        tmp_link.unlink()
+        raise
+
+
+def _reflink(source: Path, target: Path) -> None:
+    import fcntl
+
+    with source.open("rb") as src, target.open("wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            target.unlink()
+            raise
+
+
+def _copy_range(source: Path, target: Path) -> None:
+    with source.open("rb") as src, target.open("wb") as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+        except (AttributeError, OSError):
+            src.seek(0)
+            dst.seek(0)
+            dst.truncate()
+            shutil.copyfileobj(src, dst)
+
+
+def clone_file(source: Path, target: Path) -> str:
+    """
+    Materialize ``source`` at ``target`` writing as little data as possible.
+
+    Tries a reflink (copy-on-write, no data written), then a hardlink, then
+    an in-kernel copy. Hardlinked files share an inode with the source, so
+    bundle contents must be treated as read-only once extracted.
+
+    Returns the method used: "reflink", "hardlink" or "copy".
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if target.exists() or target.is_symlink():
+        target.unlink()
+    try:
+        _reflink(source, target)
+        return "reflink"
+    except (ImportError, OSError):
+        pass
+    try:
+        os.link(source, target)
+        return "hardlink"
+    except OSError:
+        pass
+    _copy_range(source, target)
+    shutil.copymode(source, target)
+    return "copy"
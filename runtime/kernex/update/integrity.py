@@ -1,7 +1,10 @@
 import hashlib
-from pathlib import Path
+import re
+from pathlib import Path, PurePosixPath
 from typing import Any
 
+_SHA256_HEX = re.compile(r"^[0-9a-f]{64}$")
+
 
 def sha256_file(path: Path) -> str:
     h = hashlib.sha256()
@@ -22,3 +25,43 @@ def verify_manifest_shape(manifest: dict[str, Any]) -> None:
         raise ValueError("Manifest must be an object")
     if "version" not in manifest:
         raise ValueError("Manifest missing required 'version'")
+    if "files" in manifest:
+        verify_file_entries(manifest["files"])
+
+
+def verify_file_entries(files: Any) -> None:
+    """Validate the optional per-file ``files`` list of a manifest."""
+    if not isinstance(files, list):
+        raise ValueError("Manifest 'files' must be a list")
+    for entry in files:
+        if not isinstance(entry, dict):
+            raise ValueError("Manifest 'files' entries must be objects")
+        path = entry.get("path")
+        if not isinstance(path, str) or not is_safe_relpath(path):
+            raise ValueError(f"Manifest file entry has invalid path: {path!r}")
+        if not isinstance(entry.get("sha256"), str) or not _SHA256_HEX.match(entry["sha256"]):
+            raise ValueError(f"Manifest file entry {path} has invalid sha256")
+        size = entry.get("size")
+        if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+            raise ValueError(f"Manifest file entry {path} has invalid size")
+
+
+def is_safe_relpath(path: str) -> bool:
+    parts = PurePosixPath(path).parts
+    return bool(parts) and not path.startswith("/") and ".." not in parts
+
+
+def build_file_manifest(bundle_root: Path) -> list[dict[str, Any]]:
+    """
+    Compute ``files`` entries for every file under ``bundle_root``.
+
+    Bundle authors add the result to manifest.json so agents can reuse
+    unchanged files from the previously deployed version.
+    """
+    entries = []
+    for path in sorted(p for p in bundle_root.rglob("*") if p.is_file()):
+        rel = path.relative_to(bundle_root).as_posix()
+        if rel == "manifest.json":
+            continue
+        entries.append({"path": rel, "sha256": sha256_file(path), "size": path.stat().st_size})
+    return entries
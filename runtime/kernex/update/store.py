@@ -0,0 +1,228 @@
+"""
+Managed on-device bundle store.
+
+Tracks downloaded archives and extracted version trees under one directory,
+with their size and last-used time, in a small JSON index. The active and
+previous (rollback) versions are pinned; everything else is evicted least
+recently used first to stay under a disk budget.
+
+Each version is extracted into its own directory and the ``current`` and
+``previous`` symlinks under the store root select between them (an A/B
+layout). Activating a resident version only renames symlinks, so rolling
+back to the previous version needs no download or extraction.
+"""
+import json
+import os
+import shutil
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from kernex.update.atomic import atomic_symlink, atomic_write_bytes
+
+INDEX_NAME = "store.json"
+CURRENT_LINK = "current"
+PREVIOUS_LINK = "previous"
+
+
+class InsufficientSpaceError(Exception):
+    """Raised when the store cannot make room for an incoming bundle."""
+
+
+@dataclass
+class StoreEntry:
+    kind: str  # "archive" or "tree"
+    path: str  # relative to the store root
+    size_bytes: int
+    last_used: float
+    version: Optional[str] = None
+    bundle_id: Optional[str] = None
+    root: Optional[str] = None  # extracted bundle root, for trees
+    verified: bool = False
+
+
+def _tree_size(path: Path) -> int:
+    total = 0
+    seen = set()
+    for dirpath, _dirs, files in os.walk(path):
+        for name in files:
+            st = os.lstat(os.path.join(dirpath, name))
+            key = (st.st_dev, st.st_ino)
+            if key in seen:
+                continue
+            seen.add(key)
+            total += st.st_size
+    return total
+
+
+class BundleStore:
+    def __init__(self, root: Path, budget_bytes: int, min_free_bytes: int = 0):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.min_free_bytes = min_free_bytes
+        self.entries: Dict[str, StoreEntry] = {}
+        self.active: Optional[str] = None
+        self.previous: Optional[str] = None
+
+    # -- persistence -------------------------------------------------------
+
+    def load(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        index = self.root / INDEX_NAME
+        if not index.exists():
+            return
+        try:
+            data = json.loads(index.read_text())
+        except (OSError, json.JSONDecodeError):
+            return
+        self.active = data.get("active")
+        self.previous = data.get("previous")
+        for key, raw in data.get("entries", {}).items():
+            entry = StoreEntry(**raw)
+            if (self.root / entry.path).exists():
+                self.entries[key] = entry
+
+    def save(self) -> None:
+        payload = {
+            "active": self.active,
+            "previous": self.previous,
+            "entries": {key: asdict(entry) for key, entry in self.entries.items()},
+        }
+        atomic_write_bytes(self.root / INDEX_NAME, json.dumps(payload, indent=2).encode())
+
+    # -- bookkeeping -------------------------------------------------------
+
+    @staticmethod
+    def _archive_key(bundle_id: str) -> str:
+        return f"archive:{bundle_id}"
+
+    @staticmethod
+    def _tree_key(version: str) -> str:
+        return f"tree:{version}"
+
+    def _relative(self, path: Path) -> str:
+        return path.resolve().relative_to(self.root.resolve()).as_posix()
+
+    def add_archive(self, bundle_id: str, version: str, path: Path, verified: bool) -> None:
+        self.entries[self._archive_key(bundle_id)] = StoreEntry(
+            kind="archive",
+            path=self._relative(path),
+            size_bytes=path.stat().st_size,
+            last_used=time.time(),
+            version=version,
+            bundle_id=bundle_id,
+            verified=verified,
+        )
+        self.save()
+
+    def add_tree(self, version: str, version_dir: Path, extracted_root: Path) -> None:
+        self.entries[self._tree_key(version)] = StoreEntry(
+            kind="tree",
+            path=self._relative(version_dir),
+            size_bytes=_tree_size(version_dir),
+            last_used=time.time(),
+            version=version,
+            root=self._relative(extracted_root),
+        )
+        self.save()
+
+    def archive_path(self, bundle_id: str) -> Optional[Path]:
+        """Verified archive for ``bundle_id``; suitable for serving to peers."""
+        entry = self.entries.get(self._archive_key(bundle_id))
+        if entry is None or not entry.verified:
+            return None
+        entry.last_used = time.time()
+        return self.root / entry.path
+
+    def tree_root(self, version: Optional[str]) -> Optional[Path]:
+        entry = self.entries.get(self._tree_key(version)) if version else None
+        if entry is None:
+            return None
+        root = self.root / (entry.root or entry.path)
+        return root if root.is_dir() else None
+
+    def active_root(self) -> Optional[Path]:
+        return self.tree_root(self.active)
+
+    def activate(self, version: str) -> None:
+        """Mark ``version`` active; the old active version becomes the rollback pin."""
+        if version != self.active:
+            self.previous = self.active
+            self.active = version
+        entry = self.entries.get(self._tree_key(version))
+        if entry is not None:
+            entry.last_used = time.time()
+        self._point(PREVIOUS_LINK, self.previous)
+        self._point(CURRENT_LINK, self.active)
+        self.save()
+
+    def _point(self, name: str, version: Optional[str]) -> None:
+        link = self.root / name
+        root = self.tree_root(version)
+        if root is None:
+            if link.is_symlink():
+                link.unlink()
+            return
+        atomic_symlink(Path(self._relative(root)), link)
+
+    # -- space management --------------------------------------------------
+
+    def pinned_versions(self) -> set:
+        return {v for v in (self.active, self.previous) if v}
+
+    def used_bytes(self) -> int:
+        return sum(entry.size_bytes for entry in self.entries.values())
+
+    def free_bytes(self) -> int:
+        return shutil.disk_usage(self.root).free
+
+    def _evict(self, key: str) -> None:
+        entry = self.entries.pop(key)
+        path = self.root / entry.path
+        if entry.kind == "tree":
+            shutil.rmtree(path, ignore_errors=True)
+        elif path.exists():
+            path.unlink()
+
+    def _has_room(self, required_bytes: int) -> bool:
+        within_budget = self.used_bytes() + required_bytes <= self.budget_bytes
+        enough_disk = self.free_bytes() - required_bytes >= self.min_free_bytes
+        return within_budget and enough_disk
+
+    def ensure_space(self, required_bytes: int) -> None:
+        """
+        Evict unpinned entries, least recently used first, until
+        ``required_bytes`` fits both the budget and the free disk space.
+
+        Raises:
+            InsufficientSpaceError: If pinned content alone leaves too little room
+        """
+        pinned = self.pinned_versions()
+        candidates = sorted(
+            (key for key, entry in self.entries.items() if entry.version not in pinned),
+            key=lambda key: self.entries[key].last_used,
+        )
+        evicted = False
+        while not self._has_room(required_bytes) and candidates:
+            self._evict(candidates.pop(0))
+            evicted = True
+        if evicted:
+            self.save()
+        if not self._has_room(required_bytes):
+            raise InsufficientSpaceError(
+                f"Need {required_bytes} bytes; store uses {self.used_bytes()} of "
+                f"{self.budget_bytes} and disk has {self.free_bytes()} free"
+            )
+
+    def inventory(self) -> Dict[str, Any]:
+        """Summary reported to the control plane in heartbeats."""
+        return {
+            "active_version": self.active,
+            "previous_version": self.previous,
+            "versions": sorted(e.version for e in self.entries.values() if e.kind == "tree" and e.version),
+            "archives": sorted(e.bundle_id for e in self.entries.values() if e.kind == "archive" and e.bundle_id),
+            "used_bytes": self.used_bytes(),
+            "budget_bytes": self.budget_bytes,
+            "free_bytes": self.free_bytes(),
+        }
@@ -1,6 +1,6 @@
 from pathlib import Path
 
-from kernex.device.identity import ensure_keypair
+from kernex.device.identity import ensure_keypair, public_key_type, registration_proof, sign_message
 from kernex.device.info import collect_device_info
 
 
@@ -20,3 +20,55 @@ def test_ensure_keypair_creates_and_reuses_key(tmp_path: Path):
     private2, public2 = ensure_keypair(key_path)
     assert private1 == private2
     assert public1 == public2
+
+
+def test_ensure_keypair_defaults_to_ed25519_and_keeps_existing_rsa(tmp_path: Path):
+    _, public = ensure_keypair(tmp_path / "new.pem")
+    assert public_key_type(public) == "ed25519"
+
+    rsa_path = tmp_path / "rsa.pem"
+    _, rsa_public = ensure_keypair(rsa_path, key_type="rsa")
+    assert public_key_type(rsa_public) == "rsa"
+    # A later default-type call must not replace the provisioned RSA identity
+    _, reloaded = ensure_keypair(rsa_path)
+    assert reloaded == rsa_public
+
+
+def test_sign_message_verifies_with_public_key(tmp_path: Path):
+    from cryptography.hazmat.primitives import serialization
+
+    private, public = ensure_keypair(tmp_path / "sign.pem")
+    signature = sign_message(private, b"payload")
+    serialization.load_pem_public_key(public.encode()).verify(signature, b"payload")
+
+
+def test_registration_proof_signs_key_fingerprint_and_timestamp(tmp_path: Path):
+    import base64
+    import hashlib
+
+    from cryptography.hazmat.primitives import serialization
+
+    private, public = ensure_keypair(tmp_path / "proof.pem")
+    proof = registration_proof(private, public, now=1700000000.5)
+    assert proof["proof_timestamp"] == "1700000000"
+    fingerprint = hashlib.sha256("".join(public.split()).encode()).hexdigest()
+    serialization.load_pem_public_key(public.encode()).verify(
+        base64.b64decode(proof["proof_signature"]), f"kernex-register\n{fingerprint}\n1700000000".encode()
+    )
+
+
+def test_device_auth_signs_path_below_base_url():
+    import hashlib
+    import hmac
+
+    import httpx
+
+    from kernex.device.signing import DeviceAuth
+
+    auth = DeviceAuth("dev-1", "token", "http://cp.example/api/v1/")
+    request = httpx.Request("POST", "http://cp.example/api/v1/deployments/d1/result?status_str=ok", content=b"{}")
+    signed = next(auth.auth_flow(request))
+    timestamp = signed.headers["X-Kernex-Timestamp"]
+    message = f"POST\n/deployments/d1/result?status_str=ok\n{timestamp}\n{hashlib.sha256(b'{}').hexdigest()}"
+    assert signed.headers["X-Kernex-Device"] == "dev-1"
+    assert signed.headers["X-Kernex-Signature"] == hmac.new(b"token", message.encode(), hashlib.sha256).hexdigest()
@@ -0,0 +1,85 @@
+import asyncio
+import gzip
+import json
+import logging
+from pathlib import Path
+
+import httpx
+
+from kernex.logging.shipper import LogShipper, LogSpool, SpoolingHandler
+
+
+def _lines(path: Path) -> list[dict]:
+    return [json.loads(line) for line in gzip.decompress(path.read_bytes()).decode().splitlines()]
+
+
+def test_spool_evicts_oldest_segments_over_budget(tmp_path: Path):
+    spool = LogSpool(tmp_path, max_bytes=600)
+    spool.load()
+    paths = [spool.write_batch([json.dumps({"message": f"batch {i}-{j}"}) for j in range(20)]) for i in range(10)]
+
+    assert spool.used_bytes <= 600
+    assert spool.dropped_segments > 0
+    assert spool.oldest() != paths[0] and not paths[0].exists()
+    assert paths[-1].exists()
+
+    reloaded = LogSpool(tmp_path, max_bytes=600)
+    reloaded.load()
+    assert len(reloaded) == len(spool)
+
+
+def test_handler_spools_batches_without_blocking(tmp_path: Path):
+    spool = LogSpool(tmp_path, max_bytes=10 * 1024 * 1024)
+    spool.load()
+    handler = SpoolingHandler(spool, batch_lines=50, flush_interval=60, buffer_lines=100)
+    log = logging.getLogger("kernex.test.spool")
+    log.propagate = False
+    log.addHandler(handler)
+    try:
+        for i in range(150):
+            log.warning("line %d", i, extra={"deployment_id": "dep-1"})
+    finally:
+        log.removeHandler(handler)
+        handler.close()
+
+    entries = [entry for path in sorted(tmp_path.glob("*.ndjson.gz")) for entry in _lines(path)]
+    messages = [entry["message"] for entry in entries]
+    # Either spooled or counted as dropped; the emitter never waited on disk
+    assert messages[0] == "line 0"
+    kept = [m for m in messages if m.startswith("line ")]
+    dropped = sum(int(m.split()[0]) for m in messages if m.endswith("buffer full"))
+    assert len(kept) + dropped == 150
+    assert entries[0]["level"] == "WARNING" and entries[0]["deployment_id"] == "dep-1"
+
+
+def test_shipper_honors_retry_after_and_deletes_on_success(tmp_path: Path):
+    spool = LogSpool(tmp_path, max_bytes=10 * 1024 * 1024)
+    spool.load()
+    first = spool.write_batch([json.dumps({"message": "a"})])
+    spool.write_batch([json.dumps({"message": "b"})])
+
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "7"}),
+        # Signature rejected, e.g. while the clock is off: keep the batch
+        httpx.Response(401, json={"detail": "Signature timestamp outside the allowed window"}),
+        httpx.Response(200, json={"accepted": 1}),
+        httpx.Response(400, json={"detail": "bad"}),
+    ]
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append((request.headers["content-encoding"], gzip.decompress(request.content)))
+        return responses.pop(0)
+
+    shipper = LogShipper(spool, "http://cp/devices/d1/logs", idle_interval=3)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return [await shipper.ship_once(client) for _ in range(5)]
+
+    delays = asyncio.run(run())
+
+    assert delays == [7.0, 2.0, 0.0, 0.0, 3]
+    assert not first.exists() and spool.oldest() is None
+    assert [body for _, body in seen] == [b'{"message": "a"}\n'] * 3 + [b'{"message": "b"}\n']
+    assert {encoding for encoding, _ in seen} == {"gzip"}
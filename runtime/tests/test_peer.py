@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+from pathlib import Path
+
+import httpx
+import pytest
+
+from kernex.agent.bundle_handler import download_bundle
+from kernex.agent.httpd import HttpServer, Request, Response
+from kernex.agent.peer import PeerServer
+
+BUNDLE_ID = "bundle-123"
+CONTENT = b"kernex-bundle-bytes" * 1000
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+
+
+class FakeControlPlane:
+    def __init__(self, content: bytes, filename: str = "v1-bundle.tar.gz"):
+        self.content = content
+        self.filename = filename
+        self.hits = 0
+        self.server = HttpServer(self._handle, host="127.0.0.1")
+
+    async def _handle(self, request: Request) -> Response:
+        self.hits += 1
+        return Response(
+            headers={"Content-Disposition": f'attachment; filename="{self.filename}"'},
+            body=self.content,
+        )
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.port}"
+
+
+def _seed(tmp_path: Path, name: str, content: bytes) -> Path:
+    path = tmp_path / name
+    path.write_bytes(content)
+    return path
+
+
+def test_download_prefers_peer_and_skips_control_plane(tmp_path: Path):
+    async def scenario():
+        control_plane = FakeControlPlane(CONTENT)
+        peer = PeerServer(host="127.0.0.1", advertise_host="127.0.0.1")
+        peer.register(BUNDLE_ID, _seed(tmp_path, "seed.tar.gz", CONTENT))
+        await control_plane.server.start()
+        await peer.start()
+        try:
+            path = await download_bundle(
+                control_plane.url,
+                BUNDLE_ID,
+                tmp_path / "agent-b",
+                expected_checksum=DIGEST,
+                peers=[peer.url],
+            )
+        finally:
+            await peer.stop()
+            await control_plane.server.stop()
+        return path, control_plane.hits
+
+    path, hits = asyncio.run(scenario())
+    assert path.read_bytes() == CONTENT
+    assert hits == 0
+
+
+def test_corrupt_or_unreachable_peer_falls_back_to_control_plane(tmp_path: Path):
+    async def scenario():
+        control_plane = FakeControlPlane(CONTENT)
+        corrupt = PeerServer(host="127.0.0.1", advertise_host="127.0.0.1")
+        corrupt.register(BUNDLE_ID, _seed(tmp_path, "bad.tar.gz", b"tampered"))
+        await control_plane.server.start()
+        await corrupt.start()
+        try:
+            path = await download_bundle(
+                control_plane.url,
+                BUNDLE_ID,
+                tmp_path / "agent-c",
+                expected_checksum=DIGEST,
+                peers=["http://127.0.0.1:1", corrupt.url],
+                peer_timeout=1.0,
+            )
+        finally:
+            await corrupt.stop()
+            await control_plane.server.stop()
+        return path, control_plane.hits
+
+    path, hits = asyncio.run(scenario())
+    assert path.name == "v1-bundle.tar.gz"
+    assert path.read_bytes() == CONTENT
+    assert hits == 1
+    assert not list(path.parent.glob(".*.part"))
+
+
+def test_peer_server_only_serves_registered_bundles(tmp_path: Path):
+    async def scenario():
+        peer = PeerServer(host="127.0.0.1", advertise_host="127.0.0.1")
+        await peer.start()
+        try:
+            return await download_bundle(
+                "http://127.0.0.1:1",
+                "unknown",
+                tmp_path / "agent-d",
+                expected_checksum=DIGEST,
+                peers=[peer.url],
+                peer_timeout=1.0,
+            )
+        finally:
+            await peer.stop()
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("filename", ["../escaped.tar.gz", "{tmp}/escaped.tar.gz", ".."])
+def test_suggested_file_names_cannot_leave_the_target_dir(tmp_path: Path, filename: str):
+    filename = filename.format(tmp=tmp_path)
+
+    async def scenario():
+        # Serves the right bytes under a hostile name, as a peer or as the control plane
+        peer = FakeControlPlane(CONTENT, filename)
+        control_plane = FakeControlPlane(CONTENT, filename)
+        await peer.server.start()
+        await control_plane.server.start()
+        try:
+            from_peer = await download_bundle(
+                "http://127.0.0.1:1", BUNDLE_ID, tmp_path / "agent-e", expected_checksum=DIGEST, peers=[peer.url]
+            )
+            from_control_plane = await download_bundle(
+                control_plane.url, BUNDLE_ID, tmp_path / "agent-f", expected_checksum=DIGEST
+            )
+        finally:
+            await peer.server.stop()
+            await control_plane.server.stop()
+        return from_peer, from_control_plane
+
+    from_peer, from_control_plane = asyncio.run(scenario())
+    assert from_peer == tmp_path / "agent-e" / BUNDLE_ID
+    assert from_control_plane == tmp_path / "agent-f" / BUNDLE_ID
+    assert not (tmp_path / "escaped.tar.gz").exists()
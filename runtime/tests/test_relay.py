@@ -0,0 +1,153 @@
+import asyncio
+import json
+from pathlib import Path
+
+import httpx
+
+from kernex.agent.httpd import HttpServer, Request, Response
+from kernex.agent.relay import RelayServer
+
+
+class FakeUpstream:
+    def __init__(self):
+        self.bundle_hits = {}
+        self.bundle_checks = 0
+        self.batches = []
+        self.drop_results = 0
+        self.server = HttpServer(self._handle, host="127.0.0.1")
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.port}"
+
+    async def _handle(self, request: Request) -> Response:
+        if request.path.startswith("/bundles/"):
+            bundle_id = request.path.rsplit("/", 1)[-1]
+            if request.headers.get("if-none-match") == "*":
+                self.bundle_checks += 1
+            if request.headers.get("authorization") == "Bearer revoked":
+                return Response(status=401)
+            if request.headers.get("if-none-match") == "*":
+                return Response(status=304)
+            self.bundle_hits[bundle_id] = self.bundle_hits.get(bundle_id, 0) + 1
+            await asyncio.sleep(0.05)  # keep the fetch in flight while others arrive
+            return Response(body=bundle_id.encode() * 100)
+        if request.path == "/devices/heartbeat/batch":
+            items = json.loads(request.body)["heartbeats"]
+            self.batches.append(items)
+            results = [
+                {"device_id": item["device_id"], "status_code": 200, "commands": [{"type": "noop", "for": item["device_id"]}]}
+                for item in items
+            ]
+            results = results[: len(results) - self.drop_results]
+            return Response(headers={"Content-Type": "application/json"}, body=json.dumps({"results": results}).encode())
+        if request.path == "/devices/register":
+            return Response(status=201, headers={"Content-Type": "application/json"}, body=b'{"device_id": "d-1"}')
+        return Response(status=404)
+
+
+async def _with_relay(tmp_path: Path, scenario, budget: int = 10_000_000):
+    upstream = FakeUpstream()
+    await upstream.server.start()
+    relay = RelayServer(upstream.url, tmp_path / "cache", budget, batch_window=0.05, host="127.0.0.1")
+    await relay.start()
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{relay.port}", timeout=10.0) as client:
+            return await scenario(client, upstream, relay)
+    finally:
+        await relay.stop()
+        await upstream.server.stop()
+
+
+def test_concurrent_bundle_requests_share_one_upstream_fetch(tmp_path: Path):
+    async def scenario(client, upstream, relay):
+        responses = await asyncio.gather(*(client.get("/bundles/b1") for _ in range(5)))
+        again = await client.get("/bundles/b1")
+        return responses + [again], upstream.bundle_hits
+
+    responses, hits = asyncio.run(_with_relay(tmp_path, scenario))
+    assert all(r.status_code == 200 and r.content == b"b1" * 100 for r in responses)
+    assert hits == {"b1": 1}
+
+
+def test_cached_bundles_are_only_served_to_requesters_upstream_accepts(tmp_path: Path):
+    async def scenario(client, upstream, relay):
+        filled = await client.get("/bundles/b2")
+        refused = await client.get("/bundles/b2", headers={"Authorization": "Bearer revoked"})
+        served = await client.get("/bundles/b2", headers={"Authorization": "Bearer valid"})
+        return filled, refused, served, upstream.bundle_hits, upstream.bundle_checks
+
+    filled, refused, served, hits, checks = asyncio.run(_with_relay(tmp_path, scenario))
+    assert filled.status_code == 200
+    assert refused.status_code == 401 and b"b2" not in refused.content
+    assert served.status_code == 200 and served.content == b"b2" * 100
+    # Cache hits are checked upstream without downloading the blob again
+    assert hits == {"b2": 1} and checks == 2
+
+
+def test_bundle_cache_evicts_least_recently_used(tmp_path: Path):
+    async def scenario(client, upstream, relay):
+        # Each blob is 200 bytes; the budget holds two.
+        await client.get("/bundles/aa")
+        await client.get("/bundles/bb")
+        await client.get("/bundles/aa")
+        await client.get("/bundles/cc")
+        return sorted(p.name for p in relay.cache.cache_dir.iterdir())
+
+    assert asyncio.run(_with_relay(tmp_path, scenario, budget=450)) == ["aa", "cc"]
+
+
+def test_heartbeats_are_batched_upstream(tmp_path: Path):
+    async def scenario(client, upstream, relay):
+        responses = await asyncio.gather(
+            *(client.post(f"/devices/dev-{i}/heartbeat", json={"status": "healthy"}) for i in range(3))
+        )
+        await asyncio.sleep(0.01)
+        return responses, upstream.batches, relay.batcher._tasks
+
+    responses, batches, sending = asyncio.run(_with_relay(tmp_path, scenario))
+    # Send tasks are released once they finish
+    assert not sending
+    assert len(batches) == 1
+    assert sorted(item["device_id"] for item in batches[0]) == ["dev-0", "dev-1", "dev-2"]
+    for i, response in enumerate(responses):
+        assert response.status_code == 200
+        assert response.json()["commands"] == [{"type": "noop", "for": f"dev-{i}"}]
+
+
+def test_short_upstream_batch_response_fails_every_heartbeat(tmp_path: Path):
+    async def scenario(client, upstream, relay):
+        upstream.drop_results = 1
+        return await asyncio.wait_for(
+            asyncio.gather(
+                *(client.post(f"/devices/dev-{i}/heartbeat", json={"status": "healthy"}) for i in range(3))
+            ),
+            timeout=5,
+        )
+
+    responses = asyncio.run(_with_relay(tmp_path, scenario))
+    assert [response.status_code for response in responses] == [502, 502, 502]
+
+
+def test_other_requests_pass_through(tmp_path: Path):
+    async def scenario(client, upstream, relay):
+        return await client.post("/devices/register", json={"public_key": "k"})
+
+    response = asyncio.run(_with_relay(tmp_path, scenario))
+    assert response.status_code == 201
+    assert response.json() == {"device_id": "d-1"}
+
+
+def test_device_signatures_travel_in_batch_items(tmp_path: Path):
+    from kernex.device.signing import DeviceAuth, sign_request
+
+    async def scenario(client, upstream, relay):
+        client.auth = DeviceAuth("dev-s", "secret", str(client.base_url))
+        response = await client.post("/devices/dev-s/heartbeat", json={"status": "healthy"})
+        return response, upstream.batches
+
+    response, batches = asyncio.run(_with_relay(tmp_path, scenario))
+    assert response.status_code == 200
+    item = batches[0][0]
+    expected = sign_request("secret", "POST", "/devices/dev-s/heartbeat", item["timestamp"], item["body"].encode())
+    assert item["signature"] == expected
@@ -0,0 +1,79 @@
+from pathlib import Path
+
+import pytest
+
+from kernex.update.store import BundleStore, InsufficientSpaceError
+
+
+def _add_version(store: BundleStore, version: str, size: int) -> None:
+    archive = store.root / f"{version}.tar.gz"
+    archive.write_bytes(b"a" * size)
+    store.add_archive(f"id-{version}", version, archive, verified=True)
+    tree = store.root / version
+    tree.mkdir()
+    (tree / "model.bin").write_bytes(b"t" * size)
+    store.add_tree(version, tree, tree)
+
+
+def test_ensure_space_evicts_lru_but_keeps_active_and_previous(tmp_path: Path):
+    store = BundleStore(tmp_path, budget_bytes=5000)
+    store.load()
+    for version in ("1.0", "2.0", "3.0"):
+        _add_version(store, version, 500)
+    store.activate("2.0")
+    store.activate("3.0")
+
+    store.ensure_space(3000)
+
+    assert store.tree_root("1.0") is None
+    assert store.archive_path("id-1.0") is None
+    assert not (tmp_path / "1.0").exists()
+    assert store.active_root() == tmp_path / "3.0"
+    assert store.tree_root("2.0") == tmp_path / "2.0"
+
+    with pytest.raises(InsufficientSpaceError):
+        store.ensure_space(4000)
+
+
+def test_store_index_survives_restart(tmp_path: Path):
+    store = BundleStore(tmp_path, budget_bytes=10_000)
+    store.load()
+    _add_version(store, "1.0", 100)
+    store.activate("1.0")
+
+    reloaded = BundleStore(tmp_path, budget_bytes=10_000)
+    reloaded.load()
+    inventory = reloaded.inventory()
+    assert inventory["active_version"] == "1.0"
+    assert inventory["versions"] == ["1.0"]
+    assert inventory["archives"] == ["id-1.0"]
+    assert inventory["used_bytes"] == 200
+
+
+def test_unverified_archives_are_not_served(tmp_path: Path):
+    store = BundleStore(tmp_path, budget_bytes=10_000)
+    archive = tmp_path / "x.tar.gz"
+    archive.write_bytes(b"x")
+    store.add_archive("id-x", "x", archive, verified=False)
+    assert store.archive_path("id-x") is None
+
+
+def test_activate_flips_current_and_previous_symlinks(tmp_path: Path):
+    store = BundleStore(tmp_path, budget_bytes=10_000)
+    store.load()
+    for version in ("1.0", "2.0"):
+        _add_version(store, version, 10)
+    store.activate("1.0")
+    assert (tmp_path / "current").resolve() == (tmp_path / "1.0").resolve()
+    assert not (tmp_path / "previous").is_symlink()
+
+    store.activate("2.0")
+    assert (tmp_path / "current").resolve() == (tmp_path / "2.0").resolve()
+    assert (tmp_path / "previous").resolve() == (tmp_path / "1.0").resolve()
+
+    # Rolling back to the resident previous version is a pointer swap
+    store.activate("1.0")
+    assert (tmp_path / "current").resolve() == (tmp_path / "1.0").resolve()
+    assert (tmp_path / "previous").resolve() == (tmp_path / "2.0").resolve()
+    assert (tmp_path / "2.0" / "model.bin").exists()
+    assert not list(tmp_path.glob(".*.tmp"))
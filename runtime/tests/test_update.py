@@ -1,10 +1,16 @@
+import asyncio
 import hashlib
+import json
+import tarfile
 from pathlib import Path
 
+import httpx
 import pytest
 
-from kernex.update.atomic import atomic_write_bytes
-from kernex.update.integrity import verify_file_checksum, verify_manifest_shape
+from kernex.agent import bundle_handler
+from kernex.agent.bundle_handler import extract_bundle
+from kernex.update.atomic import atomic_symlink, atomic_write_bytes
+from kernex.update.integrity import build_file_manifest, verify_file_checksum, verify_manifest_shape
 
 
 def test_atomic_write_bytes_writes_file(tmp_path: Path):
@@ -15,6 +21,17 @@ def test_atomic_write_bytes_writes_file(tmp_path: Path):
     assert target.read_bytes() == content
 
 
+def test_atomic_symlink_replaces_existing_link(tmp_path: Path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    link = tmp_path / "current"
+    atomic_symlink(Path("a"), link)
+    atomic_symlink(Path("b"), link)
+    assert link.is_symlink()
+    assert link.resolve() == (tmp_path / "b").resolve()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a", "b", "current"]
+
+
 def test_verify_file_checksum_passes_and_fails(tmp_path: Path):
     target = tmp_path / "bundle.bin"
     content = b"checksum-data"
@@ -29,3 +46,110 @@ def test_verify_manifest_shape_requires_version():
     verify_manifest_shape({"version": "1.0.0"})
     with pytest.raises(ValueError):
         verify_manifest_shape({})
+
+
+def _make_bundle(tmp_path: Path, version: str, files: dict[str, bytes]) -> Path:
+    root = tmp_path / f"src-{version}"
+    for rel, content in files.items():
+        (root / rel).parent.mkdir(parents=True, exist_ok=True)
+        (root / rel).write_bytes(content)
+    manifest = {"version": version, "files": build_file_manifest(root)}
+    (root / "manifest.json").write_text(json.dumps(manifest))
+    archive = tmp_path / f"{version}.tar.gz"
+    with tarfile.open(archive, "w:gz") as tar:
+        tar.add(root, arcname="bundle")
+    return archive
+
+
+def test_extract_bundle_reuses_unchanged_files(tmp_path: Path, monkeypatch):
+    model = b"weights" * 1000
+    v1 = _make_bundle(tmp_path, "1.0.0", {"model.bin": model, "config.json": b'{"a": 1}'})
+    v2 = _make_bundle(tmp_path, "2.0.0", {"model.bin": model, "config.json": b'{"a": 2}'})
+
+    first = asyncio.run(extract_bundle(v1, tmp_path / "out" / "1.0.0"))
+
+    cloned = []
+    original_clone = bundle_handler.clone_file
+    monkeypatch.setattr(
+        bundle_handler,
+        "clone_file",
+        lambda src, dst: cloned.append(dst.name) or original_clone(src, dst),
+    )
+    second = asyncio.run(extract_bundle(v2, tmp_path / "out" / "2.0.0", previous_dir=first))
+
+    assert cloned == ["model.bin"]
+    assert (second / "model.bin").read_bytes() == model
+    assert (second / "config.json").read_bytes() == b'{"a": 2}'
+    assert (first / "config.json").read_bytes() == b'{"a": 1}'
+
+
+def test_extract_bundle_checks_files_against_the_manifest(tmp_path: Path, monkeypatch):
+    model = b"weights" * 1000
+    v1 = _make_bundle(tmp_path, "1.0.0", {"model.bin": model})
+    v2 = _make_bundle(tmp_path, "2.0.0", {"model.bin": model})
+    first = asyncio.run(extract_bundle(v1, tmp_path / "out" / "1.0.0"))
+
+    # Same size, different bytes: the deployed copy is not reused
+    (first / "model.bin").write_bytes(b"tampered" * 875)
+    cloned = []
+    monkeypatch.setattr(bundle_handler, "clone_file", lambda src, dst: cloned.append(dst.name))
+    second = asyncio.run(extract_bundle(v2, tmp_path / "out" / "2.0.0", previous_dir=first))
+    assert cloned == []
+    assert (second / "model.bin").read_bytes() == model
+
+    root = tmp_path / "src-bad"
+    root.mkdir()
+    (root / "model.bin").write_bytes(b"swapped")
+    entry = {"path": "model.bin", "sha256": hashlib.sha256(b"original").hexdigest(), "size": 7}
+    (root / "manifest.json").write_text(json.dumps({"version": "3.0.0", "files": [entry]}))
+    bad = tmp_path / "bad.tar.gz"
+    with tarfile.open(bad, "w:gz") as tar:
+        tar.add(root, arcname="bundle")
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        asyncio.run(extract_bundle(bad, tmp_path / "out" / "3.0.0"))
+
+
+def test_verify_manifest_shape_rejects_bad_file_entries():
+    verify_manifest_shape({"version": "1", "files": [{"path": "a", "sha256": "0" * 64, "size": 1}]})
+    with pytest.raises(ValueError):
+        verify_manifest_shape({"version": "1", "files": [{"path": "../etc/passwd", "sha256": "0" * 64, "size": 1}]})
+    with pytest.raises(ValueError):
+        verify_manifest_shape({"version": "1", "files": [{"path": "a", "sha256": "xyz", "size": 1}]})
+
+
+def test_rollback_to_resident_version_skips_download(tmp_path: Path, monkeypatch):
+    from kernex import main
+    from kernex.update.store import BundleStore
+
+    store = BundleStore(tmp_path / "store", budget_bytes=10**9)
+    store.load()
+    for version in ("1.0.0", "2.0.0"):
+        archive = _make_bundle(tmp_path, version, {"model.bin": version.encode()})
+        root = asyncio.run(extract_bundle(archive, store.root / version))
+        store.add_tree(version, store.root / version, root)
+        store.activate(version)
+
+    async def no_download(*args, **kwargs):
+        raise AssertionError("rollback to a resident version must not download")
+
+    reported = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        reported.append(dict(request.url.params))
+        return httpx.Response(200, json={"success": True})
+
+    monkeypatch.setattr(main, "get_bundle_store", lambda: store)
+    monkeypatch.setattr(main, "stage_bundle", no_download)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            await main.execute_command(
+                {"type": "rollback", "deployment_id": "d1", "bundle_version": "1.0.0"},
+                client,
+            )
+
+    asyncio.run(run())
+
+    assert reported and reported[0]["status_str"] == "success"
+    assert store.active == "1.0.0" and store.previous == "2.0.0"
+    assert ((store.root / "current") / "model.bin").read_bytes() == b"1.0.0"